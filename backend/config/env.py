@@ -12,6 +12,8 @@ ENV = os.getenv("ENV", "development")
 # DATABASE
 # =====================================================
 MONGO_URI = os.getenv("MONGO_URI") or os.getenv("MONGODB_URI")
+# Post ledger journals inside a multi-document transaction (replica set only)
+LEDGER_TRANSACTIONS = os.getenv("LEDGER_TRANSACTIONS", "false").lower() == "true"
 
 # =====================================================
 # JWT
@@ -76,6 +78,20 @@ CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
 CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
 CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
 
+# --------------------------------------------------
+# MEDIA
+# --------------------------------------------------
+# "cloudinary" or "local" (files under MEDIA_LOCAL_ROOT, served at MEDIA_LOCAL_URL)
+MEDIA_BACKEND = os.getenv("MEDIA_BACKEND", "cloudinary").lower()
+MEDIA_LOCAL_ROOT = os.getenv("MEDIA_LOCAL_ROOT", "media")
+MEDIA_LOCAL_URL = os.getenv("MEDIA_LOCAL_URL", "/media")
+# Origin the app is reachable at; local media URLs are absolute so they
+# pass the same HttpUrl validation as Cloudinary ones
+MEDIA_PUBLIC_BASE_URL = os.getenv("MEDIA_PUBLIC_BASE_URL", "http://localhost:8000")
+MEDIA_MAX_UPLOAD_BYTES = int(os.getenv("MEDIA_MAX_UPLOAD_BYTES", 5 * 1024 * 1024))
+# Processes resizing product images into thumb / card / pdp variants
+MEDIA_VARIANT_WORKERS = int(os.getenv("MEDIA_VARIANT_WORKERS", 2))
+
 # --------------------------------------------------
 # DATA ENCRYPTION
 # --------------------------------------------------
@@ -98,11 +114,14 @@ def validate_production_env() -> None:
         "RAZORPAYX_KEY_SECRET": RAZORPAYX_KEY_SECRET,
         "RAZORPAYX_ACCOUNT_NUMBER": RAZORPAYX_ACCOUNT_NUMBER,
         "RAZORPAYX_WEBHOOK_SECRET": RAZORPAYX_WEBHOOK_SECRET,
-        "CLOUDINARY_CLOUD_NAME": CLOUDINARY_CLOUD_NAME,
-        "CLOUDINARY_API_KEY": CLOUDINARY_API_KEY,
-        "CLOUDINARY_API_SECRET": CLOUDINARY_API_SECRET,
         "MONGODB_URI": MONGO_URI,
     }
+    if MEDIA_BACKEND == "cloudinary":
+        required.update({
+            "CLOUDINARY_CLOUD_NAME": CLOUDINARY_CLOUD_NAME,
+            "CLOUDINARY_API_KEY": CLOUDINARY_API_KEY,
+            "CLOUDINARY_API_SECRET": CLOUDINARY_API_SECRET,
+        })
 
     invalid = []
     for key, value in required.items():
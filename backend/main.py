@@ -1,15 +1,24 @@
+import os
 from dotenv import load_dotenv
 load_dotenv()
 
-import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
 from database import get_db
 from utils.indexes import ensure_indexes
+from utils.image_variants import shutdown_variant_pool
 
 # ENV
-from config.env import ENV, CORS_ALLOWED_ORIGINS, validate_production_env
+from config.env import (
+    ENV,
+    CORS_ALLOWED_ORIGINS,
+    MEDIA_BACKEND,
+    MEDIA_LOCAL_ROOT,
+    MEDIA_LOCAL_URL,
+    validate_production_env,
+)
 
 # ROUTES
 from routes.auth import router as auth_router
@@ -26,11 +35,8 @@ from routes.uploads import router as uploads_router
 from routes.cart import router as cart_router
 
 # WORKERS
-from utils.cod_settlement_worker import cod_settlement_worker
-from utils.reserve_release_worker import reserve_release_worker
-from workers.order_expiry_worker import order_expiry_worker
-from workers.return_deadline_worker import return_deadline_worker
-from workers.audit_cleanup_worker import audit_cleanup_worker
+from utils.scheduler import JobScheduler
+from workers.scheduled_jobs import SCHEDULED_JOBS
 
 app = FastAPI(
     title="Brandcart API",
@@ -77,6 +83,11 @@ app.include_router(uploads_router)
 app.include_router(brands_router)
 app.include_router(cart_router)
 
+# Local media backend serves its own files (Cloudinary serves from its CDN)
+if MEDIA_BACKEND == "local":
+    os.makedirs(MEDIA_LOCAL_ROOT, exist_ok=True)
+    app.mount(MEDIA_LOCAL_URL, StaticFiles(directory=MEDIA_LOCAL_ROOT), name="media")
+
 # -----------------------------
 # HEALTH CHECKS
 # -----------------------------
@@ -95,6 +106,7 @@ async def health_db():
 # -----------------------------
 # STARTUP WORKERS (ONE PLACE ONLY)
 # -----------------------------
+# Every process starts the scheduler; leases decide which one runs each job.
 
 @app.on_event("startup")
 async def start_background_workers():
@@ -102,8 +114,13 @@ async def start_background_workers():
     db = get_db()
     await ensure_indexes(db)
 
-    asyncio.create_task(cod_settlement_worker())
-    asyncio.create_task(reserve_release_worker())
-    asyncio.create_task(order_expiry_worker())
-    asyncio.create_task(return_deadline_worker())
-    asyncio.create_task(audit_cleanup_worker())
+    app.state.scheduler = JobScheduler(db, SCHEDULED_JOBS)
+    app.state.scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    scheduler = getattr(app.state, "scheduler", None)
+    if scheduler:
+        await scheduler.stop()
+    shutdown_variant_pool()
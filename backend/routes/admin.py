@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from datetime import datetime, timedelta
 import asyncio
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
 from database import get_db
@@ -9,8 +9,28 @@ from utils.guards import parse_object_id, assert_valid_seller_state
 from utils.audit import log_audit
 from utils.security import get_current_user, require_role
 from utils.slug import make_slug, generate_unique_seller_slug
+from utils.sellers import get_leaderboard_page, LEADERBOARD_PAGE_MAX
+from utils.seller_risk import get_seller_risk_overview, invalidate_seller_risk_cache
 from utils.trust import SELLER_TIER_CONFIG
 from utils.payouts import execute_bank_payout, fetch_payout_status
+from utils.webhook_inbox import replay_webhook_events, STATUS_DEAD
+from utils.wallet_service import add_ledger_entry, ENTRY_EMERGENCY_PAYOUT_RELEASE, ENTRY_RESERVE_HOLD
+from utils.exports import export_settlement_report
+from utils.trust_recompute import create_trust_recompute_run, run_trust_recompute
+from utils.product_ratings import apply_rating_change, rebuild_product_rating, rebuild_all_product_ratings
+from utils.rollups import (
+    get_running_rollup,
+    get_daily_rollups,
+    rollup_value,
+    ledger_rollup_key,
+    ROLLUP_ORDERS_CREATED,
+    ROLLUP_ORDERS_DELIVERED,
+    ROLLUP_ORDERS_RTO,
+    ROLLUP_ORDERS_SETTLED,
+    ROLLUP_REFUNDS_COMPLETED,
+    ROLLUP_COD_PENDING_AMOUNT,
+    ROLLUP_UNSETTLED_PAYOUT_AMOUNT,
+)
 from models.user import SellerTier
 
 
@@ -31,6 +51,18 @@ class PayoutDecision(BaseModel):
     reason: Optional[str] = None
 
 
+class ReviewVisibility(BaseModel):
+    is_visible: bool
+    admin_note: Optional[str] = None
+
+
+class WebhookReplay(BaseModel):
+    since: datetime
+    until: datetime
+    source: Optional[Literal["delivery", "razorpay", "razorpayx_payout"]] = None
+    statuses: Optional[List[Literal["done", "dead"]]] = None
+
+
 # =====================================================
 # VIEW SELLER REQUESTS
 # =====================================================
@@ -153,6 +185,7 @@ async def verify_identity(
                 "seller_rejected_at": None,
             }}
         )
+        invalidate_seller_risk_cache()
 
         await log_audit(
             db,
@@ -181,6 +214,7 @@ async def verify_identity(
                 "updated_at": datetime.utcnow()
             }}
         )
+        invalidate_seller_risk_cache()
 
         await log_audit(
             db,
@@ -227,6 +261,7 @@ async def freeze_seller(
             }
         }
     )
+    invalidate_seller_risk_cache()
 
     await log_audit(
         db=db,
@@ -286,6 +321,7 @@ async def unfreeze_seller(
             },
         }
     )
+    invalidate_seller_risk_cache()
 
     await log_audit(
         db=db,
@@ -323,24 +359,74 @@ async def active_sellers(admin=Depends(require_role("admin"))):
 
     return sellers
 
+# =========================================================
+# FLEET TRUST RECOMPUTE
+# =========================================================
+
+@router.post("/sellers/trust/recompute")
+async def recompute_seller_trust_fleet(
+    background_tasks: BackgroundTasks,
+    dry_run: bool = Query(True),
+    admin=Depends(require_role("admin")),
+    db=Depends(get_db),
+):
+    """
+    Recompute trust / tier for every seller (after a policy change).
+    dry_run (default) only reports the diff. Poll the returned run_id.
+    """
+    run_id = await create_trust_recompute_run(db, dry_run=dry_run, requested_by=str(admin["_id"]))
+    if not run_id:
+        raise HTTPException(409, "A trust recompute is already running")
+
+    await log_audit(
+        db,
+        actor_id=str(admin["_id"]),
+        actor_role="admin",
+        action="SELLER_TRUST_RECOMPUTE_STARTED",
+        metadata={"run_id": str(run_id), "dry_run": dry_run},
+    )
+
+    background_tasks.add_task(run_trust_recompute, db, run_id, dry_run=dry_run)
+    return {"run_id": str(run_id), "dry_run": dry_run, "status": "queued"}
+
+
+@router.get("/sellers/trust/recompute/{run_id}")
+async def get_seller_trust_recompute(
+    run_id: str,
+    admin=Depends(require_role("admin")),
+    db=Depends(get_db),
+):
+    run = await db.trust_recompute_runs.find_one({"_id": parse_object_id(run_id, "run_id")})
+    if not run:
+        raise HTTPException(404, "Recompute run not found")
+
+    run["id"] = str(run.pop("_id"))
+    return run
+
 # =========================================================
 # SELLER RANKING (KEPT, CLEANED ✏️)
 # =========================================================
 
 @router.get("/sellers/ranking")
-async def seller_ranking(admin=Depends(require_role("admin"))):
+async def seller_ranking(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=LEADERBOARD_PAGE_MAX),
+    admin=Depends(require_role("admin")),
+):
     db = get_db()
 
-    cursor = db.users.find(
-        {"role": "seller", "seller_status": "verified"},
+    page = await get_leaderboard_page(
+        db,
         {
             "seller_profile.brand_name": 1,
             "seller_profile.trust": 1
-        }
-    ).sort("seller_profile.trust.score", -1)
+        },
+        cursor=cursor,
+        limit=limit,
+    )
 
     sellers = []
-    async for s in cursor:
+    for s in page["sellers"]:
         sellers.append({
             "seller_id": str(s["_id"]),
             "brand_name": s.get("seller_profile", {}).get("brand_name"),
@@ -348,7 +434,7 @@ async def seller_ranking(admin=Depends(require_role("admin"))):
             "badges": s.get("seller_profile", {}).get("trust", {}).get("badges", [])
         })
 
-    return sellers
+    return {"sellers": sellers, "next_cursor": page["next_cursor"]}
 
 
 # =========================================================
@@ -439,57 +525,12 @@ async def seller_risk_dashboard(
     Read-only seller risk overview.
     Used by admin dashboards & ops teams.
     """
-
-    # --- Summary counts ---
-    total_sellers = await db.users.count_documents({"role": "seller"})
-    frozen_sellers = await db.users.count_documents({"seller_status": "frozen"})
-    probation_sellers = await db.users.count_documents({
-        "seller_probation.active": True
-    })
-    low_trust_sellers = await db.users.count_documents({
-        "seller_profile.trust.score": {"$lt": 30}
-    })
-
-    # --- High risk sellers (detailed list) ---
-    risky_sellers_cursor = db.users.find(
-        {
-            "role": "seller",
-            "$or": [
-                {"seller_status": "frozen"},
-                {"seller_profile.trust.score": {"$lt": 30}},
-                {"seller_probation.active": True},
-            ]
-        },
-        {
-            "email": 1,
-            "seller_status": 1,
-            "seller_tier": 1,
-            "seller_profile.trust": 1,
-            "seller_probation": 1,
-            "created_at": 1,
-        }
-    ).sort("seller_profile.trust.score", 1).limit(50)
-
-    risky_sellers = []
-    async for s in risky_sellers_cursor:
-        risky_sellers.append({
-            "seller_id": str(s["_id"]),
-            "email": s.get("email"),
-            "status": s.get("seller_status"),
-            "tier": s.get("seller_tier"),
-            "trust_score": s.get("seller_profile", {}).get("trust", {}).get("score"),
-            "probation": s.get("seller_probation", {}).get("active", False),
-            "created_at": s.get("created_at"),
-        })
+    # One $facet over sellers, cached briefly (see utils.seller_risk)
+    overview = await get_seller_risk_overview(db)
 
     return {
-        "summary": {
-            "total_sellers": total_sellers,
-            "frozen_sellers": frozen_sellers,
-            "probation_sellers": probation_sellers,
-            "low_trust_sellers": low_trust_sellers,
-        },
-        "risky_sellers": risky_sellers,
+        "summary": overview["summary"],
+        "risky_sellers": overview["risky_sellers"],
         "generated_at": datetime.utcnow(),
     }
 
@@ -499,29 +540,70 @@ async def seller_risk_dashboard(
 
 @router.get("/finance/summary")
 async def finance_summary(
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
     admin=Depends(require_role("admin")),
     db=Depends(get_db),
 ):
-    pending_cod = await db.orders.aggregate([
-        {"$match": {"payment.method": "COD", "payment.status": "cod_pending"}},
-        {"$group": {"_id": None, "amount": {"$sum": "$pricing.subtotal"}}}
-    ]).to_list(1)
+    # Precomputed by utils.rollups; verified nightly against orders / ledger
+    running = await get_running_rollup(db)
+
+    response = {
+        "pending_cod_amount": rollup_value(running, ROLLUP_COD_PENDING_AMOUNT),
+        "unsettled_payouts": rollup_value(running, ROLLUP_UNSETTLED_PAYOUT_AMOUNT),
+        "reserve_locked": rollup_value(running, ledger_rollup_key(ENTRY_RESERVE_HOLD, "credit")),
+        "as_of": running.get("updated_at"),
+    }
 
-    unsettled = await db.orders.aggregate([
-        {"$match": {"status": "delivered", "settlement.status": {"$ne": "settled"}}},
-        {"$group": {"_id": None, "amount": {"$sum": "$pricing.seller_payout"}}}
-    ]).to_list(1)
+    if since or until:
+        response["daily"] = [
+            {
+                "day": row["day"],
+                "orders_settled": rollup_value(row, ROLLUP_ORDERS_SETTLED),
+                "ledger": row.get("ledger", {}),
+            }
+            for row in await get_daily_rollups(db, since, until)
+        ]
 
-    reserve = await db.wallet_ledger.aggregate([
-        {"$match": {"entry_type": "RESERVE_HOLD"}},
-        {"$group": {"_id": None, "amount": {"$sum": "$credit"}}}
-    ]).to_list(1)
+    return response
 
-    return {
-        "pending_cod_amount": pending_cod[0]["amount"] if pending_cod else 0,
-        "unsettled_payouts": unsettled[0]["amount"] if unsettled else 0,
-        "reserve_locked": reserve[0]["amount"] if reserve else 0,
-    }
+
+@router.get("/finance/settlements/export")
+async def export_settlements(
+    fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    seller_id: Optional[str] = Query(None),
+    admin=Depends(require_role("admin")),
+    db=Depends(get_db),
+):
+    seller_oid = parse_object_id(seller_id, "seller_id") if seller_id else None
+
+    await log_audit(
+        db,
+        actor_id=str(admin["_id"]),
+        actor_role="admin",
+        action="SETTLEMENT_REPORT_EXPORTED",
+        metadata={"format": fmt, "since": since, "until": until, "seller_id": seller_id},
+    )
+
+    return export_settlement_report(db, fmt, since=since, until=until, seller_id=seller_oid)
+
+
+@router.get("/finance/reconciliation")
+async def latest_ledger_reconciliation(
+    admin=Depends(require_role("admin")),
+    db=Depends(get_db),
+):
+    report = await db.ledger_reconciliation_runs.find_one({}, sort=[("started_at", -1)])
+    if not report:
+        raise HTTPException(404, "No reconciliation run yet")
+
+    report["id"] = str(report.pop("_id"))
+    for item in report["issues"]:
+        item["order_id"] = str(item["order_id"])
+        item["seller_id"] = str(item["seller_id"]) if item.get("seller_id") else None
+    return report
 
 # =========================================================
 # ORDER SUMMARY
@@ -529,21 +611,35 @@ async def finance_summary(
 
 @router.get("/orders/summary")
 async def order_summary(
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
     admin=Depends(require_role("admin")),
     db=Depends(get_db),
 ):
-    total = await db.orders.count_documents({})
-    delivered = await db.orders.count_documents({"status": "delivered"})
-    rto = await db.orders.count_documents({"status": "rto"})
-    refunds = await db.orders.count_documents({"return.refund_status": "completed"})
-
-    return {
-        "total_orders": total,
-        "delivered_orders": delivered,
-        "rto_orders": rto,
-        "refunds_completed": refunds,
+    running = await get_running_rollup(db)
+
+    response = {
+        "total_orders": rollup_value(running, ROLLUP_ORDERS_CREATED),
+        "delivered_orders": rollup_value(running, ROLLUP_ORDERS_DELIVERED),
+        "rto_orders": rollup_value(running, ROLLUP_ORDERS_RTO),
+        "refunds_completed": rollup_value(running, ROLLUP_REFUNDS_COMPLETED),
+        "as_of": running.get("updated_at"),
     }
 
+    if since or until:
+        response["daily"] = [
+            {
+                "day": row["day"],
+                "orders_created": rollup_value(row, ROLLUP_ORDERS_CREATED),
+                "orders_delivered": rollup_value(row, ROLLUP_ORDERS_DELIVERED),
+                "orders_rto": rollup_value(row, ROLLUP_ORDERS_RTO),
+                "refunds_completed": rollup_value(row, ROLLUP_REFUNDS_COMPLETED),
+            }
+            for row in await get_daily_rollups(db, since, until)
+        ]
+
+    return response
+
 
 @router.get("/payout-requests")
 async def list_payout_requests(
@@ -673,16 +769,14 @@ async def payout_request_decision(
 
     if data.action == "reject":
         # Re-credit held emergency payout amount on rejection
-        await db.wallet_ledger.insert_one({
-            "seller_id": payout["seller_id"],
-            "order_id": None,
-            "entry_type": "EMERGENCY_PAYOUT_RELEASE",
-            "credit": payout.get("total_debit", payout["amount"]),
-            "debit": 0,
-            "reason_code": "EMERGENCY_PAYOUT_REJECTED",
-            "reference_id": payout["_id"],
-            "created_at": now,
-        })
+        await add_ledger_entry(
+            db,
+            payout["seller_id"],
+            ENTRY_EMERGENCY_PAYOUT_RELEASE,
+            credit=payout.get("total_debit", payout["amount"]),
+            reason_code="EMERGENCY_PAYOUT_REJECTED",
+            reference_id=payout["_id"],
+        )
         await log_audit(
             db=db,
             actor_id=str(admin["_id"]),
@@ -847,3 +941,142 @@ async def reconcile_payout_status(
         "status": update_fields.get("status", payout.get("status")),
         "provider_status": provider_meta["provider_payout_status"],
     }
+
+
+# =========================================================
+# REVIEW MODERATION
+# =========================================================
+
+@router.post("/reviews/{review_id}/visibility")
+async def set_review_visibility(
+    review_id: str,
+    data: ReviewVisibility,
+    admin=Depends(require_role("admin")),
+    db=Depends(get_db),
+):
+    oid = parse_object_id(review_id, "review_id")
+
+    # Conditional on the current flag so repeated calls move counters once
+    review = await db.reviews.find_one_and_update(
+        {"_id": oid, "is_visible": {"$ne": data.is_visible}},
+        {"$set": {
+            "is_visible": data.is_visible,
+            "admin_note": data.admin_note,
+            "updated_at": datetime.utcnow(),
+        }},
+        projection={"product_id": 1, "rating": 1},
+    )
+    if not review:
+        if not await db.reviews.find_one({"_id": oid}, {"_id": 1}):
+            raise HTTPException(404, "Review not found")
+        return {"message": "Review visibility unchanged", "is_visible": data.is_visible}
+
+    await apply_rating_change(db, review["product_id"], review["rating"], 1 if data.is_visible else -1)
+
+    await log_audit(
+        db,
+        actor_id=str(admin["_id"]),
+        actor_role="admin",
+        action="REVIEW_SHOWN" if data.is_visible else "REVIEW_HIDDEN",
+        metadata={
+            "review_id": review_id,
+            "product_id": str(review["product_id"]),
+            "admin_note": data.admin_note,
+        },
+    )
+
+    return {"message": "Review visibility updated", "is_visible": data.is_visible}
+
+
+@router.post("/reviews/ratings/rebuild")
+async def rebuild_product_ratings(
+    background_tasks: BackgroundTasks,
+    product_id: Optional[str] = None,
+    admin=Depends(require_role("admin")),
+    db=Depends(get_db),
+):
+    """
+    Recount rating counters from reviews: one product inline, or every
+    product in the background when product_id is omitted.
+    """
+    if product_id:
+        oid = parse_object_id(product_id, "product_id")
+        if not await db.products.find_one({"_id": oid}, {"_id": 1}):
+            raise HTTPException(404, "Product not found")
+
+    await log_audit(
+        db,
+        actor_id=str(admin["_id"]),
+        actor_role="admin",
+        action="PRODUCT_RATINGS_REBUILT",
+        metadata={"product_id": product_id},
+    )
+
+    if product_id:
+        return {"product_id": product_id, "rating": await rebuild_product_rating(db, oid)}
+
+    background_tasks.add_task(rebuild_all_product_ratings, db)
+    return {"status": "queued"}
+
+
+# =========================================================
+# WEBHOOK INBOX (DEAD LETTERS / REPLAY)
+# =========================================================
+
+@router.get("/webhooks/dead-letters")
+async def list_dead_webhooks(
+    source: Optional[str] = None,
+    limit: int = 100,
+    admin=Depends(require_role("admin")),
+    db=Depends(get_db),
+):
+    query = {"status": STATUS_DEAD}
+    if source:
+        query["source"] = source
+
+    limit = min(max(limit, 1), 500)
+    cursor = db.webhook_inbox.find(
+        query,
+        {"payload": 0},
+    ).sort("received_at", -1).limit(limit)
+
+    rows = []
+    async for row in cursor:
+        row["_id"] = str(row["_id"])
+        rows.append(row)
+
+    return {"count": len(rows), "events": rows}
+
+
+@router.post("/webhooks/replay")
+async def replay_webhooks(
+    data: WebhookReplay,
+    admin=Depends(require_role("admin")),
+    db=Depends(get_db),
+):
+    if data.since >= data.until:
+        raise HTTPException(400, "since must be before until")
+
+    requeued = await replay_webhook_events(
+        db,
+        since=data.since,
+        until=data.until,
+        source=data.source,
+        statuses=data.statuses,
+    )
+
+    await log_audit(
+        db=db,
+        actor_id=str(admin["_id"]),
+        actor_role="admin",
+        action="WEBHOOKS_REPLAYED",
+        metadata={
+            "since": data.since.isoformat(),
+            "until": data.until.isoformat(),
+            "source": data.source,
+            "statuses": data.statuses,
+            "requeued": requeued,
+        },
+    )
+
+    return {"message": "Webhooks queued for replay", "requeued": requeued}
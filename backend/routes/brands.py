@@ -1,29 +1,27 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from database import get_db
+from utils.sellers import get_top_sellers, TOP_BRANDS_MAX
 
 router = APIRouter(prefix="/api/brands", tags=["Brands"])
 
 @router.get("/top")
-async def top_brands(limit: int = 12):
+async def top_brands(limit: int = Query(12, ge=1, le=TOP_BRANDS_MAX)):
     db = get_db()
 
-    cursor = db.users.find(
-        {
-            "role": "seller",
-            "seller_status": "verified",
-            "is_frozen": False
-        },
+    sellers = await get_top_sellers(
+        db,
         {
             "seller_profile.brand_name": 1,
             "seller_profile.slug": 1,
             "seller_profile.logo_url": 1,
             "seller_profile.trust": 1,
-        }
-    ).sort("seller_profile.trust.score", -1).limit(limit)
+        },
+        limit,
+    )
 
     brands = []
 
-    async for s in cursor:
+    for s in sellers:
         profile = s.get("seller_profile", {})
         logo = profile.get("logo_url")
 
@@ -5,6 +5,7 @@ from pydantic import BaseModel, Field
 
 from database import get_db
 from utils.security import require_role
+from utils.cart import hydrate_cart
 
 router = APIRouter(prefix="/api/cart", tags=["Cart"])
 
@@ -23,35 +24,8 @@ async def get_cart(
     buyer=Depends(require_role("buyer")),
     db=Depends(get_db),
 ):
-    cart = buyer.get("cart", [])
-    items = []
-    subtotal = 0
-
-    for item in cart:
-        product = await db.products.find_one({"_id": item["product_id"]})
-        if not product:
-            continue
-
-        qty = int(item.get("quantity", 1))
-        unit_price = float(product.get("selling_price", 0))
-        line_total = round(unit_price * qty, 2)
-        subtotal += line_total
-
-        items.append({
-            "product_id": str(product["_id"]),
-            "title": product.get("title"),
-            "images": product.get("images") or product.get("image_urls") or [],
-            "quantity": qty,
-            "unit_price": unit_price,
-            "line_total": line_total,
-            "stock": product.get("stock", 0),
-        })
-
-    return {
-        "count": len(items),
-        "items": items,
-        "subtotal": round(subtotal, 2),
-    }
+    # products, sellers and offers are each one batched read
+    return await hydrate_cart(db, buyer.get("cart", []))
 
 
 @router.post("/add")
@@ -77,6 +51,7 @@ async def add_to_cart(
     for item in cart:
         if item.get("product_id") == product_id:
             item["quantity"] = data.quantity
+            item["price_at_add"] = product.get("selling_price")
             item["updated_at"] = datetime.utcnow()
             updated = True
             break
@@ -85,6 +60,7 @@ async def add_to_cart(
         cart.append({
             "product_id": product_id,
             "quantity": data.quantity,
+            "price_at_add": product.get("selling_price"),
             "added_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
         })
@@ -121,6 +97,7 @@ async def update_cart_item(
     for item in cart:
         if item.get("product_id") == pid:
             item["quantity"] = data.quantity
+            item["price_at_add"] = product.get("selling_price")
             item["updated_at"] = datetime.utcnow()
             found = True
             break
@@ -2,6 +2,7 @@
 from datetime import datetime, timedelta
 from fastapi import Request
 import asyncio
+import logging
 
 from database import get_db
 from utils.security import require_role
@@ -9,9 +10,35 @@ from utils.otp import generate_otp, hash_otp, verify_hash
 from utils.wallet_service import add_ledger_entry
 from utils.audit import log_audit
 from utils.trust import apply_trust_event
+from utils.seller_stats import inc_seller_stats, STAT_TOTAL_ORDERS, STAT_DELIVERED_ORDERS
 from utils.wallet_service import process_return_refund
 from utils.risk_guard import enforce_seller_risk
-from utils.order_timeline import record_order_event
+from utils.order_state_machine import OrderStateMachine
+from utils.cod_settlement_worker import compute_settle_after
+from utils.rollups import (
+    record_rollups,
+    ROLLUP_ORDERS_CREATED,
+    ROLLUP_ORDERS_DELIVERED,
+    ROLLUP_ORDERS_RTO,
+    ROLLUP_REFUNDS_COMPLETED,
+    ROLLUP_COD_PENDING_AMOUNT,
+    ROLLUP_UNSETTLED_PAYOUT_AMOUNT,
+)
+from utils.scheduled_actions import (
+    schedule_action,
+    ACTION_ORDER_EXPIRY,
+    ACTION_RETURN_DEADLINE,
+)
+from workers.order_expiry_worker import RAZORPAY_PAYMENT_TIMEOUT_MINUTES
+from utils.order_timeline import (
+    record_order_event,
+    record_order_events,
+    build_order_event,
+    fetch_order_timeline,
+    fetch_order_timelines,
+    TIMELINE_PAGE_DEFAULT,
+    TIMELINE_PAGE_MAX,
+)
 from utils.idempotency import (
     reserve_idempotency_key,
     complete_idempotency_key,
@@ -25,7 +52,11 @@ from utils.razorpay import (
     verify_checkout_signature,
 )
 from config.env import RAZORPAY_KEY_ID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
 from utils.guards import parse_object_id
 
 
@@ -33,6 +64,7 @@ router = APIRouter(
     prefix="/api/orders",
     tags=["Orders"]
 )
+logger = logging.getLogger(__name__)
 
 from config.constants import (
     MAX_COD_ORDER_VALUE,
@@ -48,6 +80,10 @@ COD_RTO_PENALTY = 150
 RETURN_WINDOW_DAYS = 7
 SELLER_ACTION_HOURS = 48
 ALLOWED_PAYMENT_METHODS = {"COD", "RAZORPAY"}
+# Each order is its own timeline query (TIMELINE_BATCH_CONCURRENCY at a time),
+# so this caps the round trips one batch request can cost
+TIMELINE_BATCH_MAX_ORDERS = 20
+BULK_FULFILMENT_MAX_ORDERS = 200
 
 
 def normalize_payment_method(payment_method: str) -> str:
@@ -71,6 +107,19 @@ class RazorpayVerifyPayload(BaseModel):
     idempotency_key: str
 
 
+class BulkShipItem(BaseModel):
+    order_id: str
+    tracking_id: Optional[str] = None
+
+
+class BulkShipRequest(BaseModel):
+    orders: List[BulkShipItem] = Field(min_items=1, max_items=BULK_FULFILMENT_MAX_ORDERS)
+
+
+class BulkOrderIds(BaseModel):
+    order_ids: List[str] = Field(min_items=1, max_items=BULK_FULFILMENT_MAX_ORDERS)
+
+
 # ======================================================
 # CREATE ORDER (BUYER)
 # ======================================================
@@ -291,6 +340,23 @@ async def create_order(
         await db.orders.insert_one(order)
         order_inserted = True
 
+        await record_rollups(
+            db,
+            at=now,
+            flows={ROLLUP_ORDERS_CREATED: 1},
+            gauges={ROLLUP_COD_PENDING_AMOUNT: subtotal if payment_method == "COD" else 0},
+        )
+        await inc_seller_stats(db, seller["_id"], {STAT_TOTAL_ORDERS: 1})
+
+        if payment_method == "RAZORPAY":
+            # Cancelled by the scheduled action dispatcher if still unpaid
+            await schedule_action(
+                db,
+                action=ACTION_ORDER_EXPIRY,
+                order_id=order["_id"],
+                due_at=now + timedelta(minutes=RAZORPAY_PAYMENT_TIMEOUT_MINUTES),
+            )
+
         await record_order_event(
             db,
             order_id=order["_id"],
@@ -467,41 +533,40 @@ async def verify_razorpay_payment(
 @router.post("/seller/mark-shipped/{order_id}")
 async def seller_mark_shipped(
     order_id: str,
+    tracking_id: str | None = Query(None),
     seller=Depends(require_role("seller")),
 ):
     db = get_db()
     now = datetime.utcnow()
 
-    order = await db.orders.find_one({
-        "_id": parse_object_id(order_id, "order_id"),
-        "seller_id": seller["_id"]
-    })
-
-    if not order:
-        raise HTTPException(404, "Order not found")
+    shipped_fields = {}
+    tracking_id = (tracking_id or "").strip() or None
+    if tracking_id:
+        # waybill -> order lookup for courier webhooks (orders_waybill_unique_idx)
+        shipped_fields["waybill"] = tracking_id
 
-    if order["status"] != "created":
-        raise HTTPException(400, "Order cannot be shipped in current state")
-
-    # 1ï¸âƒ£ Update order status
-    await db.orders.update_one(
-        {"_id": order["_id"]},
-        {
-            "$set": {
-                "status": "shipped",
-                "updated_at": now
-            },
-            "$push": {
+    # 1. created -> shipped (single conditional write)
+    try:
+        order = await OrderStateMachine(db).apply_or_raise(
+            "ship",
+            parse_object_id(order_id, "order_id"),
+            scope={"seller_id": seller["_id"]},
+            set_fields=shipped_fields,
+            push={
                 "tracking": {
                     "status": "SHIPPED",
                     "message": "Seller marked order as shipped",
+                    "tracking_id": tracking_id,
                     "at": now
                 }
-            }
-        }
-    )
+            },
+            projection={"_id": 1},
+            now=now,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(409, "Tracking id already assigned to another order")
 
-    # 2ï¸âƒ£ ORDER TIMELINE EVENT (18B.2)
+    # 2. ORDER TIMELINE EVENT (18B.2)
     await record_order_event(
         db=db,
         order_id=order["_id"],
@@ -524,29 +589,18 @@ async def generate_delivery_otp_system(
     db = get_db()
     now = datetime.utcnow()
 
-    order = await db.orders.find_one({"_id": parse_object_id(order_id, "order_id")})
-    if not order:
-        raise HTTPException(404, "Order not found")
-
-    if order["status"] != "shipped":
-        raise HTTPException(400, "Order not eligible for OTP")
-
-    if order.get("delivery_otp_hash"):
-        raise HTTPException(400, "OTP already generated")
-
     otp = generate_otp()
-    await db.orders.update_one(
-        {"_id": order["_id"]},
-        {
-            "$set": {
-                "delivery_otp_hash": hash_otp(otp),
-                "delivery_otp_generated_at": now,
-                "status": "delivery_otp_pending",
-                "updated_at": now
-            }
-        }
+    order = await OrderStateMachine(db).apply_or_raise(
+        "generate_delivery_otp",
+        parse_object_id(order_id, "order_id"),
+        set_fields={
+            "delivery_otp_hash": hash_otp(otp),
+            "delivery_otp_generated_at": now,
+        },
+        projection={"_id": 1},
+        now=now,
     )
-    
+
     await record_order_event(
         db,
         order_id=order["_id"],
@@ -560,19 +614,19 @@ async def generate_delivery_otp_system(
 # BUYER CONFIRM DELIVERY
 # ======================================================
 
-@router.post("/buyer/confirm-delivery/{order_id}")
-async def confirm_delivery(
-    order_id: str,
-    otp: str,
-    buyer=Depends(require_role("buyer")),
-):
-    db = get_db()
-    now = datetime.utcnow()
-
-    order = await db.orders.find_one({
-        "_id": parse_object_id(order_id, "order_id"),
-        "buyer_id": buyer["_id"]
-    })
+async def _raise_delivery_rejection(db, order_oid, buyer_id, otp: str, now: datetime):
+    """
+    Failure path of confirm_delivery: explain why the transition was refused.
+    """
+    order = await db.orders.find_one(
+        {"_id": order_oid, "buyer_id": buyer_id},
+        {
+            "delivered_at": 1,
+            "payment": 1,
+            "delivery_otp_hash": 1,
+            "delivery_otp_generated_at": 1,
+        },
+    )
     if not order:
         raise HTTPException(404, "Order not found")
 
@@ -593,34 +647,88 @@ async def confirm_delivery(
     if not verify_hash(otp, order.get("delivery_otp_hash")):
         raise HTTPException(400, "Invalid OTP")
 
-    product = await db.products.find_one({"_id": order["product_id"]})
-    qty = order["quantity"]
+    raise HTTPException(400, OrderStateMachine.transition("deliver")["error"])
+
+
+async def _load_order_seller_tier(db, order_oid, buyer_id) -> dict | None:
+    """
+    The order's seller (seller_tier only) via one $lookup. None if either is
+    missing; the settlement worker then backfills settle_after from
+    delivered_at.
+    """
+    rows = await db.orders.aggregate([
+        {"$match": {"_id": order_oid, "buyer_id": buyer_id}},
+        {"$project": {"seller_id": 1}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "seller_id",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"seller_tier": 1}}],
+            "as": "seller",
+        }},
+    ]).to_list(1)
+    if not rows or not rows[0]["seller"]:
+        return None
+    return rows[0]["seller"][0]
 
-    if product.get("reserved_stock", 0) < qty:
-        raise HTTPException(409, "Reserved stock corrupted")
 
-    await db.products.update_one(
-        {"_id": product["_id"]},
-        {"$inc": {"reserved_stock": -qty}}
+@router.post("/buyer/confirm-delivery/{order_id}")
+async def confirm_delivery(
+    order_id: str,
+    otp: str,
+    buyer=Depends(require_role("buyer")),
+):
+    db = get_db()
+    now = datetime.utcnow()
+    order_oid = parse_object_id(order_id, "order_id")
+
+    # Seller tier (for the settlement window) in one round trip, so
+    # settle_after goes out with the transition itself
+    seller = await _load_order_seller_tier(db, order_oid, buyer["_id"])
+    settlement_fields = {}
+    if seller:
+        settlement_fields["settlement.settle_after"] = compute_settle_after(seller, now)
+
+    # OTP check, expiry and payment state are all part of the transition filter
+    order = await OrderStateMachine(db).apply(
+        "deliver",
+        order_oid,
+        scope={"buyer_id": buyer["_id"]},
+        extra_filter={
+            "delivery_otp_hash": hash_otp(otp),
+            "delivery_otp_generated_at": {
+                "$gte": now - timedelta(minutes=DELIVERY_OTP_EXPIRY_MINUTES)
+            },
+        },
+        set_fields={
+            "delivered_at": now,
+            "settlement.status": "pending",
+            "settlement.settled_at": None,
+            **settlement_fields,
+        },
+        unset_fields=["delivery_otp_hash", "delivery_otp_generated_at"],
+        projection={"product_id": 1, "quantity": 1, "seller_id": 1, "pricing.seller_payout": 1},
+        now=now,
     )
+    if not order:
+        await _raise_delivery_rejection(db, order_oid, buyer["_id"], otp, now)
 
-    await db.orders.update_one(
-        {"_id": order["_id"]},
-        {
-            "$set": {
-                "status": "delivered",
-                "delivered_at": now,
-                "payment.status": "cod_pending" if payment.get("method") == "COD" else "paid",
-                "settlement.status": "pending",
-                "settlement.settled_at": None,
-                "updated_at": now
-            },
-            "$unset": {
-                "delivery_otp_hash": "",
-                "delivery_otp_generated_at": ""
-            }
-        }
+    await record_rollups(
+        db,
+        at=now,
+        flows={ROLLUP_ORDERS_DELIVERED: 1},
+        gauges={ROLLUP_UNSETTLED_PAYOUT_AMOUNT: order.get("pricing", {}).get("seller_payout", 0)},
     )
+    await inc_seller_stats(db, order["seller_id"], {STAT_DELIVERED_ORDERS: 1})
+
+    qty = order["quantity"]
+    stock_res = await db.products.update_one(
+        {"_id": order["product_id"], "reserved_stock": {"$gte": qty}},
+        {"$inc": {"reserved_stock": -qty}}
+    )
+    if stock_res.modified_count == 0:
+        # Delivery already happened; surface the drift instead of failing the buyer
+        logger.error("RESERVED_STOCK_MISMATCH order=%s product=%s", order["_id"], order["product_id"])
 
     await record_order_event(
         db,
@@ -662,13 +770,19 @@ async def cod_rto(
     now = datetime.utcnow()
 
     # --------------------------------------------------
-    # 1. FETCH ORDER
+    # 1. FETCH ORDER (rate-limit penalty needs the seller)
     # --------------------------------------------------
-    order = await db.orders.find_one({"_id": parse_object_id(order_id, "order_id")})
+    order = await db.orders.find_one(
+        {"_id": parse_object_id(order_id, "order_id")},
+        {"seller_id": 1, "status": 1, "payment.method": 1},
+    )
     if not order:
         raise HTTPException(404, "Order not found")
 
-    seller = await db.users.find_one({"_id": order["seller_id"]})
+    seller = await db.users.find_one(
+        {"_id": order["seller_id"]},
+        {"seller_profile.risk": 1},
+    )
     seller_risk = (seller or {}).get("seller_profile", {}).get("risk", {})
     penalty = 2 if seller_risk.get("high_rto") else 1
 
@@ -684,14 +798,32 @@ async def cod_rto(
     if order.get("status") == "rto":
         return {"ignored": True}
 
-    # --------------------------------------------------
-    # 2. VALIDATE COD STATE
-    # --------------------------------------------------
     if order["payment"]["method"] != "COD":
         return {"ignored": True}
 
-    if order["status"] not in ("created", "shipped", "out_for_delivery"):
-        raise HTTPException(400, "Invalid RTO state")
+    # --------------------------------------------------
+    # 2. TRANSITION -> rto (conditional on COD + pre-delivery state)
+    # --------------------------------------------------
+    order = await OrderStateMachine(db).apply_or_raise(
+        "cod_rto",
+        order["_id"],
+        set_fields={
+            "rto": {
+                "reason": reason,
+                "penalty_applied": COD_RTO_PENALTY,
+                "rto_at": now,
+            },
+        },
+        projection={
+            "seller_id": 1,
+            "buyer_id": 1,
+            "product_id": 1,
+            "quantity": 1,
+            "pricing.commission_amount": 1,
+        },
+        now=now,
+    )
+    await record_rollups(db, at=now, flows={ROLLUP_ORDERS_RTO: 1})
 
     seller_id = order["seller_id"]
     buyer_id = order["buyer_id"]
@@ -734,42 +866,28 @@ async def cod_rto(
     )
 
     # --------------------------------------------------
-    # 5. UPDATE ORDER
+    # 5. BUYER COD RISK UPDATE
     # --------------------------------------------------
-    await db.orders.update_one(
-        {"_id": order["_id"]},
+    buyer = await db.users.find_one_and_update(
+        {"_id": buyer_id},
         {
-            "$set": {
-                "status": "rto",
-                "rto": {
-                    "reason": reason,
-                    "penalty_applied": COD_RTO_PENALTY,
-                    "rto_at": now,
-                },
-                "updated_at": now,
-            }
-        }
+            "$inc": {"buyer_risk.cod_rto_count": 1},
+            "$set": {"buyer_risk.last_cod_rto_at": now},
+        },
+        projection={"buyer_risk.cod_rto_count": 1},
+        return_document=ReturnDocument.AFTER,
     )
-
-    # --------------------------------------------------
-    # 6. BUYER COD RISK UPDATE
-    # --------------------------------------------------
-    buyer = await db.users.find_one({"_id": buyer_id})
-    cod_rto_count = buyer.get("buyer_risk", {}).get("cod_rto_count", 0) + 1
-
-    buyer_updates = {
-        "$inc": {"buyer_risk.cod_rto_count": 1},
-        "$set": {"buyer_risk.last_cod_rto_at": now},
-    }
+    cod_rto_count = (buyer or {}).get("buyer_risk", {}).get("cod_rto_count", 0)
 
     # Disable COD if threshold crossed
     if cod_rto_count >= COD_RTO_MAX_ALLOWED:
-        buyer_updates["$set"]["buyer_risk.cod_disabled"] = True
-
-    await db.users.update_one({"_id": buyer_id}, buyer_updates)
+        await db.users.update_one(
+            {"_id": buyer_id},
+            {"$set": {"buyer_risk.cod_disabled": True}},
+        )
 
     # --------------------------------------------------
-    # 7. TRUST PENALTY (SELLER)
+    # 6. TRUST PENALTY (SELLER)
     # --------------------------------------------------
     await apply_trust_event(
         db=db,
@@ -778,7 +896,7 @@ async def cod_rto(
     )
 
     # --------------------------------------------------
-    # 8. AUDIT (MANDATORY)
+    # 7. AUDIT (MANDATORY)
     # --------------------------------------------------
     await log_audit(
         db=db,
@@ -853,70 +971,53 @@ async def request_return(
         )
 
     # --------------------------------------------------
-    # 2. FETCH ORDER (OWNERSHIP)
+    # 2. CREATE RETURN (ownership + eligibility in the same write)
     # --------------------------------------------------
-    order = await db.orders.find_one({
-        "_id": parse_object_id(order_id, "order_id"),
-        "buyer_id": buyer["_id"]
-    })
-
-    if not order:
-        raise HTTPException(404, "Order not found")
-
-    # --------------------------------------------------
-    # 3. ELIGIBILITY CHECKS
-    # --------------------------------------------------
-    if order.get("status") != "delivered":
-        raise HTTPException(400, "Return allowed only after delivery")
-
-    delivered_at = order.get("delivered_at")
-    if not delivered_at:
-        raise HTTPException(400, "Invalid delivery state")
-
-    RETURN_WINDOW_DAYS = 7
-    if now > delivered_at + timedelta(days=RETURN_WINDOW_DAYS):
-        raise HTTPException(400, "Return window expired")
+    order_oid = parse_object_id(order_id, "order_id")
+    seller_deadline = now + timedelta(hours=SELLER_ACTION_HOURS)
 
-    if order.get("return", {}).get("status") is not None:
-        raise HTTPException(400, "Return already requested")
+    order = await OrderStateMachine(db).apply(
+        "request_return",
+        order_oid,
+        scope={"buyer_id": buyer["_id"]},
+        extra_filter={
+            "delivered_at": {"$gte": now - timedelta(days=RETURN_WINDOW_DAYS)},
+        },
+        set_fields={
+            "return.reason": reason,
+            "return.requested_at": now,
+
+            # seller decision
+            "return.seller_action_deadline": seller_deadline,
+            "return.seller_action": None,
+            "return.seller_action_reason": None,
+            "return.approved_by": None,
+
+            # pickup
+            "return.pickup_status": None,
+            "return.pickup_at": None,
+
+            # resolution
+            "return.resolution": None,       # refund | replace
+            "return.refund_amount": None,
+            "return.refund_status": None,
+        },
+        projection={"seller_id": 1},
+        now=now,
+    )
 
-    # --------------------------------------------------
-    # 4. CREATE RETURN (SINGLE SOURCE OF TRUTH)
-    # --------------------------------------------------
-    SELLER_ACTION_HOURS = 48
-    seller_deadline = now + timedelta(hours=SELLER_ACTION_HOURS)
+    if not order:
+        await _raise_return_rejection(db, order_oid, buyer["_id"], now)
 
-    await db.orders.update_one(
-        {"_id": order["_id"]},
-        {
-            "$set": {
-                "return": {
-                    "status": "requested",
-                    "reason": reason,
-                    "requested_at": now,
-
-                    # seller decision
-                    "seller_action_deadline": seller_deadline,
-                    "seller_action": None,
-                    "seller_action_reason": None,
-                    "approved_by": None,
-
-                    # pickup
-                    "pickup_status": None,
-                    "pickup_at": None,
-
-                    # resolution
-                    "resolution": None,       # refund | replace
-                    "refund_amount": None,
-                    "refund_status": None,
-                },
-                "updated_at": now
-            }
-        }
+    await schedule_action(
+        db,
+        action=ACTION_RETURN_DEADLINE,
+        order_id=order["_id"],
+        due_at=seller_deadline,
     )
 
     # --------------------------------------------------
-    # 5. UPDATE BUYER RISK (AFTER SUCCESS ONLY)
+    # 3. UPDATE BUYER RISK (AFTER SUCCESS ONLY)
     # --------------------------------------------------
     await db.users.update_one(
         {"_id": buyer["_id"]},
@@ -927,7 +1028,7 @@ async def request_return(
     )
 
     # --------------------------------------------------
-    # 6. AUDIT (NON-NEGOTIABLE)
+    # 4. AUDIT (NON-NEGOTIABLE)
     # --------------------------------------------------
     await log_audit(
         db=db,
@@ -957,6 +1058,34 @@ async def request_return(
         "seller_action_deadline": seller_deadline
     }
 
+
+async def _raise_return_rejection(db, order_oid, buyer_id, now: datetime):
+    """
+    Failure path of request_return: explain why the transition was refused.
+    """
+    order = await db.orders.find_one(
+        {"_id": order_oid, "buyer_id": buyer_id},
+        {"status": 1, "delivered_at": 1, "return.status": 1},
+    )
+
+    if not order:
+        raise HTTPException(404, "Order not found")
+
+    if order.get("status") != "delivered":
+        raise HTTPException(400, "Return allowed only after delivery")
+
+    delivered_at = order.get("delivered_at")
+    if not delivered_at:
+        raise HTTPException(400, "Invalid delivery state")
+
+    if now > delivered_at + timedelta(days=RETURN_WINDOW_DAYS):
+        raise HTTPException(400, "Return window expired")
+
+    if (order.get("return") or {}).get("status") is not None:
+        raise HTTPException(400, "Return already requested")
+
+    raise HTTPException(400, OrderStateMachine.transition("request_return")["error"])
+
 # ======================================================
 # SELLER RESPOND TO RETURN REQUEST
 # ======================================================
@@ -973,37 +1102,24 @@ async def seller_return_action(
     if action not in ["accept", "reject"]:
         raise HTTPException(400, "Invalid action")
 
-    order = await db.orders.find_one({
-        "_id": parse_object_id(order_id, "order_id"),
-        "seller_id": seller["_id"]
-    })
-
-    if not order:
-        raise HTTPException(404, "Order not found")
-
-    ret = order.get("return")
-    if not ret or ret.get("status") != "requested":
-        raise HTTPException(400, "No active return request")
-
-    # Prevent double action
-    if ret.get("seller_action") is not None:
-        raise HTTPException(400, "Return already handled")
+    order_oid = parse_object_id(order_id, "order_id")
+    state_machine = OrderStateMachine(db)
 
     if action == "accept":
         # ----------------------------
         # ACCEPT RETURN
         # ----------------------------
-        await db.orders.update_one(
-            {"_id": order["_id"]},
-            {
-                "$set": {
-                    "return.status": "approved",
-                    "return.seller_action": "approved",
-                    "return.approved_by": seller["_id"],
-                    "return.approved_at": now,
-                    "updated_at": now
-                }
-            }
+        order = await state_machine.apply_or_raise(
+            "approve_return",
+            order_oid,
+            scope={"seller_id": seller["_id"]},
+            set_fields={
+                "return.seller_action": "approved",
+                "return.approved_by": seller["_id"],
+                "return.approved_at": now,
+            },
+            projection={"_id": 1},
+            now=now,
         )
 
         # Timeline event
@@ -1015,7 +1131,7 @@ async def seller_return_action(
             actor_id=seller["_id"],
         )
 
-        # Trust (positive â€“ seller cooperated)
+        # Trust (positive - seller cooperated)
         await apply_trust_event(
             db=db,
             seller_id=seller["_id"],
@@ -1028,17 +1144,17 @@ async def seller_return_action(
         # ----------------------------
         # REJECT RETURN
         # ----------------------------
-        await db.orders.update_one(
-            {"_id": order["_id"]},
-            {
-                "$set": {
-                    "return.status": "rejected",
-                    "return.seller_action": "rejected",
-                    "return.rejected_by": seller["_id"],
-                    "return.rejected_at": now,
-                    "updated_at": now
-                }
-            }
+        order = await state_machine.apply_or_raise(
+            "reject_return",
+            order_oid,
+            scope={"seller_id": seller["_id"]},
+            set_fields={
+                "return.seller_action": "rejected",
+                "return.rejected_by": seller["_id"],
+                "return.rejected_at": now,
+            },
+            projection={"_id": 1},
+            now=now,
         )
 
         # Timeline event
@@ -1050,7 +1166,7 @@ async def seller_return_action(
             actor_id=seller["_id"],
         )
 
-        # Trust (negative â€“ seller refused return)
+        # Trust (negative - seller refused return)
         await apply_trust_event(
             db=db,
             seller_id=seller["_id"],
@@ -1070,26 +1186,26 @@ async def schedule_return_pickup(
 ):
     db = get_db()
     now = datetime.utcnow()
+    order_oid = parse_object_id(order_id, "order_id")
+
+    order = await OrderStateMachine(db).apply(
+        "schedule_return_pickup",
+        order_oid,
+        set_fields={"return.pickup_at": now},
+        projection={"_id": 1},
+        now=now,
+    )
 
-    order = await db.orders.find_one({"_id": parse_object_id(order_id, "order_id")})
     if not order:
-        raise HTTPException(404, "Order not found")
-
-    ret = order.get("return")
-    if not ret or ret.get("status") != "approved":
-        raise HTTPException(400, "Return not approved")
+        current = await db.orders.find_one({"_id": order_oid}, {"return": 1})
+        if not current:
+            raise HTTPException(404, "Order not found")
 
-    if ret.get("pickup_status") == "scheduled":
-        return {"message": "Pickup already scheduled"}
+        ret = current.get("return") or {}
+        if ret.get("status") == "approved" and ret.get("pickup_status") == "scheduled":
+            return {"message": "Pickup already scheduled"}
 
-    await db.orders.update_one(
-        {"_id": order["_id"]},
-        {"$set": {
-            "return.pickup_status": "scheduled",
-            "return.pickup_at": now,
-            "updated_at": now
-        }}
-    )
+        raise HTTPException(400, OrderStateMachine.transition("schedule_return_pickup")["error"])
 
     await log_audit(
         db,
@@ -1121,21 +1237,12 @@ async def pickup_completed(
     db = get_db()
     now = datetime.utcnow()
 
-    order = await db.orders.find_one({"_id": parse_object_id(order_id, "order_id")})
-    if not order:
-        raise HTTPException(404, "Order not found")
-
-    ret = order.get("return")
-    if not ret or ret.get("pickup_status") != "scheduled":
-        raise HTTPException(400, "Pickup not scheduled")
-
-    await db.orders.update_one(
-        {"_id": order["_id"]},
-        {"$set": {
-            "return.pickup_status": "picked_up",
-            "return.pickup_completed_at": now,
-            "updated_at": now
-        }}
+    order = await OrderStateMachine(db).apply_or_raise(
+        "complete_return_pickup",
+        parse_object_id(order_id, "order_id"),
+        set_fields={"return.pickup_completed_at": now},
+        projection={"_id": 1},
+        now=now,
     )
 
     await record_order_event(
@@ -1219,8 +1326,8 @@ async def system_refund(
     # ------------------------------------------------------
     # 4. Update order state
     # ------------------------------------------------------
-    await db.orders.update_one(
-        {"_id": order["_id"]},
+    refund_update = await db.orders.update_one(
+        {"_id": order["_id"], "return.refund_status": {"$ne": "completed"}},
         {
             "$set": {
                 "return.refund_status": "completed",
@@ -1230,6 +1337,8 @@ async def system_refund(
             }
         },
     )
+    if refund_update.modified_count:
+        await record_rollups(db, at=now, flows={ROLLUP_REFUNDS_COMPLETED: 1})
 
     # ------------------------------------------------------
     # 5. Trust events (18C = 12B + 13C)
@@ -1336,57 +1445,292 @@ async def buyer_return_status(
 # ORDER TIMELINE (BUYER VIEW)
 # =========================================================
 
+@router.get("/timelines")
+async def get_order_timelines_buyer(
+    order_ids: list[str] = Query(...),
+    per_order_limit: int = Query(TIMELINE_PAGE_DEFAULT, ge=1, le=TIMELINE_PAGE_MAX),
+    buyer=Depends(require_role("buyer")),
+    db=Depends(get_db),
+):
+    if len(order_ids) > TIMELINE_BATCH_MAX_ORDERS:
+        raise HTTPException(400, f"At most {TIMELINE_BATCH_MAX_ORDERS} orders per request")
+
+    oids = [parse_object_id(oid, "order_id") for oid in order_ids]
+
+    owned = await db.orders.find(
+        {"_id": {"$in": oids}, "buyer_id": buyer["_id"]},
+        {"_id": 1},
+    ).to_list(len(oids))
+
+    timelines = await fetch_order_timelines(
+        db,
+        [o["_id"] for o in owned],
+        per_order_limit=per_order_limit,
+    )
+
+    return {
+        "timelines": {str(oid): page for oid, page in timelines.items()}
+    }
+
+
 @router.get("/{order_id}/timeline")
 async def get_order_timeline_buyer(
     order_id: str,
+    limit: int = Query(TIMELINE_PAGE_DEFAULT, ge=1, le=TIMELINE_PAGE_MAX),
+    cursor: str | None = Query(None),
     buyer=Depends(require_role("buyer")),
     db=Depends(get_db),
 ):
 
-    order = await db.orders.find_one({
-        "_id": parse_object_id(order_id, "order_id"),
-        "buyer_id": buyer["_id"],
-    })
+    order = await db.orders.find_one(
+        {
+            "_id": parse_object_id(order_id, "order_id"),
+            "buyer_id": buyer["_id"],
+        },
+        {"_id": 1},
+    )
 
     if not order:
         raise HTTPException(404, "Order not found")
 
-    events = await db.order_timeline.find(
-        {"order_id": order["_id"]},
-        {"_id": 0}
-    ).sort("created_at", 1).to_list(None)
+    page = await fetch_order_timeline(db, order["_id"], limit=limit, cursor=cursor)
 
     return {
         "order_id": order_id,
-        "events": events
+        "events": page["events"],
+        "next_cursor": page["next_cursor"],
     }
 
 # =========================================================
 # ORDER TIMELINE (SELLER VIEW)
 # =========================================================
 
+@router.get("/seller/timelines")
+async def get_order_timelines_seller(
+    order_ids: list[str] = Query(...),
+    per_order_limit: int = Query(TIMELINE_PAGE_DEFAULT, ge=1, le=TIMELINE_PAGE_MAX),
+    seller=Depends(require_role("seller")),
+    db=Depends(get_db),
+):
+    if len(order_ids) > TIMELINE_BATCH_MAX_ORDERS:
+        raise HTTPException(400, f"At most {TIMELINE_BATCH_MAX_ORDERS} orders per request")
+
+    oids = [parse_object_id(oid, "order_id") for oid in order_ids]
+
+    owned = await db.orders.find(
+        {"_id": {"$in": oids}, "seller_id": seller["_id"]},
+        {"_id": 1},
+    ).to_list(len(oids))
+
+    timelines = await fetch_order_timelines(
+        db,
+        [o["_id"] for o in owned],
+        per_order_limit=per_order_limit,
+    )
+
+    return {
+        "timelines": {str(oid): page for oid, page in timelines.items()}
+    }
+
+
 @router.get("/seller/{order_id}/timeline")
 async def get_order_timeline_seller(
     order_id: str,
+    limit: int = Query(TIMELINE_PAGE_DEFAULT, ge=1, le=TIMELINE_PAGE_MAX),
+    cursor: str | None = Query(None),
     seller=Depends(require_role("seller")),
     db=Depends(get_db),
 ):
 
-    order = await db.orders.find_one({
-        "_id": parse_object_id(order_id, "order_id"),
-        "seller_id": seller["_id"],
-    })
+    order = await db.orders.find_one(
+        {
+            "_id": parse_object_id(order_id, "order_id"),
+            "seller_id": seller["_id"],
+        },
+        {"_id": 1},
+    )
 
     if not order:
         raise HTTPException(404, "Order not found")
 
-    events = await db.order_timeline.find(
-        {"order_id": order["_id"]},
-        {"_id": 0}
-    ).sort("created_at", 1).to_list(None)
+    page = await fetch_order_timeline(db, order["_id"], limit=limit, cursor=cursor)
 
     return {
         "order_id": order_id,
-        "events": events
+        "events": page["events"],
+        "next_cursor": page["next_cursor"],
+    }
+
+
+# ======================================================
+# BULK FULFILMENT
+# ======================================================
+# One ownership/state query, one bulk_write and one timeline insert_many per
+# batch instead of a round trip per order. Each order is reported separately:
+# applied | invalid_id | not_found | invalid_state | duplicate_key
+# Repeated ids in a request are processed and reported once.
+
+def _parse_bulk_order_ids(raw_ids: list[str]) -> tuple[list, dict]:
+    """
+    Returns (unique ObjectIds in request order, report for invalid inputs).
+    """
+    order_oids = []
+    rejected = {}
+    seen = set()
+
+    for raw in raw_ids:
+        if not ObjectId.is_valid(raw):
+            rejected[raw] = "invalid_id"
+            continue
+        oid = ObjectId(raw)
+        if oid not in seen:
+            seen.add(oid)
+            order_oids.append(oid)
+
+    return order_oids, rejected
+
+
+def _bulk_report(raw_ids: list[str], rejected: dict, results: dict) -> dict:
+    report = []
+    for raw in dict.fromkeys(raw_ids):
+        status = rejected.get(raw)
+        if status is None:
+            status = results.get(ObjectId(raw), "not_found")
+        report.append({"order_id": raw, "status": status})
+
+    return {
+        "requested": len(report),
+        "applied": sum(1 for r in report if r["status"] == "applied"),
+        "results": report,
     }
 
+
+@router.post("/seller/bulk/mark-shipped")
+async def seller_bulk_mark_shipped(
+    payload: BulkShipRequest,
+    seller=Depends(require_role("seller")),
+):
+    db = get_db()
+    now = datetime.utcnow()
+
+    raw_ids = [item.order_id for item in payload.orders]
+    order_oids, rejected = _parse_bulk_order_ids(raw_ids)
+
+    tracking_ids = {}
+    for item in payload.orders:
+        if ObjectId.is_valid(item.order_id):
+            tracking_ids.setdefault(ObjectId(item.order_id), (item.tracking_id or "").strip() or None)
+
+    updates = {}
+    for oid in order_oids:
+        tracking_id = tracking_ids.get(oid)
+        updates[oid] = {
+            "set_fields": {"waybill": tracking_id} if tracking_id else {},
+            "push": {
+                "tracking": {
+                    "status": "SHIPPED",
+                    "message": "Seller marked order as shipped",
+                    "tracking_id": tracking_id,
+                    "at": now
+                }
+            },
+        }
+
+    results = await OrderStateMachine(db).apply_bulk(
+        "ship",
+        updates,
+        scope={"seller_id": seller["_id"]},
+        now=now,
+    )
+
+    await record_order_events(db, [
+        build_order_event(
+            order_id=oid,
+            event="ORDER_SHIPPED",
+            actor_role="seller",
+            actor_id=seller["_id"],
+            metadata={"bulk": True},
+            created_at=now,
+        )
+        for oid, status in results.items() if status == "applied"
+    ])
+
+    return _bulk_report(raw_ids, rejected, results)
+
+
+@router.post("/system/bulk/delivery-reported")
+async def bulk_generate_delivery_otp_system(
+    payload: BulkOrderIds,
+    admin=Depends(require_role("admin")),
+):
+    db = get_db()
+    now = datetime.utcnow()
+
+    order_oids, rejected = _parse_bulk_order_ids(payload.order_ids)
+
+    updates = {
+        oid: {
+            "set_fields": {
+                "delivery_otp_hash": hash_otp(generate_otp()),
+                "delivery_otp_generated_at": now,
+            }
+        }
+        for oid in order_oids
+    }
+
+    results = await OrderStateMachine(db).apply_bulk(
+        "generate_delivery_otp",
+        updates,
+        now=now,
+    )
+
+    await record_order_events(db, [
+        build_order_event(
+            order_id=oid,
+            event="DELIVERY_OTP_GENERATED",
+            actor_role="system",
+            created_at=now,
+        )
+        for oid, status in results.items() if status == "applied"
+    ])
+
+    return _bulk_report(payload.order_ids, rejected, results)
+
+
+@router.post("/system/bulk/schedule-pickup")
+async def bulk_schedule_return_pickup(
+    payload: BulkOrderIds,
+    admin=Depends(require_role("admin")),
+):
+    db = get_db()
+    now = datetime.utcnow()
+
+    order_oids, rejected = _parse_bulk_order_ids(payload.order_ids)
+
+    results = await OrderStateMachine(db).apply_bulk(
+        "schedule_return_pickup",
+        {oid: {"set_fields": {"return.pickup_at": now}} for oid in order_oids},
+        now=now,
+    )
+    scheduled = [oid for oid, status in results.items() if status == "applied"]
+
+    if scheduled:
+        await log_audit(
+            db,
+            actor_id="system",
+            actor_role="system",
+            action="RETURN_PICKUP_SCHEDULED_BULK",
+            metadata={"order_ids": [str(oid) for oid in scheduled]}
+        )
+
+    await record_order_events(db, [
+        build_order_event(
+            order_id=oid,
+            event="RETURN_PICKUP_SCHEDULED",
+            actor_role="system",
+            created_at=now,
+        )
+        for oid in scheduled
+    ])
+
+    return _bulk_report(payload.order_ids, rejected, results)
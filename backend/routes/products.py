@@ -8,7 +8,8 @@ import re
 from database import get_db
 from utils.security import require_role
 from utils.sellers import get_verified_seller
-from utils.products import build_product_card
+from utils.products import build_product_card, card_image_variants
+from utils.media import get_image_variants
 
 router = APIRouter(prefix="/api/products", tags=["Products"])
 
@@ -95,6 +96,7 @@ async def search_products(
             "selling_price": p.get("selling_price"),
             "mrp": p.get("mrp"),
             "images": _product_images(p),
+            "image_variants": card_image_variants(p),
             "category": p.get("category"),
             "sub_category": p.get("sub_category"),
         })
@@ -177,7 +179,7 @@ async def recommended_products(limit: int = 20):
 
     cursor = db.products.find(
         {"active": True}
-    ).sort("rating", -1).limit(limit)
+    ).sort("rating.avg", -1).limit(limit)
 
     products = []
     async for p in cursor:
@@ -212,6 +214,7 @@ async def list_products(search: str = Query("")):
             "selling_price": p["selling_price"],
             "mrp": p.get("mrp"),
             "images": _product_images(p),
+            "image_variants": card_image_variants(p),
             "category": p.get("category"),
             "sub_category": p.get("sub_category"),
         })
@@ -244,6 +247,7 @@ async def product_detail(product_id: str):
         "selling_price": product["selling_price"],
         "mrp": product.get("mrp"),
         "images": _product_images(product),
+        "image_variants": product.get("image_variants") or [],
         "category": product.get("category"),
         "sub_category": product.get("sub_category"),
         "stock": product.get("stock", 0),
@@ -280,6 +284,8 @@ async def create_product(
             detail="Selling price cannot exceed MRP",
         )
 
+    images = [str(img) for img in data.images]
+
     product_doc = {
         "title": data.title.strip(),
         "description": data.description,
@@ -292,7 +298,8 @@ async def create_product(
         "stock": data.stock,
         "reserved_stock": 0,
 
-        "images": [str(img) for img in data.images],
+        "images": images,
+        "image_variants": await get_image_variants(db, images, seller["_id"]),
 
         "seller_id": seller["_id"],
         "active": True,
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Query, HTTPException
 from bson import ObjectId
 from datetime import datetime
 from database import get_db
+from utils.sellers import get_top_sellers, TOP_BRANDS_MAX
+from utils.products import card_image_variants
 
 router = APIRouter(
     prefix="/api/public",
@@ -41,6 +43,7 @@ def build_product_card(product, seller):
         "price": product.get("selling_price"),
         "mrp": product.get("mrp"),
         "image": product_images[0] if product_images else None,
+        "image_variants": card_image_variants(product),
         "rating": product.get("rating", 0),
         "review_count": product.get("review_count", 0),
         "seller": {
@@ -109,7 +112,7 @@ async def recommended_products(limit: int = 20):
     db = get_db()
     cursor = db.products.find(
         {"active": True}
-    ).sort("rating", -1).limit(limit)
+    ).sort("rating.avg", -1).limit(limit)
 
     products = []
 
@@ -179,25 +182,22 @@ async def flash_deals(limit: int = 20):
     return deals
 
 @router.get("/brands/top")
-async def top_brands(limit: int = 12):
+async def top_brands(limit: int = Query(12, ge=1, le=TOP_BRANDS_MAX)):
     db = get_db()
-    cursor = db.users.find(
-        {
-            "role": "seller",
-            "seller_status": "verified",
-            "is_frozen": False
-        },
+    sellers = await get_top_sellers(
+        db,
         {
             "seller_profile.brand_name": 1,
             "seller_profile.slug": 1,
             "seller_profile.logo_url": 1,
             "seller_profile.trust": 1
-        }
-    ).sort("seller_profile.trust.score", -1).limit(limit)
+        },
+        limit,
+    )
 
     result = []
 
-    async for s in cursor:
+    for s in sellers:
         logo = s["seller_profile"].get("logo_url")
 
         # sanitize logo url for frontend (Next/Image strict)
@@ -301,6 +301,7 @@ async def public_product(product_id: str):
             "price": product.get("selling_price"),
             "mrp": product.get("mrp"),
             "images": product.get("images") or product.get("image_urls", []),
+            "image_variants": product.get("image_variants") or [],
             "rating": product.get("rating", 0),
             "review_count": product.get("review_count", 0)
         },
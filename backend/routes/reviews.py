@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Literal
+from pymongo.errors import DuplicateKeyError
 
 from database import get_db
 from utils.security import require_role
 from utils.guards import parse_object_id
+from utils.product_ratings import apply_rating_change, get_product_rating
+from utils.reviews import get_review_page, REVIEW_PAGE_DEFAULT, REVIEW_PAGE_MAX
 
 router = APIRouter(
     prefix="/api/reviews",
@@ -73,38 +77,17 @@ async def create_review(
         "admin_note": None
     }
 
-    await db.reviews.insert_one(review)
-
-    # 4️⃣ Recalculate product rating (aggregation)
-    pipeline = [
-        {
-            "$match": {
-                "product_id": order["product_id"],
-                "is_visible": True
-            }
-        },
-        {
-            "$group": {
-                "_id": "$product_id",
-                "avg": {"$avg": "$rating"},
-                "count": {"$sum": 1}
-            }
-        }
-    ]
-
-    agg = await db.reviews.aggregate(pipeline).to_list(1)
-
-    if agg:
-        await db.products.update_one(
-            {"_id": order["product_id"]},
-            {
-                "$set": {
-                    "rating.avg": round(agg[0]["avg"], 1),
-                    "rating.count": agg[0]["count"]
-                }
-            }
+    try:
+        await db.reviews.insert_one(review)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400,
+            detail="Review already submitted for this order"
         )
 
+    # 4️⃣ Bump product rating counters
+    await apply_rating_change(db, order["product_id"], data.rating, 1)
+
     return {
         "message": "Review submitted successfully",
         "rating": data.rating
@@ -116,31 +99,34 @@ async def create_review(
 # -------------------------------------------------
 
 @router.get("/product/{product_id}")
-async def get_product_reviews(product_id: str):
+async def get_product_reviews(
+    product_id: str,
+    sort: Literal["newest", "highest", "lowest"] = "newest",
+    cursor: str | None = None,
+    limit: int = Query(REVIEW_PAGE_DEFAULT, ge=1, le=REVIEW_PAGE_MAX),
+):
     db = get_db()
+    pid = parse_object_id(product_id, "product_id")
 
-    reviews = []
-
-    cursor = db.reviews.find(
-        {
-            "product_id": parse_object_id(product_id, "product_id"),
-            "is_visible": True
-        },
-        {
-            "rating": 1,
-            "comment": 1,
-            "created_at": 1
-        }
-    ).sort("created_at", -1)
-
-    async for r in cursor:
-        reviews.append({
-            "rating": r["rating"],
-            "comment": r.get("comment"),
-            "created_at": r["created_at"]
-        })
+    page = await get_review_page(db, pid, sort=sort, cursor=cursor, limit=limit)
 
-    return {
-        "count": len(reviews),
-        "reviews": reviews
+    response = {
+        "page_count": len(page["reviews"]),
+        "reviews": [
+            {
+                "rating": r["rating"],
+                "comment": r.get("comment"),
+                "created_at": r["created_at"]
+            }
+            for r in page["reviews"]
+        ],
+        "next_cursor": page["next_cursor"],
     }
+
+    # Histogram and total come from the product's counters; first page only
+    if not cursor:
+        rating = await get_product_rating(db, pid)
+        response["count"] = rating["count"]
+        response["rating"] = rating
+
+    return response
@@ -1,14 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 from bson import ObjectId
 
 from database import get_db
 from utils.security import require_role
 from utils.audit import log_audit
 from utils.security import get_current_seller
-from utils.wallet_service import get_wallet_balance
+from utils.wallet_service import (
+    get_wallet_balance,
+    get_wallet_dashboard,
+    get_ledger_page,
+    LEDGER_PAGE_MAX,
+    add_ledger_entry,
+    ENTRY_EMERGENCY_PAYOUT_HOLD,
+)
+from utils.exports import export_seller_ledger
 from utils.trust import SELLER_TIER_CONFIG
 from config.env import EMERGENCY_PAYOUT_FEE_PERCENT, EMERGENCY_PAYOUT_FEE_FLAT
 from utils.crypto import encrypt_sensitive_value
@@ -357,25 +365,9 @@ async def get_seller_wallet(
     seller=Depends(require_role("seller")),
     db=Depends(get_db),
 ):
-    from utils.wallet_service import (
-        get_wallet_balance,
-        get_reserve_balance,
-        get_wallet_summary,
-    )
-
-    seller_id = seller["_id"]
-
-    available_balance = await get_wallet_balance(db, seller_id)
-    reserved_balance = await get_reserve_balance(db, seller_id)
-    summary = await get_wallet_summary(db, seller_id)
-
-    ledger = (
-        await db.wallet_ledger
-        .find({"seller_id": seller_id})
-        .sort("created_at", -1)
-        .limit(50)
-        .to_list(50)
-    )
+    # Single read of the wallet_balances snapshot
+    wallet = await get_wallet_dashboard(db, seller["_id"])
+    summary = wallet["summary"]
 
     seller_tier = seller.get("seller_tier", "standard")
     tier_config = SELLER_TIER_CONFIG.get(seller_tier, SELLER_TIER_CONFIG["standard"])
@@ -389,8 +381,8 @@ async def get_seller_wallet(
 
     return {
         "balances": {
-            "available": available_balance,
-            "reserved": reserved_balance,
+            "available": wallet["available"],
+            "reserved": wallet["reserved"],
         },
         "totals": {
             "earned": summary.get("SALE_CREDIT", 0),
@@ -408,10 +400,32 @@ async def get_seller_wallet(
             "policy_release_type": tier_config.get("release_type"),
             "policy_release_note": tier_config.get("release_note"),
         },
-        "ledger": ledger,
+        "ledger": wallet["ledger"],
+        "ledger_next_cursor": wallet["next_cursor"],
     }
 
 
+@router.get("/wallet/ledger")
+async def get_seller_wallet_ledger(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=LEDGER_PAGE_MAX),
+    seller=Depends(require_role("seller")),
+    db=Depends(get_db),
+):
+    return await get_ledger_page(db, seller["_id"], cursor=cursor, limit=limit)
+
+
+@router.get("/wallet/ledger/export")
+async def export_seller_wallet_ledger(
+    fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    seller=Depends(require_role("seller")),
+    db=Depends(get_db),
+):
+    return export_seller_ledger(db, seller["_id"], fmt, since=since, until=until)
+
+
 @router.post("/wallet/emergency-payout")
 async def request_emergency_payout(
     data: EmergencyPayoutRequest,
@@ -456,16 +470,14 @@ async def request_emergency_payout(
 
     res = await db.payout_requests.insert_one(payout_doc)
 
-    await db.wallet_ledger.insert_one({
-        "seller_id": seller["_id"],
-        "order_id": None,
-        "entry_type": "EMERGENCY_PAYOUT_HOLD",
-        "credit": 0,
-        "debit": total_debit,
-        "reason_code": "EMERGENCY_PAYOUT_REQUESTED",
-        "reference_id": res.inserted_id,
-        "created_at": datetime.utcnow(),
-    })
+    await add_ledger_entry(
+        db,
+        seller["_id"],
+        ENTRY_EMERGENCY_PAYOUT_HOLD,
+        debit=total_debit,
+        reason_code="EMERGENCY_PAYOUT_REQUESTED",
+        reference_id=res.inserted_id,
+    )
 
     return {
         "message": "Emergency payout requested",
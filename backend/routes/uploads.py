@@ -1,9 +1,11 @@
 # backend/routes/uploads.py
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from typing import List
+
+from fastapi import APIRouter, Depends, UploadFile, File
 
 from database import get_db
-from utils.cloudinary import upload_image
+from utils.media import store_image, store_product_images
 from utils.security import require_role
 
 router = APIRouter(prefix="/api/uploads", tags=["Uploads"])
@@ -18,25 +20,8 @@ async def upload_brand_logo(
     seller=Depends(require_role("seller")),
     db=Depends(get_db),
 ):
-    # validate file type
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only image files are allowed",
-        )
-
-    # upload to cloudinary
-    result = upload_image(
-        file.file,
-        folder=f"brandcart/brands/{seller['_id']}",
-    )
-
-    logo_url = result.get("secure_url")
-    if not logo_url:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Brand logo upload failed",
-        )
+    # size-capped, type-sniffed, stored off the event loop
+    logo_url = await store_image(file, folder=f"brandcart/brands/{seller['_id']}")
 
     # update seller profile
     await db.users.update_one(
@@ -57,30 +42,38 @@ async def upload_brand_logo(
 async def upload_product_image(
     file: UploadFile = File(...),
     seller=Depends(require_role("seller")),
+    db=Depends(get_db),
 ):
-    # validate file type
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only image files are allowed",
-        )
-
-    # upload to cloudinary
-    result = upload_image(
-        file.file,
-        folder=f"brandcart/products/{seller['_id']}",
+    # original + thumb / card / pdp variants
+    [image] = await store_product_images(
+        db, [file], folder=f"brandcart/products/{seller['_id']}", owner_id=seller["_id"],
     )
 
-    image_url = result.get("secure_url")
-    if not image_url:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Product image upload failed",
-        )
-
     # DO NOT save anything in DB here
     # frontend will collect URLs and send them to product create API
     return {
         "message": "Product image uploaded",
-        "image_url": image_url,
+        "image_url": image["url"],
+        "variants": image["variants"],
+    }
+
+
+# =========================
+# UPLOAD PRODUCT IMAGES (BATCH)
+# =========================
+@router.post("/product-images")
+async def upload_product_images(
+    files: List[UploadFile] = File(...),
+    seller=Depends(require_role("seller")),
+    db=Depends(get_db),
+):
+    # all files are validated before any is stored; uploads run concurrently
+    images = await store_product_images(
+        db, files, folder=f"brandcart/products/{seller['_id']}", owner_id=seller["_id"],
+    )
+
+    return {
+        "message": "Product images uploaded",
+        "image_urls": [image["url"] for image in images],
+        "variants": [image["variants"] for image in images],
     }
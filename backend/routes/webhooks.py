@@ -1,23 +1,22 @@
 from fastapi import APIRouter, Request, HTTPException
-from datetime import datetime
 import hmac
 import hashlib
 import json
 import os
 
-from bson import ObjectId
 from database import get_db
-from utils.order_timeline import record_order_event
 from utils.razorpay import verify_webhook_signature
 from utils.payouts import verify_razorpayx_webhook_signature
-from utils.idempotency import (
-    reserve_idempotency_key,
-    complete_idempotency_key,
+from utils.webhook_inbox import (
+    append_webhook_event,
+    append_webhook_events,
+    build_inbox_event,
 )
 
 router = APIRouter(prefix="/api/webhooks", tags=["Webhooks"])
 
 DELIVERY_SECRET = os.getenv("DELIVERY_WEBHOOK_SECRET")
+DELIVERY_BATCH_MAX_EVENTS = 500
 
 
 # =========================================================
@@ -39,7 +38,18 @@ def verify_signature(raw_body: bytes, received_signature: str):
 
 
 # =========================================================
-# DELIVERY WEBHOOK (IDEMPOTENT, SAFE)
+# RAW BODY PARSING
+# =========================================================
+
+def parse_json_body(raw_body: bytes):
+    try:
+        return json.loads(raw_body.decode("utf-8"))
+    except Exception:
+        raise HTTPException(400, "Invalid JSON payload")
+
+
+# =========================================================
+# DELIVERY WEBHOOK (ACCEPT-THEN-PROCESS)
 # =========================================================
 
 @router.post("/delivery")
@@ -49,9 +59,9 @@ async def delivery_webhook(request: Request):
 
     Guarantees:
     - Signature verified
-    - Fully idempotent
-    - Timeline only (no money movement)
-    - Safe for retries
+    - Durably queued in webhook_inbox before 200 is returned
+    - Deduped on (waybill, status)
+    - Processed asynchronously (utils.webhook_handlers.handle_delivery_event)
     """
 
     signature = request.headers.get("X-Delivery-Signature")
@@ -61,93 +71,89 @@ async def delivery_webhook(request: Request):
     raw_body = await request.body()
     verify_signature(raw_body, signature)
 
-    try:
-        payload = json.loads(raw_body.decode("utf-8"))
-    except Exception:
-        raise HTTPException(400, "Invalid JSON payload")
+    payload = parse_json_body(raw_body)
 
     waybill = payload.get("waybill")
     status = payload.get("status")
-    delivered_at = payload.get("delivered_at")
 
     if not waybill or not status:
         return {"ok": True, "ignored": True}
 
-    db = get_db()
+    accepted = await append_webhook_event(
+        get_db(),
+        source="delivery",
+        event_key=f"{waybill}:{status}",
+        partition_key=f"waybill:{waybill}",
+        payload=payload,
+    )
 
-    # -----------------------------------------------------
-    # IDEMPOTENCY GUARD (CRITICAL)
-    # -----------------------------------------------------
-    idempotency_key = f"delivery:{waybill}:{status}"
+    return {"ok": True, "accepted": accepted}
 
-    existing = await reserve_idempotency_key(
-        db=db,
-        key=idempotency_key,
-        scope="delivery_webhook",
-    )
 
-    if existing:
-        return existing
-
-    # -----------------------------------------------------
-    # FIND ORDER
-    # -----------------------------------------------------
-    order = await db.orders.find_one({
-        "tracking.tracking_id": waybill
-    })
-
-    if not order:
-        response = {"ok": True, "order": "not_found"}
-        await complete_idempotency_key(
-            db=db,
-            key=idempotency_key,
-            scope="delivery_webhook",
-            response=response,
-        )
-        return response
-
-    # -----------------------------------------------------
-    # RECORD TIMELINE EVENT (SOURCE OF TRUTH)
-    # -----------------------------------------------------
-    await record_order_event(
-        db=db,
-        order_id=order["_id"],
-        event="COURIER_STATUS_UPDATE",
-        actor_role="system",
-        actor_id=None,
-        metadata={
-            "waybill": waybill,
-            "courier_status": status,
-            "delivered_at": delivered_at,
-        }
-    )
+# =========================================================
+# DELIVERY WEBHOOK (BATCH)
+# =========================================================
+
+@router.post("/delivery/batch")
+async def delivery_webhook_batch(request: Request):
+    """
+    Batch courier webhook: {"events": [{waybill, status, delivered_at}, ...]}.
+
+    One signature over the whole body; events are deduped on
+    (waybill, status) and queued with a single insert_many.
+    """
+
+    signature = request.headers.get("X-Delivery-Signature")
+    if not signature:
+        raise HTTPException(401, "Missing signature")
+
+    raw_body = await request.body()
+    verify_signature(raw_body, signature)
 
-    # -----------------------------------------------------
-    # OPTIONAL STATE UPDATE (NON-FINAL)
-    # -----------------------------------------------------
-    if status == "DELIVERED":
-        await db.orders.update_one(
-            {"_id": order["_id"]},
-            {
-                "$set": {
-                    "status": "delivery_reported",
-                    "delivery_reported_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow(),
-                }
-            }
+    payload = parse_json_body(raw_body)
+
+    raw_events = payload.get("events") if isinstance(payload, dict) else payload
+    if not isinstance(raw_events, list):
+        raise HTTPException(400, "events must be a list")
+
+    if len(raw_events) > DELIVERY_BATCH_MAX_EVENTS:
+        raise HTTPException(400, f"At most {DELIVERY_BATCH_MAX_EVENTS} events per batch")
+
+    # Dedupe within the batch (last event wins per waybill + status)
+    events = {}
+    for item in raw_events:
+        if not isinstance(item, dict):
+            continue
+        waybill = item.get("waybill")
+        status = item.get("status")
+        if not isinstance(waybill, str) or not isinstance(status, str) or not waybill or not status:
+            continue
+        events[f"{waybill}:{status}"] = item
+
+    docs = [
+        build_inbox_event(
+            source="delivery",
+            event_key=key,
+            partition_key=f"waybill:{item['waybill']}",
+            payload=item,
         )
+        for key, item in events.items()
+    ]
 
-    response = {"ok": True}
+    accepted = await append_webhook_events(get_db(), docs)
 
-    await complete_idempotency_key(
-        db=db,
-        key=idempotency_key,
-        scope="delivery_webhook",
-        response=response,
-    )
+    return {
+        "ok": True,
+        "received": len(raw_events),
+        "accepted": accepted,
+        "duplicates": len(docs) - accepted,
+        "ignored": len(raw_events) - len(docs),
+    }
 
-    return response
 
+# =========================================================
+# RAZORPAY PAYMENT WEBHOOK
+# =========================================================
 
 @router.post("/razorpay")
 async def razorpay_webhook(request: Request):
@@ -159,10 +165,7 @@ async def razorpay_webhook(request: Request):
     if not verify_webhook_signature(raw_body=raw_body, received_signature=signature):
         raise HTTPException(401, "Invalid Razorpay signature")
 
-    try:
-        payload = json.loads(raw_body.decode("utf-8"))
-    except Exception:
-        raise HTTPException(400, "Invalid JSON payload")
+    payload = parse_json_body(raw_body)
 
     event = payload.get("event")
     payment_entity = (
@@ -173,93 +176,24 @@ async def razorpay_webhook(request: Request):
 
     razorpay_payment_id = payment_entity.get("id")
     razorpay_order_id = payment_entity.get("order_id")
-    payment_status = payment_entity.get("status")
 
     if not razorpay_payment_id or not razorpay_order_id:
         return {"ok": True, "ignored": True}
 
-    db = get_db()
-    idempotency_key = f"razorpay:{event}:{razorpay_payment_id}"
-
-    existing = await reserve_idempotency_key(
-        db=db,
-        key=idempotency_key,
-        scope="razorpay_webhook",
-    )
-    if existing:
-        return existing
-
-    if event != "payment.captured" or payment_status != "captured":
-        response = {"ok": True, "ignored": True, "event": event}
-        await complete_idempotency_key(
-            db=db,
-            key=idempotency_key,
-            scope="razorpay_webhook",
-            response=response,
-        )
-        return response
-
-    order = await db.orders.find_one({
-        "payment.method": "RAZORPAY",
-        "payment.gateway_order_id": razorpay_order_id,
-    })
-
-    if not order:
-        response = {"ok": True, "order": "not_found"}
-        await complete_idempotency_key(
-            db=db,
-            key=idempotency_key,
-            scope="razorpay_webhook",
-            response=response,
-        )
-        return response
-
-    if order.get("payment", {}).get("status") == "paid":
-        response = {"ok": True, "order": "already_paid"}
-        await complete_idempotency_key(
-            db=db,
-            key=idempotency_key,
-            scope="razorpay_webhook",
-            response=response,
-        )
-        return response
-
-    now = datetime.utcnow()
-    update_res = await db.orders.update_one(
-        {"_id": order["_id"], "payment.status": "pending"},
-        {
-            "$set": {
-                "payment.status": "paid",
-                "payment.gateway_payment_id": razorpay_payment_id,
-                "payment.paid_at": now,
-                "updated_at": now,
-            }
-        },
+    accepted = await append_webhook_event(
+        get_db(),
+        source="razorpay",
+        event_key=f"{event}:{razorpay_payment_id}",
+        partition_key=f"razorpay_order:{razorpay_order_id}",
+        payload=payload,
     )
 
-    if update_res.modified_count == 1:
-        await record_order_event(
-            db=db,
-            order_id=order["_id"],
-            event="PAYMENT_CAPTURED_WEBHOOK",
-            actor_role="system",
-            actor_id=None,
-            metadata={
-                "gateway": "razorpay",
-                "razorpay_order_id": razorpay_order_id,
-                "razorpay_payment_id": razorpay_payment_id,
-            },
-        )
+    return {"ok": True, "accepted": accepted}
 
-    response = {"ok": True, "updated": update_res.modified_count == 1}
-    await complete_idempotency_key(
-        db=db,
-        key=idempotency_key,
-        scope="razorpay_webhook",
-        response=response,
-    )
-    return response
 
+# =========================================================
+# RAZORPAYX PAYOUT WEBHOOK
+# =========================================================
 
 @router.post("/razorpayx/payouts")
 async def razorpayx_payout_webhook(request: Request):
@@ -271,10 +205,7 @@ async def razorpayx_payout_webhook(request: Request):
     if not verify_razorpayx_webhook_signature(raw_body=raw_body, received_signature=signature):
         raise HTTPException(401, "Invalid RazorpayX signature")
 
-    try:
-        payload = json.loads(raw_body.decode("utf-8"))
-    except Exception:
-        raise HTTPException(400, "Invalid JSON payload")
+    payload = parse_json_body(raw_body)
 
     event = payload.get("event")
     payout_entity = (
@@ -284,73 +215,16 @@ async def razorpayx_payout_webhook(request: Request):
     )
 
     provider_payout_id = payout_entity.get("id")
-    provider_status = payout_entity.get("status")
-    reference_id = payout_entity.get("reference_id")
-    failure_reason = payout_entity.get("status_details", {}).get("description") or payout_entity.get("narration")
 
     if not provider_payout_id:
         return {"ok": True, "ignored": True}
 
-    db = get_db()
-    idempotency_key = f"razorpayx_payout:{event}:{provider_payout_id}"
-    existing = await reserve_idempotency_key(
-        db=db,
-        key=idempotency_key,
-        scope="razorpayx_payout_webhook",
-    )
-    if existing:
-        return existing
-
-    payout_request = await db.payout_requests.find_one({
-        "$or": [
-            {"provider_payout_id": provider_payout_id},
-            {"_id": ObjectId(reference_id)} if ObjectId.is_valid(reference_id or "") else {"_id": None},
-        ]
-    })
-
-    if not payout_request:
-        response = {"ok": True, "request": "not_found"}
-        await complete_idempotency_key(
-            db=db,
-            key=idempotency_key,
-            scope="razorpayx_payout_webhook",
-            response=response,
-        )
-        return response
-
-    update_fields = {
-        "provider": "razorpayx",
-        "provider_payout_id": provider_payout_id,
-        "provider_payout_status": provider_status,
-        "provider_event": event,
-        "provider_webhook_at": datetime.utcnow(),
-    }
-
-    normalized_status = (provider_status or "").lower()
-    if normalized_status in {"processed"}:
-        update_fields["status"] = "approved"
-        update_fields["transfer_processed_at"] = datetime.utcnow()
-    elif normalized_status in {"rejected", "failed", "reversed", "cancelled"}:
-        update_fields["status"] = "failed"
-        update_fields["failure_reason"] = failure_reason or "Provider marked payout failed"
-        update_fields["failed_at"] = datetime.utcnow()
-    elif normalized_status in {"queued", "pending", "processing"}:
-        update_fields["status"] = "processing"
-
-    await db.payout_requests.update_one(
-        {"_id": payout_request["_id"]},
-        {"$set": update_fields},
+    accepted = await append_webhook_event(
+        get_db(),
+        source="razorpayx_payout",
+        event_key=f"{event}:{provider_payout_id}",
+        partition_key=f"payout:{provider_payout_id}",
+        payload=payload,
     )
 
-    response = {
-        "ok": True,
-        "request_id": str(payout_request["_id"]),
-        "provider_status": provider_status,
-    }
-    await complete_idempotency_key(
-        db=db,
-        key=idempotency_key,
-        scope="razorpayx_payout_webhook",
-        response=response,
-    )
-    return response
+    return {"ok": True, "accepted": accepted}
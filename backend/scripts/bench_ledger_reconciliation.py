@@ -0,0 +1,183 @@
+"""
+Benchmark the nightly ledger reconciliation (utils/ledger_reconciliation.py)
+against a synthetic ledger.
+
+Seeds settled orders with four postings each (commission, platform fee,
+sale credit, reserve hold), so the default 2.5M orders is 10M ledger rows,
+breaks a known number of them, then times reconcile_ledger and checks it
+found exactly those issues.
+
+    cd backend
+    export MONGODB_URI=mongodb://localhost:27017/bench
+    python -m scripts.bench_ledger_reconciliation
+    python -m scripts.bench_ledger_reconciliation --orders 100000 --keep
+
+MONGODB_URI (with a database name) is required because utils.wallet_service
+imports database.py; the benchmark itself only uses the server from it and
+runs against its own database (--db, dropped afterwards unless --keep);
+--skip-seed reuses one kept from an earlier run (pass --keep again to
+keep it for the next).
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config.constants import SELLER_RESERVE_CONFIG
+from utils.indexes import ensure_indexes
+from utils.ledger_reconciliation import (
+    RECONCILE_ORDER_QUERY,
+    RECONCILED_ENTRY_TYPES,
+    reconcile_ledger,
+)
+from utils.wallet_service import (
+    ENTRY_COMMISSION_DEBIT,
+    ENTRY_SALE_CREDIT,
+    build_settlement_entries,
+)
+
+SEED_BATCH_ORDERS = 5000
+SELLER_COUNT = 2000
+COMMISSION_PERCENT = 12
+PLATFORM_FEE = 20
+
+
+def _plan_stages(plan) -> list[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"] + (f"({plan['indexName']})" if "indexName" in plan else ""))
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def _build_order(seller: dict, created_at: datetime) -> tuple[dict, list[dict]]:
+    order_id = ObjectId()
+    subtotal = float(random.randint(200, 20000))
+    reserve = round(subtotal * SELLER_RESERVE_CONFIG.get(seller["seller_tier"], 10) / 100, 2)
+
+    order = {
+        "_id": order_id,
+        "seller_id": seller["_id"],
+        "status": "delivered",
+        "pricing": {
+            "subtotal": subtotal,
+            "commission_percent": COMMISSION_PERCENT,
+            "platform_fee": PLATFORM_FEE,
+            "reserve_amount": reserve,
+        },
+        "settlement": {"status": "settled"},
+        "created_at": created_at,
+    }
+    entries = build_settlement_entries(
+        seller, order_id, subtotal, COMMISSION_PERCENT, PLATFORM_FEE, created_at=created_at,
+    )
+    return order, entries
+
+
+async def seed(db, order_count: int, broken: int) -> dict:
+    """
+    Inserts the orders and their postings. The first `broken` orders lose
+    their commission entry and the next `broken` get a wrong sale credit.
+    """
+    sellers = [{"_id": ObjectId(), "seller_tier": "standard"} for _ in range(SELLER_COUNT)]
+    start = datetime.utcnow() - timedelta(days=365)
+    step = timedelta(days=364) / max(order_count, 1)
+    rows = 0
+    started = time.perf_counter()
+
+    for offset in range(0, order_count, SEED_BATCH_ORDERS):
+        orders, entries = [], []
+        for i in range(offset, min(offset + SEED_BATCH_ORDERS, order_count)):
+            order, postings = _build_order(random.choice(sellers), start + step * i)
+            if i < broken:
+                postings = [e for e in postings if e["entry_type"] != ENTRY_COMMISSION_DEBIT]
+            elif i < 2 * broken:
+                for e in postings:
+                    if e["entry_type"] == ENTRY_SALE_CREDIT:
+                        e["credit"] += 1
+            orders.append(order)
+            entries.extend(postings)
+
+        await asyncio.gather(
+            db.orders.insert_many(orders, ordered=False),
+            db.wallet_ledger.insert_many(entries, ordered=False),
+        )
+        rows += len(entries)
+        if (offset // SEED_BATCH_ORDERS) % 20 == 0:
+            print(f"  seeded {offset + len(orders):,} orders / {rows:,} ledger rows")
+
+    return {"orders": order_count, "ledger_rows": rows, "seconds": time.perf_counter() - started}
+
+
+async def explain_scans(db):
+    """
+    Winning plans of the two streams the reconciliation merge-joins; both
+    should be index scans with no blocking SORT.
+    """
+    orders = await db.orders.find(RECONCILE_ORDER_QUERY, {"_id": 1}).sort("_id", 1).explain()
+    ledger = await (
+        db.wallet_ledger
+        .find({"order_id": {"$type": "objectId"}, "entry_type": {"$in": RECONCILED_ENTRY_TYPES}}, {"_id": 1})
+        .sort([("order_id", 1), ("entry_type", 1)])
+        .explain()
+    )
+    print("  orders plan:", " <- ".join(_plan_stages(orders["queryPlanner"]["winningPlan"])))
+    print("  ledger plan:", " <- ".join(_plan_stages(ledger["queryPlanner"]["winningPlan"])))
+
+
+async def main(args):
+    client = AsyncIOMotorClient(args.mongo_uri)
+    db = client[args.db]
+    try:
+        if not args.skip_seed:
+            await client.drop_database(args.db)
+            await ensure_indexes(db)
+            print(f"Seeding {args.orders:,} settled orders ...")
+            seeded = await seed(db, args.orders, args.broken)
+            print(f"Seeded {seeded['ledger_rows']:,} ledger rows in {seeded['seconds']:.1f}s")
+
+        await explain_scans(db)
+
+        timings = []
+        report = None
+        for run in range(args.runs):
+            started = time.perf_counter()
+            report = await reconcile_ledger(db)
+            timings.append(time.perf_counter() - started)
+            print(
+                f"Run {run + 1}: {timings[-1]:.1f}s, orders={report['orders_checked']:,} "
+                f"entries={report['entries_checked']:,} "
+                f"({report['entries_checked'] / timings[-1]:,.0f} entries/s) counts={report['counts']}"
+            )
+
+        if not args.skip_seed:
+            expected = {"missing": args.broken, "duplicate": 0, "mismatched": args.broken, "unexpected": 0}
+            status = "OK" if report["counts"] == expected else f"UNEXPECTED (wanted {expected})"
+            print(f"Issue counts: {status}")
+        print(f"Best of {args.runs}: {min(timings):.1f}s")
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI"))
+    parser.add_argument("--db", default="bench_ledger_reconciliation")
+    parser.add_argument("--orders", type=int, default=2_500_000, help="settled orders to seed (4 ledger rows each)")
+    parser.add_argument("--broken", type=int, default=100, help="orders seeded with a missing / a mismatched entry")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse a database kept with --keep")
+    parser.add_argument("--keep", action="store_true", help="do not drop the database afterwards")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,146 @@
+"""
+Benchmark the fleet-wide trust recompute (utils/trust_recompute.py) against
+synthetic sellers.
+
+Seeds --sellers sellers (default 100k) with a skewed number of orders each
+and seller_stats rows that have drifted for a share of them, then times:
+
+    dry run     computes the diff, writes nothing
+    live run    writes trust / tier and corrects seller_stats
+    live again  everything already matches, so nothing should be written
+
+    cd backend
+    MONGO_URI=mongodb://localhost:27017 python -m scripts.bench_trust_recompute
+    python -m scripts.bench_trust_recompute --sellers 10000 --keep
+
+Runs against its own database (--db, dropped afterwards unless --keep).
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from utils.indexes import ensure_indexes
+from utils.seller_stats import (
+    STAT_CANCELLED_ORDERS,
+    STAT_DELIVERED_ORDERS,
+    STAT_TOTAL_ORDERS,
+)
+from utils.trust_recompute import recompute_all_seller_trust
+
+SEED_BATCH = 10_000
+ORDER_STATUSES = ["delivered"] * 8 + ["cancelled", "shipped"]
+
+
+async def seed(db, seller_count: int, mean_orders: int, drift_percent: float) -> dict:
+    """
+    Sellers get an exponentially distributed order count (a few large, many
+    small). drift_percent of seller_stats rows are off by a few orders.
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    sellers, orders, stats = [], [], []
+    totals = {"sellers": 0, "orders": 0, "drifted": 0}
+
+    async def flush(final=False):
+        if len(orders) >= SEED_BATCH or final:
+            if orders:
+                await db.orders.insert_many(orders, ordered=False)
+            orders.clear()
+        if len(sellers) >= SEED_BATCH or final:
+            if sellers:
+                await db.users.insert_many(sellers, ordered=False)
+                await db.seller_stats.insert_many(stats, ordered=False)
+            sellers.clear()
+            stats.clear()
+
+    for _ in range(seller_count):
+        seller_id = ObjectId()
+        sellers.append({
+            "_id": seller_id,
+            "role": "seller",
+            "seller_status": random.choice(["verified", "verified", "pending"]),
+            "seller_tier": "standard",
+            "created_at": now,
+        })
+
+        counts = {STAT_TOTAL_ORDERS: 0, STAT_DELIVERED_ORDERS: 0, STAT_CANCELLED_ORDERS: 0}
+        for _ in range(int(random.expovariate(1 / mean_orders)) if mean_orders else 0):
+            status = random.choice(ORDER_STATUSES)
+            orders.append({"seller_id": seller_id, "status": status, "created_at": now})
+            counts[STAT_TOTAL_ORDERS] += 1
+            if status == "delivered":
+                counts[STAT_DELIVERED_ORDERS] += 1
+            elif status == "cancelled":
+                counts[STAT_CANCELLED_ORDERS] += 1
+        totals["orders"] += counts[STAT_TOTAL_ORDERS]
+
+        if random.random() * 100 < drift_percent:
+            counts[STAT_DELIVERED_ORDERS] += random.randint(1, 3)
+            totals["drifted"] += 1
+        stats.append({"_id": seller_id, **counts})
+
+        totals["sellers"] += 1
+        await flush()
+        if totals["sellers"] % (SEED_BATCH * 5) == 0:
+            print(f"  seeded {totals['sellers']:,} sellers / {totals['orders']:,} orders")
+
+    await flush(final=True)
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+
+async def timed_run(db, label: str, *, dry_run: bool) -> dict:
+    started = time.perf_counter()
+    summary = await recompute_all_seller_trust(db, dry_run=dry_run)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label}: {elapsed:.1f}s, sellers={summary['sellers_processed']:,} "
+        f"({summary['sellers_processed'] / elapsed:,.0f}/s) changed={summary['changed']:,} "
+        f"tier_changes={summary['tier_changes']}"
+    )
+    return summary
+
+
+async def main(args):
+    client = AsyncIOMotorClient(args.mongo_uri)
+    db = client[args.db]
+    try:
+        await client.drop_database(args.db)
+        await ensure_indexes(db)
+
+        print(f"Seeding {args.sellers:,} sellers ...")
+        seeded = await seed(db, args.sellers, args.orders_per_seller, args.drift_percent)
+        print(
+            f"Seeded {seeded['sellers']:,} sellers, {seeded['orders']:,} orders, "
+            f"{seeded['drifted']:,} drifted stats rows in {seeded['seconds']:.1f}s"
+        )
+
+        await timed_run(db, "Dry run", dry_run=True)
+        await timed_run(db, "Live run", dry_run=False)
+
+        drifted = await db.seller_stats.count_documents({"rebuilt_at": {"$exists": True}})
+        print(f"seller_stats rows corrected: {drifted:,} (seeded drift {seeded['drifted']:,})")
+
+        again = await timed_run(db, "Live again", dry_run=False)
+        print(f"Idempotent: {'OK' if again['changed'] == 0 else 'NO'}")
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI") or os.getenv("MONGODB_URI") or "mongodb://localhost:27017")
+    parser.add_argument("--db", default="bench_trust_recompute")
+    parser.add_argument("--sellers", type=int, default=100_000)
+    parser.add_argument("--orders-per-seller", type=int, default=20, help="mean orders per seller")
+    parser.add_argument("--drift-percent", type=float, default=5.0, help="share of seller_stats rows seeded wrong")
+    parser.add_argument("--keep", action="store_true", help="do not drop the database afterwards")
+    asyncio.run(main(parser.parse_args()))
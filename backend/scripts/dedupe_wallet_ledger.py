@@ -0,0 +1,111 @@
+"""
+Remove duplicate (order_id, entry_type) postings from wallet_ledger so
+wallet_ledger_order_entry_unique can be built (startup refuses to run
+without it).
+
+For each duplicated pair the earliest posting (lowest _id) is kept. The
+others are copied to wallet_ledger_duplicates and then deleted. Each
+affected seller's snapshot checkpoint is reset and verified, so
+wallet_balances is corrected from the cleaned ledger.
+
+    cd backend
+    MONGO_URI=mongodb://localhost:27017/brandcart python -m scripts.dedupe_wallet_ledger
+    python -m scripts.dedupe_wallet_ledger --apply
+
+Without --apply it only reports what would be removed. Sellers reported as
+"active" or "busy" had ledger writes in flight; their checkpoint is already
+reset, so the wallet balance verifier repairs them on its next quiet pass.
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from utils.wallet_balances import verify_wallet_balance
+
+DEDUPE_BATCH = 500
+
+
+def _duplicates_pipeline() -> list[dict]:
+    return [
+        {"$match": {"order_id": {"$type": "objectId"}}},
+        {"$group": {
+            "_id": {"order_id": "$order_id", "entry_type": "$entry_type"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+
+
+async def _archive(db, extra_ids: list, now: datetime) -> int:
+    rows = await db.wallet_ledger.find({"_id": {"$in": extra_ids}}).to_list(None)
+    if not rows:
+        return 0
+    for row in rows:
+        row["archived_at"] = now
+    # Re-runs after a partial failure may find rows already archived
+    await db.wallet_ledger_duplicates.delete_many({"_id": {"$in": extra_ids}})
+    await db.wallet_ledger_duplicates.insert_many(rows, ordered=False)
+    result = await db.wallet_ledger.delete_many({"_id": {"$in": [r["_id"] for r in rows]}})
+    return result.deleted_count
+
+
+async def main(args):
+    db = AsyncIOMotorClient(args.mongo_uri).get_default_database()
+    now = datetime.utcnow()
+
+    summary = {"pairs": 0, "extra_rows": 0, "removed": 0}
+    sellers = set()
+    batch = []
+
+    async def flush():
+        if args.apply and batch:
+            summary["removed"] += await _archive(db, list(batch), now)
+        batch.clear()
+
+    async for group in db.wallet_ledger.aggregate(_duplicates_pipeline(), allowDiskUse=True):
+        keep, *extra = sorted(group["ids"])
+        summary["pairs"] += 1
+        summary["extra_rows"] += len(extra)
+        batch.extend(extra)
+
+        kept = await db.wallet_ledger.find_one({"_id": keep}, {"seller_id": 1})
+        sellers.add(kept["seller_id"])
+        if args.verbose:
+            print(f"  order={group['_id']['order_id']} type={group['_id']['entry_type']} keep={keep} drop={extra}")
+        if len(batch) >= DEDUPE_BATCH:
+            await flush()
+    await flush()
+
+    print(
+        f"Duplicated pairs: {summary['pairs']:,}, extra rows: {summary['extra_rows']:,}, "
+        f"sellers: {len(sellers):,}"
+    )
+    if not args.apply:
+        print("Dry run; pass --apply to archive and delete the extra rows.")
+        return
+
+    print(f"Archived to wallet_ledger_duplicates and removed: {summary['removed']:,}")
+
+    statuses = {}
+    for seller_id in sellers:
+        # The checkpoint still counts the deleted rows; start from the ledger
+        await db.wallet_balances.update_one({"_id": seller_id}, {"$unset": {"checkpoint": ""}})
+        snapshot = await db.wallet_balances.find_one({"_id": seller_id})
+        status = await verify_wallet_balance(db, snapshot) if snapshot else "no_snapshot"
+        statuses[status] = statuses.get(status, 0) + 1
+        if status in ("active", "busy"):
+            print(f"  seller {seller_id}: {status}, left to the balance verifier")
+    print(f"Snapshots verified: {statuses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI") or os.getenv("MONGODB_URI"),
+                        help="must name the database")
+    parser.add_argument("--apply", action="store_true", help="archive and delete (default: report only)")
+    parser.add_argument("--verbose", action="store_true", help="print every duplicated pair")
+    asyncio.run(main(parser.parse_args()))
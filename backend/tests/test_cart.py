@@ -0,0 +1,79 @@
+from utils.cart import build_cart_line
+
+SELLER_ID = "seller-1"
+VERIFIED_SELLER = {
+    "_id": SELLER_ID,
+    "seller_status": "verified",
+    "seller_profile": {"brand_name": "Acme", "slug": "acme"},
+}
+
+
+def _product(**overrides) -> dict:
+    product = {
+        "_id": "product-1",
+        "title": "Kettle",
+        "selling_price": 500,
+        "mrp": 650,
+        "stock": 10,
+        "active": True,
+        "seller_id": SELLER_ID,
+    }
+    product.update(overrides)
+    return product
+
+
+def _offer(**overrides) -> dict:
+    offer = {"_id": "offer-1", "seller_id": SELLER_ID, "offer_price": 450, "end_at": None}
+    offer.update(overrides)
+    return offer
+
+
+def test_line_in_stock_is_ok():
+    line = build_cart_line({"quantity": 2, "price_at_add": 500}, _product(), VERIFIED_SELLER, None)
+
+    assert line["status"] == "ok"
+    assert line["unit_price"] == 500
+    assert line["line_total"] == 1000
+    assert line["price_changed"] is False
+    assert line["offer"] is None
+    assert line["seller"] == {"id": SELLER_ID, "brand_name": "Acme", "slug": "acme"}
+
+
+def test_stock_statuses():
+    assert build_cart_line({"quantity": 1}, _product(stock=0), VERIFIED_SELLER, None)["status"] == "out_of_stock"
+    assert build_cart_line({"quantity": 3}, _product(stock=2), VERIFIED_SELLER, None)["status"] == "insufficient_stock"
+    assert build_cart_line({"quantity": 2}, _product(stock=2), VERIFIED_SELLER, None)["status"] == "ok"
+
+
+def test_inactive_product_or_unavailable_seller_is_unavailable():
+    frozen = {**VERIFIED_SELLER, "is_frozen": True}
+    pending = {**VERIFIED_SELLER, "seller_status": "pending"}
+
+    assert build_cart_line({}, _product(active=False), VERIFIED_SELLER, None)["status"] == "unavailable"
+    assert build_cart_line({}, _product(), frozen, None)["status"] == "unavailable"
+    assert build_cart_line({}, _product(), pending, None)["status"] == "unavailable"
+    assert build_cart_line({}, _product(), None, None)["status"] == "unavailable"
+    # Unavailable wins over stock
+    assert build_cart_line({}, _product(active=False, stock=0), VERIFIED_SELLER, None)["status"] == "unavailable"
+
+
+def test_price_changed_compares_against_selling_price():
+    assert build_cart_line({"price_at_add": 450}, _product(), VERIFIED_SELLER, None)["price_changed"] is True
+    assert build_cart_line({"price_at_add": "500"}, _product(), VERIFIED_SELLER, None)["price_changed"] is False
+    assert build_cart_line({}, _product(), VERIFIED_SELLER, None)["price_changed"] is False
+
+
+def test_offer_sets_unit_price_but_not_price_changed():
+    line = build_cart_line({"quantity": 2, "price_at_add": 500}, _product(), VERIFIED_SELLER, _offer())
+
+    assert line["unit_price"] == 450
+    assert line["line_total"] == 900
+    assert line["offer"] == {"offer_id": "offer-1", "offer_price": 450, "ends_at": None}
+    assert line["price_changed"] is False
+
+
+def test_offer_from_another_seller_is_ignored():
+    line = build_cart_line({"quantity": 1}, _product(), VERIFIED_SELLER, _offer(seller_id="seller-2"))
+
+    assert line["unit_price"] == 500
+    assert line["offer"] is None
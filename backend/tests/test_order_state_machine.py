@@ -0,0 +1,166 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("pymongo")
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from utils.order_state_machine import OrderStateMachine
+
+NOW = datetime(2026, 3, 1, 12, 0)
+BUYER_ID = "buyer-1"
+
+
+# ==============================
+# build_filter
+# ==============================
+
+def test_filter_single_from_state_without_guard():
+    query = OrderStateMachine(None).build_filter("ship", "o1")
+
+    assert query == {"_id": "o1", "status": "created"}
+
+
+def test_filter_merges_scope_and_lists_multiple_from_states():
+    query = OrderStateMachine(None).build_filter("report_delivery", "o1", scope={"seller_id": "s1"})
+
+    assert query == {
+        "_id": "o1",
+        "seller_id": "s1",
+        "status": {"$in": ["shipped", "delivery_otp_pending"]},
+    }
+
+
+def test_filter_ands_guard_and_extra_filter():
+    spec = OrderStateMachine.transition("deliver")
+    extra = {"delivery_otp_hash": "h"}
+
+    query = OrderStateMachine(None).build_filter(
+        "deliver", "o1", scope={"buyer_id": BUYER_ID}, extra_filter=extra,
+    )
+
+    assert query == {"$and": [
+        {"_id": "o1", "buyer_id": BUYER_ID, "status": {"$in": ["delivery_otp_pending", "delivery_reported"]}},
+        spec["guard"],
+        extra,
+    ]}
+
+
+def test_filter_on_nested_state_field():
+    query = OrderStateMachine(None).build_filter("complete_return_pickup", "o1")
+
+    assert query == {"_id": "o1", "return.pickup_status": "scheduled"}
+
+
+def test_unknown_transition():
+    with pytest.raises(ValueError):
+        OrderStateMachine(None).build_filter("teleport", "o1")
+
+
+# ==============================
+# apply_bulk
+# ==============================
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def to_list(self, length):
+        return self.rows
+
+
+class FakeOrders:
+    """
+    find() answers the ownership read first, then the "which ones moved"
+    read; bulk_write returns modified_count or raises the given write errors.
+    """
+
+    def __init__(self, current, *, modified=None, write_errors=None, moved=()):
+        self.reads = [current, [{"_id": oid} for oid in moved]]
+        self.modified = modified
+        self.write_errors = write_errors
+        self.queries = []
+        self.ops = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return _Cursor(self.reads[len(self.queries) - 1])
+
+    async def bulk_write(self, ops, ordered=True):
+        self.ops = ops
+        if self.write_errors:
+            raise BulkWriteError({
+                "writeErrors": self.write_errors,
+                "nModified": len(ops) - len(self.write_errors),
+            })
+        return SimpleNamespace(modified_count=len(ops) if self.modified is None else self.modified)
+
+
+def _apply_bulk(orders, order_ids, name="ship"):
+    machine = OrderStateMachine(SimpleNamespace(orders=orders))
+    updates = {oid: {"set_fields": {"shipped_at": NOW}} for oid in order_ids}
+    return asyncio.run(machine.apply_bulk(name, updates, scope={"seller_id": "s1"}, now=NOW))
+
+
+def test_bulk_maps_missing_and_wrong_state_without_writing():
+    orders = FakeOrders([{"_id": "o2", "status": "shipped"}])
+
+    results = _apply_bulk(orders, ["o1", "o2"])
+
+    assert results == {"o1": "not_found", "o2": "invalid_state"}
+    assert orders.ops == []
+    assert orders.queries[0] == {"_id": {"$in": ["o1", "o2"]}, "seller_id": "s1"}
+
+
+def test_bulk_all_applied_skips_the_second_read():
+    orders = FakeOrders([{"_id": "o1", "status": "created"}, {"_id": "o2", "status": "created"}])
+
+    results = _apply_bulk(orders, ["o1", "o2"])
+
+    assert results == {"o1": "applied", "o2": "applied"}
+    assert len(orders.queries) == 1
+    assert orders.ops[0] == UpdateOne(
+        {"_id": "o1", "seller_id": "s1", "status": "created"},
+        {"$set": {"status": "shipped", "updated_at": NOW, "shipped_at": NOW}},
+    )
+
+
+def test_bulk_partial_write_rereads_which_orders_moved():
+    orders = FakeOrders(
+        [{"_id": "o1", "status": "created"}, {"_id": "o2", "status": "created"}],
+        modified=1,
+        moved=["o2"],
+    )
+
+    results = _apply_bulk(orders, ["o1", "o2"])
+
+    assert results == {"o1": "invalid_state", "o2": "applied"}
+    assert orders.queries[1] == {"_id": {"$in": ["o1", "o2"]}, "status": "shipped", "updated_at": NOW}
+
+
+def test_bulk_write_errors_map_per_order():
+    orders = FakeOrders(
+        [{"_id": "o1", "status": "created"}, {"_id": "o2", "status": "created"}, {"_id": "o3", "status": "created"}],
+        write_errors=[{"index": 0, "code": 11000}, {"index": 2, "code": 121}],
+        moved=["o2"],
+    )
+
+    results = _apply_bulk(orders, ["o1", "o2", "o3"])
+
+    assert results == {"o1": "duplicate_key", "o2": "applied", "o3": "invalid_state"}
+
+
+def test_bulk_reads_nested_state_field():
+    orders = FakeOrders([
+        {"_id": "o1", "return": {"status": "requested"}},
+        {"_id": "o2", "return": {"status": "approved"}},
+        {"_id": "o3"},
+    ])
+
+    results = _apply_bulk(orders, ["o1", "o2", "o3"], name="approve_return")
+
+    assert results == {"o1": "applied", "o2": "invalid_state", "o3": "invalid_state"}
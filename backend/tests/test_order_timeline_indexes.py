@@ -0,0 +1,128 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("motor")
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from utils.indexes import ensure_indexes
+from utils.order_timeline import (
+    build_order_event,
+    fetch_order_timeline,
+    fetch_order_timelines,
+    timeline_query,
+)
+
+# Needs a real MongoDB: explain() output is what is under test.
+MONGO_URI = os.getenv("MONGO_URI") or os.getenv("MONGODB_URI")
+pytestmark = pytest.mark.skipif(not MONGO_URI, reason="MONGO_URI not set")
+
+TIMELINE_INDEX = "order_timeline_order_created_at_idx"
+
+
+def _plan_stages(plan) -> list[dict]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan)
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def _run(test):
+    async def runner():
+        client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=2000)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            pytest.skip("MongoDB not reachable")
+
+        db = client[f"test_timeline_{uuid.uuid4().hex[:8]}"]
+        try:
+            await ensure_indexes(db)
+            await test(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(runner())
+
+
+async def _seed(db, events_per_order: dict) -> list:
+    start = datetime(2026, 1, 1)
+    docs = []
+    for order_id, count in events_per_order.items():
+        docs.extend(
+            build_order_event(
+                order_id=order_id,
+                event=f"EVENT_{i}",
+                actor_role="system",
+                created_at=start + timedelta(minutes=i),
+            )
+            for i in range(count)
+        )
+    await db.order_timeline.insert_many(docs)
+    return list(events_per_order)
+
+
+def test_timeline_page_is_an_index_scan_without_sort():
+    async def test(db):
+        order_id, = await _seed(db, {ObjectId(): 30})
+
+        explain = await (
+            db.order_timeline
+            .find(timeline_query(order_id))
+            .sort([("created_at", 1), ("_id", 1)])
+            .limit(11)
+            .explain()
+        )
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        names = {s["stage"] for s in stages}
+
+        assert "IXSCAN" in names
+        assert "COLLSCAN" not in names
+        assert "SORT" not in names
+        assert {s.get("indexName") for s in stages if s["stage"] == "IXSCAN"} == {TIMELINE_INDEX}
+
+        stats = (await (
+            db.order_timeline
+            .find(timeline_query(order_id))
+            .sort([("created_at", 1), ("_id", 1)])
+            .limit(11)
+            .explain("executionStats")
+        ))["executionStats"]
+        assert stats["totalDocsExamined"] <= 11
+
+    _run(test)
+
+
+def test_batch_reads_at_most_a_page_per_order():
+    async def test(db):
+        long_order, short_order = await _seed(db, {ObjectId(): 40, ObjectId(): 3})
+        missing_order = ObjectId()
+
+        timelines = await fetch_order_timelines(
+            db, [long_order, short_order, missing_order], per_order_limit=10,
+        )
+
+        assert [e["event"] for e in timelines[long_order]["events"]] == [f"EVENT_{i}" for i in range(10)]
+        assert timelines[long_order]["next_cursor"]
+        assert len(timelines[short_order]["events"]) == 3
+        assert timelines[short_order]["next_cursor"] is None
+        assert timelines[missing_order] == {"events": [], "next_cursor": None}
+
+        # The cursor continues exactly where the batch page stopped
+        page = await fetch_order_timeline(
+            db, long_order, limit=10, cursor=timelines[long_order]["next_cursor"],
+        )
+        assert [e["event"] for e in page["events"]] == [f"EVENT_{i}" for i in range(10, 20)]
+
+    _run(test)
@@ -0,0 +1,215 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from utils.wallet_balances import (
+    RECENT_SORT,
+    WALLET_RECENT_ENTRIES,
+    WALLET_VERIFY_LAG_SECONDS,
+    _group_entries,
+    _snapshot_update,
+    verify_wallet_balance,
+)
+
+NOW = datetime(2026, 3, 1, 12, 0)
+SELLER_ID = "seller-1"
+
+
+def _entry(entry_type, credit=0, debit=0, *, minutes_ago=60, _id=None):
+    return {
+        "_id": _id or f"{entry_type}-{minutes_ago}",
+        "seller_id": SELLER_ID,
+        "entry_type": entry_type,
+        "credit": credit,
+        "debit": debit,
+        "created_at": NOW - timedelta(minutes=minutes_ago),
+    }
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def to_list(self, length):
+        return self.rows
+
+
+class FakeLedger:
+    """
+    Just enough of wallet_ledger.aggregate for _sum_ledger: the $match on
+    seller / created_at and the $group by (entry_type, recent).
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def aggregate(self, pipeline, session=None):
+        match, group = pipeline[0]["$match"], pipeline[1]["$group"]
+        after = match.get("created_at", {}).get("$gt")
+        recent = group["_id"]["recent"]
+        split_at = recent["$gt"][1] if recent else None
+
+        rows = {}
+        for e in self.entries:
+            if e["seller_id"] != match["seller_id"] or (after and e["created_at"] <= after):
+                continue
+            key = (e["entry_type"], bool(split_at and e["created_at"] > split_at))
+            row = rows.setdefault(key, {
+                "_id": {"entry_type": key[0], "recent": key[1]},
+                "credit": 0, "debit": 0, "count": 0,
+                "last_entry_at": e["created_at"], "last_entry_id": e["_id"],
+            })
+            row["credit"] += e["credit"]
+            row["debit"] += e["debit"]
+            row["count"] += 1
+            if e["created_at"] > row["last_entry_at"]:
+                row["last_entry_at"], row["last_entry_id"] = e["created_at"], e["_id"]
+        return _Cursor(list(rows.values()))
+
+
+class FakeBalances:
+    def __init__(self, matches=True):
+        self.matches = matches
+        self.updates = []
+
+    async def update_one(self, query, update, **kwargs):
+        self.updates.append((query, update))
+        return SimpleNamespace(matched_count=1 if self.matches else 0)
+
+
+def _db(entries, matches=True):
+    return SimpleNamespace(wallet_ledger=FakeLedger(entries), wallet_balances=FakeBalances(matches))
+
+
+def _snapshot(entries, **overrides):
+    credit = sum(e["credit"] for e in entries)
+    debit = sum(e["debit"] for e in entries)
+    totals = {}
+    for e in entries:
+        totals[e["entry_type"]] = totals.get(e["entry_type"], 0) + e["credit"] - e["debit"]
+    snapshot = {
+        "_id": SELLER_ID,
+        "balance": credit - debit,
+        "credit": credit,
+        "debit": debit,
+        "entry_count": len(entries),
+        "totals": totals,
+        "last_entry_at": max((e["created_at"] for e in entries), default=None),
+    }
+    snapshot.update(overrides)
+    return snapshot
+
+
+# ==============================
+# _snapshot_update
+# ==============================
+
+def test_snapshot_update_increments_totals_and_pushes_recent():
+    entries = [_entry("SALE_CREDIT", credit=1000, minutes_ago=30), _entry("COMMISSION_DEBIT", debit=120, minutes_ago=20)]
+    update = _snapshot_update(_group_entries(entries)[SELLER_ID], NOW)
+
+    assert update["$inc"] == {
+        "balance": 880,
+        "credit": 1000,
+        "debit": 120,
+        "entry_count": 2,
+        "totals.SALE_CREDIT": 1000,
+        "totals.COMMISSION_DEBIT": -120,
+    }
+    assert update["$set"] == {"updated_at": NOW}
+    assert update["$setOnInsert"] == {"backfilled": False, "created_at": NOW}
+    assert update["$max"] == {"last_entry_at": entries[1]["created_at"], "last_entry_id": entries[1]["_id"]}
+    assert update["$push"]["recent"] == {"$each": entries, "$sort": RECENT_SORT, "$slice": WALLET_RECENT_ENTRIES}
+
+
+def test_snapshot_update_without_entries_only_touches_counters():
+    delta = {"credit": 0, "debit": 0, "entry_count": 0, "totals": {}, "entries": []}
+    update = _snapshot_update(delta, NOW)
+
+    assert update["$inc"] == {"balance": 0, "credit": 0, "debit": 0, "entry_count": 0}
+    assert "$max" not in update
+    assert "$push" not in update
+
+
+# ==============================
+# verify_wallet_balance
+# ==============================
+
+def test_verify_matching_snapshot_only_advances_checkpoint():
+    entries = [_entry("SALE_CREDIT", credit=1000), _entry("RESERVE_HOLD", debit=100, minutes_ago=50)]
+    db = _db(entries)
+
+    status = asyncio.run(verify_wallet_balance(db, _snapshot(entries), NOW))
+
+    assert status == "ok"
+    (query, update), = db.wallet_balances.updates
+    assert query == {"_id": SELLER_ID}
+    assert set(update["$set"]) == {"checkpoint", "verified_at"}
+    checkpoint = update["$set"]["checkpoint"]
+    assert checkpoint["at"] == NOW - timedelta(seconds=WALLET_VERIFY_LAG_SECONDS)
+    assert (checkpoint["balance"], checkpoint["entry_count"]) == (900, 2)
+
+
+def test_verify_repairs_drifted_snapshot_conditionally_on_entry_count():
+    entries = [_entry("SALE_CREDIT", credit=1000), _entry("COMMISSION_DEBIT", debit=120, minutes_ago=50)]
+    db = _db(entries)
+    # Snapshot double counted the sale credit
+    drifted = _snapshot(entries + [_entry("SALE_CREDIT", credit=1000, minutes_ago=40)])
+
+    status = asyncio.run(verify_wallet_balance(db, drifted, NOW))
+
+    assert status == "repaired"
+    (query, update), = db.wallet_balances.updates
+    assert query == {"_id": SELLER_ID, "entry_count": 3}
+    fields = update["$set"]
+    assert (fields["balance"], fields["credit"], fields["debit"], fields["entry_count"]) == (880, 1000, 120, 2)
+    assert fields["totals"] == {"SALE_CREDIT": 1000, "COMMISSION_DEBIT": -120}
+    assert fields["backfilled"] is True
+    assert fields["repaired_at"] == NOW
+
+
+def test_verify_reports_busy_when_a_write_raced_the_repair():
+    entries = [_entry("SALE_CREDIT", credit=1000)]
+    db = _db(entries, matches=False)
+
+    status = asyncio.run(verify_wallet_balance(db, _snapshot([], last_entry_at=None), NOW))
+
+    assert status == "busy"
+
+
+def test_verify_leaves_active_seller_alone():
+    settled = _entry("SALE_CREDIT", credit=1000)
+    in_flight = _entry("SALE_CREDIT", credit=500, minutes_ago=1)
+    db = _db([settled, in_flight])
+    # Snapshot has the in-flight entry, the settled ledger sum does not
+    snapshot = _snapshot([settled, in_flight])
+
+    status = asyncio.run(verify_wallet_balance(db, snapshot, NOW))
+
+    assert status == "active"
+    (query, update), = db.wallet_balances.updates
+    assert query == {"_id": SELLER_ID}
+    assert "repaired_at" not in update["$set"]
+    assert update["$set"]["checkpoint"]["entry_count"] == 1
+
+
+def test_verify_sums_only_the_tail_after_the_checkpoint():
+    old = _entry("SALE_CREDIT", credit=1000, minutes_ago=600)
+    new = _entry("SALE_CREDIT", credit=200, minutes_ago=60)
+    db = _db([old, new])
+    checkpoint = {
+        "at": NOW - timedelta(minutes=300),
+        "balance": 1000, "credit": 1000, "debit": 0, "entry_count": 1,
+        "totals": {"SALE_CREDIT": 1000},
+    }
+
+    status = asyncio.run(verify_wallet_balance(db, _snapshot([old, new], checkpoint=checkpoint), NOW))
+
+    assert status == "ok"
+    (_, update), = db.wallet_balances.updates
+    assert update["$set"]["checkpoint"]["credit"] == 1200
+    assert update["$set"]["checkpoint"]["entry_count"] == 2
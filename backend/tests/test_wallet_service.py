@@ -0,0 +1,147 @@
+import asyncio
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("dotenv")
+# utils.wallet_service imports database.py; the client never connects here
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017/test_wallet_service")
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from utils.wallet_service import (
+    ENTRY_COMMISSION_DEBIT,
+    ENTRY_RESERVE_HOLD,
+    ENTRY_RESERVE_RELEASE,
+    ENTRY_SALE_CREDIT,
+    build_ledger_entry,
+    post_ledger_batch,
+    reserve_from_totals,
+)
+
+SELLER_ID = ObjectId()
+CREATED_AT = datetime(2026, 3, 1, 12, 0)
+
+
+class FakeLedger:
+    """
+    insert_many that rejects the given indexes the way an unordered insert
+    reports duplicate keys.
+    """
+
+    def __init__(self, error_codes: dict | None = None):
+        self.error_codes = error_codes or {}
+
+    async def insert_many(self, entries, ordered=True, session=None):
+        if self.error_codes:
+            raise BulkWriteError({
+                "writeErrors": [{"index": i, "code": code} for i, code in self.error_codes.items()],
+                "nInserted": len(entries) - len(self.error_codes),
+            })
+
+
+class FakeCollection:
+    def __init__(self):
+        self.calls = []
+
+    async def update_one(self, query, update, **kwargs):
+        self.calls.append((query, update))
+        return SimpleNamespace(upserted_id=None, matched_count=1, modified_count=1)
+
+    async def bulk_write(self, ops, ordered=True):
+        self.calls.append(ops)
+
+
+def _db(error_codes=None):
+    return SimpleNamespace(
+        wallet_ledger=FakeLedger(error_codes),
+        wallet_balances=FakeCollection(),
+        rollups=FakeCollection(),
+    )
+
+
+def _entries(order_id=None):
+    order_id = order_id or ObjectId()
+    return [
+        build_ledger_entry(SELLER_ID, ENTRY_SALE_CREDIT, credit=1000, order_id=order_id, created_at=CREATED_AT),
+        build_ledger_entry(SELLER_ID, ENTRY_COMMISSION_DEBIT, debit=120, order_id=order_id, created_at=CREATED_AT),
+        build_ledger_entry(SELLER_ID, ENTRY_RESERVE_HOLD, credit=100, order_id=order_id, created_at=CREATED_AT),
+    ]
+
+
+# ==============================
+# post_ledger_batch
+# ==============================
+
+def test_post_ledger_batch_tags_and_posts_every_entry():
+    db = _db()
+    entries = _entries()
+
+    result = asyncio.run(post_ledger_batch(db, entries, use_transaction=False))
+
+    assert result["posted"] == 3
+    assert result["duplicates"] == 0
+    assert all(e["journal_id"] == result["journal_id"] and e["in_snapshot"] for e in entries)
+    (query, update), = db.wallet_balances.calls
+    assert query == {"_id": SELLER_ID}
+    assert update["$inc"]["entry_count"] == 3
+    assert update["$inc"]["balance"] == 980
+
+
+def test_post_ledger_batch_skips_duplicates():
+    db = _db({0: 11000, 2: 11000})
+    entries = _entries()
+
+    result = asyncio.run(post_ledger_batch(db, entries, use_transaction=False))
+
+    assert result["posted"] == 1
+    assert result["duplicates"] == 2
+    # Only the entry that was actually inserted reaches the snapshot
+    (_, update), = db.wallet_balances.calls
+    assert update["$inc"]["entry_count"] == 1
+    assert update["$inc"]["balance"] == -120
+    assert update["$push"]["recent"]["$each"] == [entries[1]]
+
+
+def test_post_ledger_batch_all_duplicates_touches_no_snapshot():
+    db = _db({0: 11000, 1: 11000, 2: 11000})
+
+    result = asyncio.run(post_ledger_batch(db, _entries(), use_transaction=False))
+
+    assert (result["posted"], result["duplicates"]) == (0, 3)
+    assert db.wallet_balances.calls == []
+
+
+def test_post_ledger_batch_reraises_other_write_errors():
+    db = _db({0: 11000, 1: 121})
+
+    with pytest.raises(BulkWriteError):
+        asyncio.run(post_ledger_batch(db, _entries(), use_transaction=False))
+
+    assert db.wallet_balances.calls == []
+
+
+def test_post_ledger_batch_without_entries():
+    result = asyncio.run(post_ledger_batch(_db(), []))
+
+    assert result == {"journal_id": None, "posted": 0, "duplicates": 0}
+
+
+# ==============================
+# reserve_from_totals
+# ==============================
+
+def test_reserve_from_totals():
+    # Holds and releases are both credits; the reserve is what is still held
+    assert reserve_from_totals({ENTRY_RESERVE_HOLD: 300, ENTRY_RESERVE_RELEASE: 100}) == 200
+    assert reserve_from_totals({ENTRY_RESERVE_HOLD: 100.004}) == 100
+    assert reserve_from_totals({ENTRY_SALE_CREDIT: 1000}) == 0
+    assert reserve_from_totals({}) == 0
+
+
+def test_reserve_from_totals_never_negative():
+    assert reserve_from_totals({ENTRY_RESERVE_HOLD: 100, ENTRY_RESERVE_RELEASE: 150}) == 0
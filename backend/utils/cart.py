@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime
+
+# ==============================
+# Cart hydration
+# ==============================
+# A cart is rendered with three batched reads however many lines it has:
+#
+#   products        one $in on the cart's product ids
+#   sellers         one $in on those products' seller ids   \  concurrent
+#   seller_offers   one $in on product ids (live offers)     /
+#
+# Each line then gets its price and flags in a single pass:
+#
+#   status         ok | unavailable | out_of_stock | insufficient_stock
+#   price_changed  selling_price differs from the price when it was added
+#   offer          the lowest live offer for the product, if any
+#
+# subtotal only counts lines with status "ok".
+
+CART_PRODUCT_PROJECTION = {
+    "title": 1,
+    "images": 1,
+    "image_urls": 1,
+    "image_variants": 1,
+    "selling_price": 1,
+    "mrp": 1,
+    "stock": 1,
+    "active": 1,
+    "seller_id": 1,
+}
+
+CART_SELLER_PROJECTION = {
+    "seller_status": 1,
+    "is_frozen": 1,
+    "seller_profile.brand_name": 1,
+    "seller_profile.slug": 1,
+}
+
+CART_OFFER_PROJECTION = {
+    "product_id": 1,
+    "seller_id": 1,
+    "offer_price": 1,
+    "end_at": 1,
+}
+
+
+def _seller_available(seller: dict | None) -> bool:
+    return bool(
+        seller
+        and seller.get("seller_status") == "verified"
+        and not seller.get("is_frozen")
+    )
+
+
+async def _load_sellers(db, seller_ids: list) -> dict:
+    cursor = db.users.find({"_id": {"$in": seller_ids}}, CART_SELLER_PROJECTION)
+    return {s["_id"]: s async for s in cursor}
+
+
+async def _load_live_offers(db, product_ids: list, now: datetime) -> dict:
+    """
+    {product_id: lowest-priced live offer}
+    """
+    cursor = db.seller_offers.find(
+        {
+            "product_id": {"$in": product_ids},
+            "status": "active",
+            "start_at": {"$lte": now},
+            "end_at": {"$gte": now},
+        },
+        CART_OFFER_PROJECTION,
+    )
+    offers = {}
+    async for offer in cursor:
+        best = offers.get(offer["product_id"])
+        if not best or offer["offer_price"] < best["offer_price"]:
+            offers[offer["product_id"]] = offer
+    return offers
+
+
+def build_cart_line(item: dict, product: dict, seller: dict | None, offer: dict | None) -> dict:
+    qty = int(item.get("quantity", 1))
+    stock = product.get("stock", 0)
+    selling_price = float(product.get("selling_price", 0))
+
+    # Offers only count when they belong to the product's own seller
+    if offer and offer["seller_id"] != product["seller_id"]:
+        offer = None
+    unit_price = float(offer["offer_price"]) if offer else selling_price
+
+    if not product.get("active", True) or not _seller_available(seller):
+        line_status = "unavailable"
+    elif stock <= 0:
+        line_status = "out_of_stock"
+    elif stock < qty:
+        line_status = "insufficient_stock"
+    else:
+        line_status = "ok"
+
+    price_at_add = item.get("price_at_add")
+    profile = (seller or {}).get("seller_profile", {})
+
+    return {
+        "product_id": str(product["_id"]),
+        "title": product.get("title"),
+        "images": product.get("images") or product.get("image_urls") or [],
+        "image_variants": (product.get("image_variants") or [None])[0],
+        "seller": {
+            "id": str(product["seller_id"]),
+            "brand_name": profile.get("brand_name"),
+            "slug": profile.get("slug"),
+        },
+        "quantity": qty,
+        "unit_price": unit_price,
+        "mrp": product.get("mrp"),
+        "line_total": round(unit_price * qty, 2),
+        "stock": stock,
+        "status": line_status,
+        "price_changed": price_at_add is not None and float(price_at_add) != selling_price,
+        "price_at_add": price_at_add,
+        "offer": {
+            "offer_id": str(offer["_id"]),
+            "offer_price": offer["offer_price"],
+            "ends_at": offer["end_at"],
+        } if offer else None,
+    }
+
+
+async def hydrate_cart(db, cart: list[dict], now: datetime | None = None) -> dict:
+    now = now or datetime.utcnow()
+    product_ids = [item["product_id"] for item in cart]
+    if not product_ids:
+        return {"count": 0, "items": [], "subtotal": 0, "has_issues": False}
+
+    products = {
+        p["_id"]: p
+        async for p in db.products.find({"_id": {"$in": product_ids}}, CART_PRODUCT_PROJECTION)
+    }
+    seller_ids = list({p["seller_id"] for p in products.values()})
+
+    sellers, offers = await asyncio.gather(
+        _load_sellers(db, seller_ids),
+        _load_live_offers(db, list(products), now),
+    )
+
+    items = []
+    subtotal = 0
+    for item in cart:
+        product = products.get(item["product_id"])
+        if not product:
+            continue
+
+        line = build_cart_line(item, product, sellers.get(product["seller_id"]), offers.get(product["_id"]))
+        if line["status"] == "ok":
+            subtotal += line["line_total"]
+        items.append(line)
+
+    return {
+        "count": len(items),
+        "items": items,
+        "subtotal": round(subtotal, 2),
+        "has_issues": any(line["status"] != "ok" or line["price_changed"] for line in items),
+    }
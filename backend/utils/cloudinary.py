@@ -15,9 +15,10 @@ cloudinary.config(
 )
 
 
-def upload_image(file, folder: str):
+def upload_image(file, folder: str, public_id: str | None = None):
     return cloudinary.uploader.upload(
         file,
         folder=folder,
+        public_id=public_id,
         resource_type="image",
     )
@@ -1,113 +1,296 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
+from pymongo import UpdateOne
 
 from database import get_db
-from utils.wallet_service import process_order_settlement
+from utils.wallet_service import build_settlement_entries, post_ledger_batch
 from utils.trust import SELLER_TIER_CONFIG
-from utils.order_timeline import record_order_event
+from utils.order_timeline import build_order_event, record_order_events
+from utils.rollups import (
+    record_rollups,
+    ROLLUP_ORDERS_SETTLED,
+    ROLLUP_COD_PENDING_AMOUNT,
+    ROLLUP_UNSETTLED_PAYOUT_AMOUNT,
+)
+from utils.reserve_release_worker import RESERVE_HOLD_DAYS
+from utils.scheduled_actions import (
+    build_scheduled_action,
+    schedule_actions,
+    ACTION_RESERVE_RELEASE,
+)
 
 CHECK_INTERVAL_SECONDS = 60 * 30  # every 30 minutes
+SETTLEMENT_BATCH_SIZE = 500
+SETTLEMENT_SELLER_CONCURRENCY = 8
 logger = logging.getLogger(__name__)
 
+SELLER_SETTLEMENT_PROJECTION = {
+    "seller_tier": 1,
+    "is_frozen": 1,
+    "seller_status": 1,
+}
+
+ORDER_SETTLEMENT_PROJECTION = {
+    "seller_id": 1,
+    "pricing": 1,
+    "payment.method": 1,
+    "delivered_at": 1,
+}
+
+UNSETTLED_QUERY = {
+    "status": "delivered",
+    "$or": [
+        {"payment.method": "COD", "payment.status": "cod_pending"},
+        {"payment.method": "RAZORPAY", "payment.status": "paid"},
+    ],
+    "settlement.status": {"$ne": "settled"},
+}
+
+
+def _tier_config(seller: dict) -> dict:
+    tier = seller.get("seller_tier", "standard")
+    return SELLER_TIER_CONFIG.get(tier, SELLER_TIER_CONFIG["standard"])
+
+
+def compute_settle_after(seller: dict, delivered_at: datetime) -> datetime:
+    """
+    Settlement window end, stored on the order at delivery time as
+    settlement.settle_after so the worker can select due orders by index.
+    """
+    return delivered_at + timedelta(hours=_tier_config(seller)["settlement_hours"])
+
+
+# ==============================
+# Backfill (orders delivered before settle_after existed)
+# ==============================
+
+async def _backfill_chunk(db, orders: list[dict], sellers: dict) -> int:
+    missing = list({o["seller_id"] for o in orders} - sellers.keys())
+    if missing:
+        async for s in db.users.find({"_id": {"$in": missing}}, SELLER_SETTLEMENT_PROJECTION):
+            sellers[s["_id"]] = s
+
+    ops = [
+        UpdateOne(
+            {"_id": o["_id"], "settlement.settle_after": {"$exists": False}},
+            {"$set": {"settlement.settle_after": compute_settle_after(sellers[o["seller_id"]], o["delivered_at"])}},
+        )
+        for o in orders
+        if o["seller_id"] in sellers
+    ]
+    if not ops:
+        return 0
+
+    result = await db.orders.bulk_write(ops, ordered=False)
+    return result.modified_count
+
+
+async def backfill_settle_after(db) -> int:
+    """
+    Streams the backlog in SETTLEMENT_BATCH_SIZE chunks, one bulk_write
+    each, so the first run after deploy never holds it all in memory.
+    """
+    cursor = db.orders.find(
+        {**UNSETTLED_QUERY, "settlement.settle_after": {"$exists": False}, "delivered_at": {"$ne": None}},
+        {"seller_id": 1, "delivered_at": 1},
+    ).batch_size(SETTLEMENT_BATCH_SIZE)
+
+    # Seller docs are small (three fields) and reused across chunks
+    sellers = {}
+    chunk = []
+    modified = 0
+    async for order in cursor:
+        chunk.append(order)
+        if len(chunk) >= SETTLEMENT_BATCH_SIZE:
+            modified += await _backfill_chunk(db, chunk, sellers)
+            chunk = []
+    if chunk:
+        modified += await _backfill_chunk(db, chunk, sellers)
+    return modified
+
+
+# ==============================
+# Settlement per seller
+# ==============================
+
+async def settle_seller_orders(db, seller: dict, orders: list[dict], now: datetime) -> int:
+    """
+    Settle a group of due orders for one seller:
+    one ledger insert_many, one orders bulk_write, one timeline insert_many.
+    """
+    # ---- HARD BLOCK: frozen sellers never get settlement
+    if seller.get("is_frozen") or seller.get("seller_status") == "frozen":
+        return 0
+
+    tier = seller.get("seller_tier", "standard")
+    reserve_percent = _tier_config(seller).get("reserve_percent", 0)
+
+    ledger_entries = []
+    order_ops = []
+    for order in orders:
+        pricing = order["pricing"]
+
+        ledger_entries.extend(build_settlement_entries(
+            seller,
+            order["_id"],
+            pricing["subtotal"],
+            pricing["commission_percent"],
+            platform_fee=pricing.get("platform_fee", 0),
+            created_at=now,
+        ))
+
+        order_ops.append(UpdateOne(
+            {"_id": order["_id"], "settlement.status": {"$ne": "settled"}},
+            {
+                "$set": {
+                    "payment.status": "settled",
+                    "settlement.status": "settled",
+                    "settlement.settled_at": now,
+                    "settled_at": now,
+                    "pricing.reserve_amount": round(pricing["subtotal"] * reserve_percent / 100, 2),
+                }
+            },
+        ))
+
+    # ---- Ledger-based settlement (single source of truth); entries already
+    # posted by an interrupted run are skipped by the unique index
+    await post_ledger_batch(db, ledger_entries)
+
+    # ---- Mark orders settled
+    result = await db.orders.bulk_write(order_ops, ordered=False)
+
+    settled_ids = [o["_id"] for o in orders]
+    if result.modified_count != len(orders):
+        # Someone else settled part of this group; only log what we moved
+        settled_ids = [
+            o["_id"]
+            async for o in db.orders.find(
+                {"_id": {"$in": settled_ids}, "settlement.settled_at": now},
+                {"_id": 1},
+            )
+        ]
+
+    # ---- Dashboard counters for the orders we settled
+    by_id = {o["_id"]: o for o in orders}
+    settled_orders = [by_id[oid] for oid in settled_ids]
+    await record_rollups(
+        db,
+        at=now,
+        flows={ROLLUP_ORDERS_SETTLED: len(settled_orders)},
+        gauges={
+            ROLLUP_UNSETTLED_PAYOUT_AMOUNT: -sum(o["pricing"].get("seller_payout", 0) for o in settled_orders),
+            # UNSETTLED_QUERY only selects COD orders still cod_pending
+            ROLLUP_COD_PENDING_AMOUNT: -sum(
+                o["pricing"]["subtotal"] for o in settled_orders
+                if o.get("payment", {}).get("method") == "COD"
+            ),
+        },
+    )
+
+    # ---- Queue reserve release for the orders we settled
+    if reserve_percent > 0:
+        delivered = {o["_id"]: o.get("delivered_at") or now for o in orders}
+        await schedule_actions(db, [
+            build_scheduled_action(
+                action=ACTION_RESERVE_RELEASE,
+                order_id=oid,
+                due_at=delivered[oid] + timedelta(days=RESERVE_HOLD_DAYS),
+            )
+            for oid in settled_ids
+        ])
+
+    # ---- Timeline must NEVER break settlement
+    payouts = {o["_id"]: o["pricing"].get("seller_payout") for o in orders}
+    try:
+        await record_order_events(db, [
+            build_order_event(
+                order_id=oid,
+                event="COD_SETTLED",
+                actor_role="system",
+                metadata={
+                    "settlement_amount": payouts[oid],
+                    "seller_tier": tier,
+                },
+                created_at=now,
+            )
+            for oid in settled_ids
+        ])
+    except Exception:
+        logger.exception("TIMELINE_ERROR seller=%s", seller["_id"])
+
+    return len(settled_ids)
+
+
+# ==============================
+# Run
+# ==============================
+
+async def _settle_batch(db, orders: list[dict], sellers: dict, now: datetime) -> int:
+    by_seller = {}
+    for order in orders:
+        by_seller.setdefault(order["seller_id"], []).append(order)
+
+    missing = [sid for sid in by_seller if sid not in sellers]
+    if missing:
+        async for seller in db.users.find({"_id": {"$in": missing}}, SELLER_SETTLEMENT_PROJECTION):
+            sellers[seller["_id"]] = seller
+
+    semaphore = asyncio.Semaphore(SETTLEMENT_SELLER_CONCURRENCY)
+
+    async def run(seller_id, seller_orders):
+        seller = sellers.get(seller_id)
+        if not seller:
+            return 0
+        async with semaphore:
+            try:
+                return await settle_seller_orders(db, seller, seller_orders, now)
+            except Exception:
+                # Never crash the worker for one bad seller
+                logger.exception("COD_SETTLEMENT_ERROR seller=%s", seller_id)
+                return 0
+
+    settled = await asyncio.gather(*(run(sid, group) for sid, group in by_seller.items()))
+    return sum(settled)
+
+
+async def run_cod_settlement(db, now: datetime | None = None) -> int:
+    now = now or datetime.utcnow()
+    sellers = {}
+    settled = 0
+    batch = []
+
+    cursor = db.orders.find(
+        {**UNSETTLED_QUERY, "settlement.settle_after": {"$lte": now}},
+        ORDER_SETTLEMENT_PROJECTION,
+    ).sort("settlement.settle_after", 1)
+
+    async for order in cursor:
+        batch.append(order)
+        if len(batch) >= SETTLEMENT_BATCH_SIZE:
+            settled += await _settle_batch(db, batch, sellers, now)
+            batch = []
+
+    if batch:
+        settled += await _settle_batch(db, batch, sellers, now)
+
+    return settled
+
+
+async def settle_due_orders(db):
+    await backfill_settle_after(db)
+    settled = await run_cod_settlement(db)
+    if settled:
+        logger.info("COD_SETTLEMENT_RUN settled=%s", settled)
+
 
 async def cod_settlement_worker():
     db = get_db()
 
     while True:
-        now = datetime.utcnow()
-
-        cursor = db.orders.find({
-            "status": "delivered",
-            "$or": [
-                {"payment.method": "COD", "payment.status": "cod_pending"},
-                {"payment.method": "RAZORPAY", "payment.status": "paid"},
-            ],
-            "settlement.status": {"$ne": "settled"},
-        })
-
-        async for order in cursor:
-            try:
-                # ---- Safety: skip if already settled (idempotency)
-                if order.get("settlement", {}).get("status") == "settled":
-                    continue
-
-                seller_id = order["seller_id"]
-                seller = await db.users.find_one({"_id": seller_id})
-
-                if not seller:
-                    continue
-
-                # ---- HARD BLOCK: frozen sellers never get settlement
-                if seller.get("is_frozen") or seller.get("seller_status") == "frozen":
-                    continue
-
-                tier = seller.get("seller_tier", "standard")
-                tier_config = SELLER_TIER_CONFIG.get(
-                    tier,
-                    SELLER_TIER_CONFIG["standard"]
-                )
-
-                settlement_hours = tier_config["settlement_hours"]
-                reserve_percent = tier_config.get("reserve_percent", 0)
-
-                delivered_at = order.get("delivered_at")
-                if not delivered_at:
-                    continue
-
-                # ---- Settlement window not passed yet
-                if now < delivered_at + timedelta(hours=settlement_hours):
-                    continue
-
-                # ---- Ledger-based settlement (single source of truth)
-                await process_order_settlement(
-                    db=db,
-                    seller_id=seller_id,
-                    order_id=order["_id"],
-                    order_amount=order["pricing"]["subtotal"],
-                    commission_percent=order["pricing"]["commission_percent"],
-                    platform_fee=order["pricing"].get("platform_fee", 0),
-                )
-
-                reserve_amount = round(
-                    order["pricing"]["subtotal"] * reserve_percent / 100,
-                    2,
-                )
-
-                # ---- Mark order settled
-                update_res = await db.orders.update_one(
-                    {"_id": order["_id"], "settlement.status": {"$ne": "settled"}},
-                    {
-                        "$set": {
-                            "payment.status": "settled",
-                            "settlement.status": "settled",
-                            "settlement.settled_at": now,
-                            "settled_at": now,
-                            "pricing.reserve_amount": reserve_amount,
-                        }
-                    }
-                )
-
-                # ---- Only log timeline if DB update actually happened
-                if update_res.modified_count == 1:
-                    try:
-                        await record_order_event(
-                            db=db,
-                            order_id=order["_id"],
-                            event="COD_SETTLED",
-                            actor_role="system",
-                            actor_id=None,
-                            metadata={
-                                "settlement_amount": order["pricing"]["seller_payout"],
-                                "seller_tier": tier,
-                            },
-                        )
-                    except Exception:
-                        # Timeline must NEVER break settlement
-                        logger.exception("TIMELINE_ERROR order=%s", order.get("_id"))
-
-            except Exception:
-                # Never crash the worker for one bad order
-                logger.exception("COD_SETTLEMENT_ERROR order=%s", order.get("_id"))
+        try:
+            await settle_due_orders(db)
+        except Exception:
+            logger.exception("COD_SETTLEMENT_RUN_ERROR")
 
         await asyncio.sleep(CHECK_INTERVAL_SECONDS)
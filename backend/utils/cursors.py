@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import HTTPException
+
+# ==============================
+# Keyset cursors
+# ==============================
+# "{value}_{oid}" of the last row on a page: the sort key, then _id as the
+# tie-breaker. Datetimes are encoded as epoch millis (stored dates are naive
+# UTC with millisecond precision, so the round trip is exact).
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_keyset_cursor(value, oid) -> str:
+    if isinstance(value, datetime):
+        value = (value - _EPOCH) // timedelta(milliseconds=1)
+    return f"{value}_{oid}"
+
+
+def decode_keyset_cursor(cursor: str, *, as_datetime: bool = True) -> tuple:
+    """
+    (value, ObjectId). The value is a datetime, or an int with
+    as_datetime=False. Malformed cursors are a 400.
+    """
+    try:
+        value, oid = cursor.split("_", 1)
+        value = int(value)
+        if as_datetime:
+            value = _EPOCH + timedelta(milliseconds=value)
+        return value, ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+# ==============================
+# Streaming exports (CSV / NDJSON)
+# ==============================
+# Rows are read from a Motor cursor in EXPORT_BATCH_SIZE batches and written
+# to the response one chunk per batch, so memory stays flat however many
+# years the date range covers.
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+LEDGER_EXPORT_FIELDS = [
+    "_id",
+    "created_at",
+    "entry_type",
+    "order_id",
+    "credit",
+    "debit",
+    "reason_code",
+    "reference_id",
+    "journal_id",
+]
+
+SETTLEMENT_EXPORT_FIELDS = [
+    "_id",
+    "seller_id",
+    "payment.method",
+    "delivered_at",
+    "settlement.settled_at",
+    "pricing.subtotal",
+    "pricing.commission_percent",
+    "pricing.commission_amount",
+    "pricing.platform_fee",
+    "pricing.reserve_amount",
+    "pricing.seller_payout",
+]
+
+
+def _export_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _get_field(doc: dict, path: str):
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def _projection(fields: list[str]) -> dict:
+    return {field: 1 for field in fields}
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # Stored dates are naive UTC; "...Z" / "+05:30" query params are aware
+    if value and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def date_range_filter(since: datetime | None, until: datetime | None) -> dict:
+    since, until = _naive_utc(since), _naive_utc(until)
+    if since and until and since > until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    query = {}
+    if since:
+        query["$gte"] = since
+    if until:
+        query["$lt"] = until
+    return query
+
+
+async def _stream_rows(cursor, fields: list[str], fmt: str):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(fields)
+
+    rows = 0
+    async for doc in cursor:
+        values = [_export_value(_get_field(doc, f)) for f in fields]
+        if writer:
+            writer.writerow(["" if v is None else v for v in values])
+        else:
+            buffer.write(json.dumps(dict(zip(fields, values))))
+            buffer.write("\n")
+
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_export(cursor, fields: list[str], fmt: str, filename: str) -> StreamingResponse:
+    """
+    Stream `cursor` as CSV or NDJSON. The cursor must already carry its
+    projection and sort; batch size is set here.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+
+    return StreamingResponse(
+        _stream_rows(cursor.batch_size(EXPORT_BATCH_SIZE), fields, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+# ==============================
+# Exports
+# ==============================
+
+def export_seller_ledger(
+    db,
+    seller_id: ObjectId,
+    fmt: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> StreamingResponse:
+    """
+    Full ledger statement, oldest first. Served by
+    wallet_ledger_seller_created_at_id_idx (scanned forwards).
+    """
+    query = {"seller_id": seller_id}
+    created = date_range_filter(since, until)
+    if created:
+        query["created_at"] = created
+
+    cursor = (
+        db.wallet_ledger
+        .find(query, _projection(LEDGER_EXPORT_FIELDS))
+        .sort([("created_at", 1), ("_id", 1)])
+    )
+    return stream_export(cursor, LEDGER_EXPORT_FIELDS, fmt, f"ledger_{seller_id}")
+
+
+def export_settlement_report(
+    db,
+    fmt: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    seller_id: ObjectId | None = None,
+) -> StreamingResponse:
+    """
+    One row per settled order, by settlement time.
+    """
+    query = {"settlement.status": "settled"}
+    settled = date_range_filter(since, until)
+    if settled:
+        query["settlement.settled_at"] = settled
+    if seller_id:
+        query["seller_id"] = seller_id
+
+    cursor = (
+        db.orders
+        .find(query, _projection(SETTLEMENT_EXPORT_FIELDS))
+        .sort([("settlement.settled_at", 1), ("_id", 1)])
+    )
+    return stream_export(cursor, SETTLEMENT_EXPORT_FIELDS, fmt, "settlement_report")
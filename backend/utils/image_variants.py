@@ -0,0 +1,99 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from config.env import MEDIA_VARIANT_WORKERS
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # without Pillow, uploads keep only the original
+    Image = None
+
+# ==============================
+# Image variants
+# ==============================
+# Product images are resized at upload time into variants bounded by a
+# longest edge, each in WebP (modern browsers) and JPEG (fallback):
+#
+#   thumb  160px   cart lines, order lists
+#   card   480px   listing / search cards
+#   pdp   1200px   product page gallery
+#
+# Decoding and resizing is CPU-bound, so it runs in a process pool rather
+# than on the event loop (or a thread, which would hold the GIL). The pool
+# uses spawn so children do not inherit the parent's Mongo client.
+# Images are only ever shrunk; a 300px upload yields a 300px "pdp".
+
+IMAGE_VARIANTS = {
+    "thumb": 160,
+    "card": 480,
+    "pdp": 1200,
+}
+
+# format -> (extension, content type, Pillow format, save options)
+IMAGE_VARIANT_FORMATS = {
+    "webp": ("webp", "image/webp", "WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", "image/jpeg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+IMAGE_MAX_PIXELS = 40_000_000
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def render_variants(data: bytes) -> list[tuple[str, str, bytes]]:
+    """
+    Runs in the pool. Returns [(variant, format, encoded bytes)].
+    """
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    rendered = []
+    for variant, edge in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+
+        for fmt, (_, _, pil_format, options) in IMAGE_VARIANT_FORMATS.items():
+            frame = resized
+            if pil_format == "JPEG" and frame.mode == "RGBA":
+                # JPEG has no alpha; flatten onto white
+                frame = Image.new("RGB", resized.size, (255, 255, 255))
+                frame.paste(resized, mask=resized.getchannel("A"))
+
+            out = io.BytesIO()
+            frame.save(out, pil_format, **options)
+            rendered.append((variant, fmt, out.getvalue()))
+
+    return rendered
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=MEDIA_VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def generate_variants(data: bytes) -> list[tuple[str, str, bytes]] | None:
+    """
+    None when variants are unavailable (Pillow not installed).
+    """
+    if Image is None:
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), render_variants, data)
+
+
+def shutdown_variant_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
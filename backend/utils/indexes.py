@@ -1,8 +1,11 @@
+import logging
 from pymongo import ASCENDING, DESCENDING
 from pymongo.errors import OperationFailure
 
 from utils.idempotency import IDEMPOTENCY_TTL_SECONDS
 
+logger = logging.getLogger(__name__)
+
 
 def _normalize_key_pairs(keys):
     return [(k, v) for k, v in keys]
@@ -37,6 +40,17 @@ async def _create_index_safe(collection, keys, **kwargs):
         await collection.create_index(keys, **kwargs)
 
 
+async def _drop_index_safe(collection, name):
+    """
+    Drop a retired index by name; a no-op if it is already gone.
+    """
+    try:
+        await collection.drop_index(name)
+    except OperationFailure as e:
+        if getattr(e, "code", None) != 27:  # IndexNotFound
+            raise
+
+
 async def ensure_indexes(db):
     # Users
     await _create_index_safe(
@@ -51,6 +65,17 @@ async def ensure_indexes(db):
         [("role", ASCENDING), ("seller_status", ASCENDING)],
         name="users_role_seller_status_idx",
     )
+    await _create_index_safe(
+        db.users,
+        [
+            ("role", ASCENDING),
+            ("seller_status", ASCENDING),
+            ("is_frozen", ASCENDING),
+            ("seller_profile.trust.score", DESCENDING),
+            ("_id", DESCENDING),
+        ],
+        name="users_seller_leaderboard_idx",
+    )
 
     # OTP
     await _create_index_safe(
@@ -78,6 +103,50 @@ async def ensure_indexes(db):
         name="products_seller_created_idx",
     )
 
+    # Media assets (variant lookup at product create)
+    await _create_index_safe(
+        db.media_assets,
+        [("url", ASCENDING), ("owner_id", ASCENDING)],
+        name="media_assets_url_owner_idx",
+    )
+
+    # Seller offers (live offer lookup by product)
+    await _create_index_safe(
+        db.seller_offers,
+        [("product_id", ASCENDING), ("status", ASCENDING), ("end_at", ASCENDING)],
+        name="seller_offers_product_status_end_idx",
+    )
+
+    # Reviews
+    try:
+        # One review per order; backs the DuplicateKeyError check on create
+        await _create_index_safe(
+            db.reviews,
+            [("order_id", ASCENDING)],
+            name="reviews_order_unique_idx",
+            unique=True,
+        )
+    except OperationFailure as e:
+        if getattr(e, "code", None) != 11000:
+            raise
+        # Existing duplicate reviews must be cleaned up first; keep serving
+        logger.error("REVIEWS_DUPLICATES unique index not built: %s", e)
+    await _create_index_safe(
+        db.reviews,
+        [("product_id", ASCENDING), ("is_visible", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="reviews_product_visible_created_idx",
+    )
+    await _create_index_safe(
+        db.reviews,
+        [("product_id", ASCENDING), ("is_visible", ASCENDING), ("rating", DESCENDING), ("_id", DESCENDING)],
+        name="reviews_product_visible_rating_desc_idx",
+    )
+    await _create_index_safe(
+        db.reviews,
+        [("product_id", ASCENDING), ("is_visible", ASCENDING), ("rating", ASCENDING), ("_id", DESCENDING)],
+        name="reviews_product_visible_rating_asc_idx",
+    )
+
     # Orders
     await _create_index_safe(
         db.orders,
@@ -99,6 +168,135 @@ async def ensure_indexes(db):
         [("status", ASCENDING), ("settlement.status", ASCENDING), ("delivered_at", ASCENDING)],
         name="orders_settlement_idx",
     )
+    await _create_index_safe(
+        db.orders,
+        [("status", ASCENDING), ("settlement.status", ASCENDING), ("settlement.settle_after", ASCENDING)],
+        name="orders_settle_after_idx",
+    )
+    await _create_index_safe(
+        db.orders,
+        [("settlement.settled_at", ASCENDING), ("_id", ASCENDING)],
+        name="orders_settled_at_idx",
+        partialFilterExpression={"settlement.status": "settled"},
+    )
+    await _create_index_safe(
+        db.orders,
+        [("expiry.batch_id", ASCENDING)],
+        name="orders_expiry_unreleased_idx",
+        partialFilterExpression={"expiry.stock_released": False},
+    )
+    await _create_index_safe(
+        db.orders,
+        [("expiry.release_claimed_at", ASCENDING)],
+        name="orders_expiry_release_claim_idx",
+        partialFilterExpression={"expiry.stock_released": False},
+    )
+
+    # Expired-order stock releases (one per batch and product)
+    await _create_index_safe(
+        db.stock_releases,
+        [("batch_id", ASCENDING), ("product_id", ASCENDING)],
+        name="stock_releases_batch_product_unique",
+        unique=True,
+    )
+    await _create_index_safe(
+        db.stock_releases,
+        [("created_at", ASCENDING)],
+        name="stock_releases_ttl_idx",
+        expireAfterSeconds=60 * 60 * 24 * 7,  # only needed until the batch is released
+    )
+    await _create_index_safe(
+        db.orders,
+        [("waybill", ASCENDING)],
+        name="orders_waybill_unique_idx",
+        unique=True,
+        sparse=True,
+    )
+
+    # Order timeline
+    await _create_index_safe(
+        db.order_timeline,
+        [("order_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+        name="order_timeline_order_created_at_idx",
+    )
+    await _create_index_safe(
+        db.order_timeline,
+        [("dedupe_key", ASCENDING)],
+        name="order_timeline_dedupe_key_unique",
+        unique=True,
+        partialFilterExpression={"dedupe_key": {"$type": "string"}},
+    )
+
+    # Trust recompute runs (one live run at a time)
+    await _create_index_safe(
+        db.trust_recompute_runs,
+        [("live_lock", ASCENDING)],
+        name="trust_recompute_runs_live_lock_unique",
+        unique=True,
+        partialFilterExpression={"live_lock": {"$exists": True}},
+    )
+
+    # Scheduled actions
+    await _create_index_safe(
+        db.scheduled_actions,
+        [("action", ASCENDING), ("order_id", ASCENDING)],
+        name="scheduled_actions_action_order_unique",
+        unique=True,
+    )
+    await _create_index_safe(
+        db.scheduled_actions,
+        [("status", ASCENDING), ("due_at", ASCENDING)],
+        name="scheduled_actions_status_due_idx",
+    )
+    await _create_index_safe(
+        db.scheduled_actions,
+        [("claim_token", ASCENDING)],
+        name="scheduled_actions_claim_token_idx",
+        sparse=True,
+    )
+
+    # Trust event queue (one pending batch per seller)
+    await _create_index_safe(
+        db.trust_event_queue,
+        [("seller_id", ASCENDING)],
+        name="trust_event_queue_pending_seller_unique",
+        unique=True,
+        partialFilterExpression={"status": "pending"},
+    )
+    await _create_index_safe(
+        db.trust_event_queue,
+        [("status", ASCENDING), ("due_at", ASCENDING)],
+        name="trust_event_queue_status_due_idx",
+    )
+    await _create_index_safe(
+        db.trust_event_queue,
+        [("claim_token", ASCENDING)],
+        name="trust_event_queue_claim_token_idx",
+        sparse=True,
+    )
+
+    # Webhook inbox
+    await _create_index_safe(
+        db.webhook_inbox,
+        [("source", ASCENDING), ("event_key", ASCENDING)],
+        name="webhook_inbox_source_event_unique",
+        unique=True,
+    )
+    await _create_index_safe(
+        db.webhook_inbox,
+        [("shard", ASCENDING), ("status", ASCENDING), ("received_at", ASCENDING)],
+        name="webhook_inbox_shard_status_received_idx",
+    )
+    await _create_index_safe(
+        db.webhook_inbox,
+        [("status", ASCENDING), ("received_at", ASCENDING)],
+        name="webhook_inbox_status_received_idx",
+    )
+    await _create_index_safe(
+        db.webhook_inbox,
+        [("partition_key", ASCENDING), ("status", ASCENDING), ("received_at", ASCENDING)],
+        name="webhook_inbox_partition_status_received_idx",
+    )
 
     # Idempotency
     await _create_index_safe(
@@ -134,10 +332,37 @@ async def ensure_indexes(db):
     )
 
     # Wallet ledger
+    # (seller_id, created_at) range scans use the prefix of this index, so
+    # the old two-field wallet_ledger_seller_created_at_idx is dropped
     await _create_index_safe(
         db.wallet_ledger,
-        [("seller_id", ASCENDING), ("created_at", DESCENDING)],
-        name="wallet_ledger_seller_created_at_idx",
+        [("seller_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="wallet_ledger_seller_created_at_id_idx",
+    )
+    await _drop_index_safe(db.wallet_ledger, "wallet_ledger_seller_created_at_idx")
+    try:
+        # One posting per (order, entry type); post_ledger_batch relies on it
+        # to make retried settlements / refunds / releases idempotent
+        await _create_index_safe(
+            db.wallet_ledger,
+            [("order_id", ASCENDING), ("entry_type", ASCENDING)],
+            name="wallet_ledger_order_entry_unique",
+            unique=True,
+            partialFilterExpression={"order_id": {"$type": "objectId"}},
+        )
+    except OperationFailure as e:
+        if getattr(e, "code", None) != 11000:
+            raise
+        # Serving without it would let every retry double-post money
+        raise RuntimeError(
+            "wallet_ledger has duplicate (order_id, entry_type) postings; "
+            "run `python -m scripts.dedupe_wallet_ledger` before starting"
+        ) from e
+    await _create_index_safe(
+        db.wallet_ledger,
+        [("journal_id", ASCENDING)],
+        name="wallet_ledger_journal_idx",
+        sparse=True,
     )
     await _create_index_safe(
         db.wallet_ledger,
@@ -0,0 +1,226 @@
+from datetime import datetime, timedelta
+
+from utils.wallet_service import (
+    ENTRY_SALE_CREDIT,
+    ENTRY_COMMISSION_DEBIT,
+    ENTRY_PLATFORM_FEE_DEBIT,
+    ENTRY_RESERVE_HOLD,
+    ENTRY_RESERVE_RELEASE,
+    ENTRY_REFUND_DEBIT,
+)
+
+# ==============================
+# Ledger <-> orders reconciliation
+# ==============================
+# Orders and ledger entries are both streamed sorted by order id and
+# merge-joined in one pass: no per-order lookups, memory bounded by the
+# postings of a single order.
+#
+#   missing     order state says an entry should exist, ledger has none
+#   duplicate   more than one entry of a type for the order
+#   mismatched  entry exists with the wrong amount
+#   unexpected  entry for an order whose state does not call for it
+#
+# Ledger entries are posted before the order is flagged, so only
+# "unexpected" can be caused by a write in flight; entries newer than
+# RECONCILE_LAG_SECONDS are not reported as unexpected.
+
+RECONCILE_LAG_SECONDS = 60 * 10
+RECONCILE_MAX_ISSUES = 500
+AMOUNT_TOLERANCE = 0.01
+
+RECONCILED_ENTRY_TYPES = [
+    ENTRY_SALE_CREDIT,
+    ENTRY_COMMISSION_DEBIT,
+    ENTRY_PLATFORM_FEE_DEBIT,
+    ENTRY_RESERVE_HOLD,
+    ENTRY_RESERVE_RELEASE,
+    ENTRY_REFUND_DEBIT,
+]
+
+RECONCILE_ORDER_QUERY = {
+    "$or": [
+        {"settlement.status": "settled"},
+        {"reserve_released": True},
+        {"return.refund_status": "completed"},
+    ]
+}
+
+RECONCILE_ORDER_PROJECTION = {
+    "seller_id": 1,
+    "pricing": 1,
+    "settlement.status": 1,
+    "reserve_released": 1,
+    "return.refund_status": 1,
+}
+
+
+def expected_postings(order: dict) -> tuple[dict, set]:
+    """
+    Entries the order's state requires, as {entry_type: signed amount or
+    None when the amount cannot be derived}, plus entry types that are
+    allowed but not required.
+    """
+    pricing = order.get("pricing") or {}
+    subtotal = pricing.get("subtotal", 0)
+    reserve = pricing.get("reserve_amount")
+    expected = {}
+    optional = set()
+
+    if (order.get("settlement") or {}).get("status") == "settled":
+        # Mirrors wallet_service.build_settlement_entries
+        commission = round(subtotal * pricing.get("commission_percent", 0) / 100, 2)
+        platform_fee = round(float(pricing.get("platform_fee") or 0), 2)
+        expected[ENTRY_COMMISSION_DEBIT] = -commission
+        if platform_fee > 0:
+            expected[ENTRY_PLATFORM_FEE_DEBIT] = -platform_fee
+
+        if reserve is None:
+            # Settled before reserve_amount was stored: only the split of
+            # sale credit vs reserve hold is unknown
+            expected[ENTRY_SALE_CREDIT] = None
+            optional.add(ENTRY_RESERVE_HOLD)
+        else:
+            expected[ENTRY_SALE_CREDIT] = round(subtotal - commission - reserve - platform_fee, 2)
+            if reserve > 0:
+                expected[ENTRY_RESERVE_HOLD] = reserve
+
+    if order.get("reserve_released") and reserve:
+        expected[ENTRY_RESERVE_RELEASE] = reserve
+
+    if (order.get("return") or {}).get("refund_status") == "completed":
+        expected[ENTRY_REFUND_DEBIT] = -pricing.get("seller_payout", subtotal)
+        if reserve:
+            # Released by the return worker, not by the manual refund route
+            optional.add(ENTRY_RESERVE_RELEASE)
+
+    return expected, optional
+
+
+def check_order_postings(order: dict, entries: list[dict], lag_cutoff: datetime | None = None) -> list[dict]:
+    expected, optional = expected_postings(order)
+
+    by_type = {}
+    for entry in entries:
+        by_type.setdefault(entry["entry_type"], []).append(entry)
+
+    issues = []
+
+    def issue(kind, entry_type, **extra):
+        issues.append({
+            "kind": kind,
+            "order_id": order["_id"],
+            "seller_id": order.get("seller_id"),
+            "entry_type": entry_type,
+            **extra,
+        })
+
+    for entry_type, amount in expected.items():
+        posted = by_type.get(entry_type, [])
+        if not posted:
+            issue("missing", entry_type, expected=amount)
+            continue
+        if len(posted) > 1:
+            issue("duplicate", entry_type, count=len(posted))
+        actual = posted[0].get("credit", 0) - posted[0].get("debit", 0)
+        if amount is not None and abs(actual - amount) > AMOUNT_TOLERANCE:
+            issue("mismatched", entry_type, expected=amount, actual=actual)
+
+    for entry_type, posted in by_type.items():
+        if entry_type in expected:
+            continue
+        if entry_type in optional:
+            if len(posted) > 1:
+                issue("duplicate", entry_type, count=len(posted))
+            continue
+        if lag_cutoff and any(e["created_at"] > lag_cutoff for e in posted):
+            continue
+        issue("unexpected", entry_type, count=len(posted))
+
+    return issues
+
+
+async def _group_by_order(cursor):
+    order_id, entries = None, []
+    async for entry in cursor:
+        if entry["order_id"] != order_id:
+            if entries:
+                yield order_id, entries
+            order_id, entries = entry["order_id"], []
+        entries.append(entry)
+    if entries:
+        yield order_id, entries
+
+
+async def reconcile_ledger(db, now: datetime | None = None) -> dict:
+    """
+    One merge-join pass over orders (by _id) and reconciled ledger entries
+    (by order_id, via wallet_ledger_order_entry_unique). Returns counts and
+    the first RECONCILE_MAX_ISSUES issues.
+    """
+    now = now or datetime.utcnow()
+    lag_cutoff = now - timedelta(seconds=RECONCILE_LAG_SECONDS)
+
+    orders = (
+        db.orders
+        .find(RECONCILE_ORDER_QUERY, RECONCILE_ORDER_PROJECTION)
+        .sort("_id", 1)
+        .batch_size(1000)
+    )
+    ledger = (
+        db.wallet_ledger
+        .find(
+            {
+                "order_id": {"$type": "objectId"},
+                "entry_type": {"$in": RECONCILED_ENTRY_TYPES},
+            },
+            {"order_id": 1, "seller_id": 1, "entry_type": 1, "credit": 1, "debit": 1, "created_at": 1},
+        )
+        .sort([("order_id", 1), ("entry_type", 1)])
+        .batch_size(5000)
+    )
+
+    report = {
+        "started_at": now,
+        "orders_checked": 0,
+        "entries_checked": 0,
+        "counts": {"missing": 0, "duplicate": 0, "mismatched": 0, "unexpected": 0},
+        "issues": [],
+    }
+
+    def record(issues):
+        for item in issues:
+            report["counts"][item["kind"]] += 1
+            if len(report["issues"]) < RECONCILE_MAX_ISSUES:
+                report["issues"].append(item)
+
+    def orphan(order_id, entries):
+        # Entries for an order with no posting-relevant state
+        order = {"_id": order_id, "seller_id": entries[0].get("seller_id")}
+        record(check_order_postings(order, entries, lag_cutoff))
+
+    groups = _group_by_order(ledger)
+    pending = await anext(groups, None)
+
+    async for order in orders:
+        while pending and pending[0] < order["_id"]:
+            report["entries_checked"] += len(pending[1])
+            orphan(*pending)
+            pending = await anext(groups, None)
+
+        entries = []
+        if pending and pending[0] == order["_id"]:
+            entries = pending[1]
+            report["entries_checked"] += len(entries)
+            pending = await anext(groups, None)
+
+        report["orders_checked"] += 1
+        record(check_order_postings(order, entries, lag_cutoff))
+
+    while pending:
+        report["entries_checked"] += len(pending[1])
+        orphan(*pending)
+        pending = await anext(groups, None)
+
+    report["finished_at"] = datetime.utcnow()
+    return report
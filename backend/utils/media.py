@@ -0,0 +1,257 @@
+import asyncio
+import io
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from fastapi import HTTPException, UploadFile, status
+
+from config.env import (
+    MEDIA_BACKEND,
+    MEDIA_LOCAL_ROOT,
+    MEDIA_LOCAL_URL,
+    MEDIA_MAX_UPLOAD_BYTES,
+    MEDIA_PUBLIC_BASE_URL,
+)
+from utils.image_variants import IMAGE_VARIANT_FORMATS, generate_variants
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Media storage
+# ==============================
+# Routes hand uploads to store_image / store_product_images, which:
+#
+#   1. read the upload in chunks, rejecting it past MEDIA_MAX_UPLOAD_BYTES
+#   2. sniff the real type from the leading bytes (the client's
+#      content_type is not trusted)
+#   3. write it through the configured MediaBackend in a worker thread, so
+#      the (blocking) provider SDK never runs on the event loop
+#
+# Backends: "cloudinary" (production) and "local" (files on disk served by
+# main.py at MEDIA_LOCAL_URL; dev / tests, no credentials needed). Both
+# return absolute URLs, local ones under MEDIA_PUBLIC_BASE_URL.
+#
+# Product images also get resized variants (utils/image_variants.py) stored
+# next to the original. The URLs are recorded in media_assets keyed by the
+# original URL; product create copies them onto the product as
+# image_variants, aligned with images.
+
+MEDIA_READ_CHUNK_BYTES = 256 * 1024
+MEDIA_MAX_FILES_PER_REQUEST = 10
+MEDIA_UPLOAD_CONCURRENCY = 4
+
+# Leading bytes -> (content type, extension)
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ("image/jpeg", "jpg")),
+    (b"\x89PNG\r\n\x1a\n", ("image/png", "png")),
+    (b"GIF87a", ("image/gif", "gif")),
+    (b"GIF89a", ("image/gif", "gif")),
+)
+
+
+def sniff_image_type(head: bytes) -> tuple[str, str] | None:
+    for signature, kind in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return None
+
+
+# ==============================
+# Backends
+# ==============================
+
+class MediaBackend(ABC):
+    """
+    put() is blocking and always called off the event loop.
+    Returns the absolute public URL of the stored object.
+    """
+
+    @abstractmethod
+    def put(self, data: bytes, *, folder: str, name: str, content_type: str) -> str:
+        ...
+
+
+class CloudinaryMediaBackend(MediaBackend):
+    def put(self, data: bytes, *, folder: str, name: str, content_type: str) -> str:
+        # Imported here so the local backend runs without Cloudinary config
+        from utils.cloudinary import upload_image
+
+        public_id = name.rsplit(".", 1)[0]
+        result = upload_image(io.BytesIO(data), folder=folder, public_id=public_id)
+        url = result.get("secure_url")
+        if not url:
+            raise RuntimeError("Cloudinary returned no secure_url")
+        return url
+
+
+class LocalMediaBackend(MediaBackend):
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def put(self, data: bytes, *, folder: str, name: str, content_type: str) -> str:
+        directory = os.path.join(self.root, folder)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write then rename so readers never see a partial file
+        path = os.path.join(directory, name)
+        tmp_path = f"{path}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return f"{self.base_url}/{folder}/{name}"
+
+
+MEDIA_BACKENDS = {
+    "cloudinary": lambda: CloudinaryMediaBackend(),
+    "local": lambda: LocalMediaBackend(
+        MEDIA_LOCAL_ROOT,
+        f"{MEDIA_PUBLIC_BASE_URL.rstrip('/')}/{MEDIA_LOCAL_URL.strip('/')}",
+    ),
+}
+
+_backend: MediaBackend | None = None
+
+
+def get_media_backend() -> MediaBackend:
+    global _backend
+    if _backend is None:
+        factory = MEDIA_BACKENDS.get(MEDIA_BACKEND)
+        if not factory:
+            raise HTTPException(status_code=500, detail="Unsupported media backend")
+        _backend = factory()
+    return _backend
+
+
+# ==============================
+# Upload pipeline
+# ==============================
+
+async def read_image_upload(file: UploadFile, max_bytes: int = MEDIA_MAX_UPLOAD_BYTES) -> tuple[bytes, str, str]:
+    """
+    Returns (data, content_type, extension). 413 past max_bytes,
+    400 if the bytes are not a supported image.
+    """
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(MEDIA_READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"{file.filename or 'File'} exceeds {max_bytes // (1024 * 1024)} MB",
+            )
+
+    kind = sniff_image_type(bytes(buffer[:16]))
+    if not kind:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only JPEG, PNG, WebP or GIF images are allowed",
+        )
+    return bytes(buffer), *kind
+
+
+async def put_media(data: bytes, *, folder: str, name: str, content_type: str) -> str:
+    backend = get_media_backend()
+    try:
+        return await asyncio.to_thread(
+            backend.put, data, folder=folder, name=name, content_type=content_type,
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Media upload failed",
+        )
+
+
+async def store_image(file: UploadFile, folder: str) -> str:
+    data, content_type, ext = await read_image_upload(file)
+    return await put_media(data, folder=folder, name=f"{uuid.uuid4().hex}.{ext}", content_type=content_type)
+
+
+async def _store_variants(data: bytes, *, folder: str, base_name: str) -> dict | None:
+    """
+    {variant: {format: url}}, or None if variants could not be produced
+    (the original is still usable, so this never fails the upload).
+    """
+    try:
+        rendered = await generate_variants(data)
+        if not rendered:
+            return None
+
+        async def put_variant(variant: str, fmt: str, body: bytes):
+            ext, content_type = IMAGE_VARIANT_FORMATS[fmt][:2]
+            url = await put_media(body, folder=folder, name=f"{base_name}_{variant}_{fmt}.{ext}", content_type=content_type)
+            return variant, fmt, url
+
+        variants = {}
+        for variant, fmt, url in await asyncio.gather(*(put_variant(*r) for r in rendered)):
+            variants.setdefault(variant, {})[fmt] = url
+        return variants
+    except Exception:
+        logger.exception("IMAGE_VARIANTS_ERROR folder=%s name=%s", folder, base_name)
+        return None
+
+
+async def _store_product_image(db, image: tuple[bytes, str, str], *, folder: str, owner_id) -> dict:
+    data, content_type, ext = image
+    base_name = uuid.uuid4().hex
+
+    url, variants = await asyncio.gather(
+        put_media(data, folder=folder, name=f"{base_name}.{ext}", content_type=content_type),
+        _store_variants(data, folder=folder, base_name=base_name),
+    )
+
+    await db.media_assets.insert_one({
+        "url": url,
+        "variants": variants,
+        "owner_id": owner_id,
+        "content_type": content_type,
+        "bytes": len(data),
+        "created_at": datetime.utcnow(),
+    })
+    return {"url": url, "variants": variants}
+
+
+async def store_product_images(db, files: list[UploadFile], *, folder: str, owner_id) -> list[dict]:
+    """
+    [{url, variants}] in input order. Every file is validated first (nothing
+    is stored if one is rejected), then up to MEDIA_UPLOAD_CONCURRENCY
+    images are processed at a time.
+    """
+    if len(files) > MEDIA_MAX_FILES_PER_REQUEST:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MEDIA_MAX_FILES_PER_REQUEST} files per request",
+        )
+
+    images = [await read_image_upload(f) for f in files]
+    semaphore = asyncio.Semaphore(MEDIA_UPLOAD_CONCURRENCY)
+
+    async def store(image: tuple[bytes, str, str]) -> dict:
+        async with semaphore:
+            return await _store_product_image(db, image, folder=folder, owner_id=owner_id)
+
+    return await asyncio.gather(*(store(image) for image in images))
+
+
+async def get_image_variants(db, urls: list[str], owner_id) -> list[dict | None]:
+    """
+    Stored variants for each URL (None for URLs uploaded before variants
+    existed, or not uploaded through us), aligned with urls.
+    """
+    assets = db.media_assets.find(
+        {"url": {"$in": urls}, "owner_id": owner_id},
+        {"url": 1, "variants": 1},
+    )
+    by_url = {a["url"]: a.get("variants") async for a in assets}
+    return [by_url.get(url) for url in urls]
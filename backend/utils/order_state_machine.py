@@ -0,0 +1,298 @@
+from datetime import datetime
+from fastapi import HTTPException
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# ============================================================
+# ORDER STATE MACHINE
+# ============================================================
+# Every lifecycle transition is declared once here and executed as a single
+# find_one_and_update filtered on the from-state, so the state check and the
+# write are one atomic round trip. Callers get the post-image back for
+# timeline / trust / audit hooks.
+#
+# Three state fields are driven by this table:
+# - status                : created -> shipped -> delivery_otp_pending -> delivered / rto
+#                           (shipped | delivery_otp_pending -> delivery_reported -> delivered)
+# - return.status         : None -> requested -> approved | rejected
+# - return.pickup_status  : None -> scheduled -> picked_up
+# ============================================================
+
+ORDER_TRANSITIONS = {
+    # ---------------- ORDER STATUS ----------------
+    "ship": {
+        "field": "status",
+        "from": ("created",),
+        "to": "shipped",
+        "error": "Order cannot be shipped in current state",
+    },
+    "generate_delivery_otp": {
+        "field": "status",
+        "from": ("shipped",),
+        "to": "delivery_otp_pending",
+        "guard": {"delivery_otp_hash": {"$exists": False}},
+        "error": "Order not eligible for OTP",
+    },
+    "report_delivery": {
+        # Courier webhook says DELIVERED; buyer OTP confirmation still pending
+        "field": "status",
+        "from": ("shipped", "delivery_otp_pending"),
+        "to": "delivery_reported",
+        "error": "Order cannot be reported delivered in current state",
+    },
+    "deliver": {
+        "field": "status",
+        # delivery_reported: courier webhook landed after the OTP was issued
+        "from": ("delivery_otp_pending", "delivery_reported"),
+        "to": "delivered",
+        "guard": {
+            "delivered_at": None,
+            "$or": [
+                {"payment.method": {"$ne": "RAZORPAY"}},
+                {"payment.status": "paid"},
+            ],
+        },
+        "error": "Order cannot be delivered in current state",
+    },
+    "cod_rto": {
+        "field": "status",
+        "from": ("created", "shipped", "out_for_delivery"),
+        "to": "rto",
+        "guard": {"payment.method": "COD"},
+        "error": "Invalid RTO state",
+    },
+
+    # ---------------- RETURNS ----------------
+    "request_return": {
+        "field": "return.status",
+        "from": (None,),
+        "to": "requested",
+        "guard": {"status": "delivered"},
+        "error": "Return not allowed",
+    },
+    "approve_return": {
+        "field": "return.status",
+        "from": ("requested",),
+        "to": "approved",
+        "guard": {"return.seller_action": None},
+        "error": "No active return request",
+    },
+    "reject_return": {
+        "field": "return.status",
+        "from": ("requested",),
+        "to": "rejected",
+        "guard": {"return.seller_action": None},
+        "error": "No active return request",
+    },
+    "schedule_return_pickup": {
+        "field": "return.pickup_status",
+        "from": (None,),
+        "to": "scheduled",
+        "guard": {"return.status": "approved"},
+        "error": "Return not approved",
+    },
+    "complete_return_pickup": {
+        "field": "return.pickup_status",
+        "from": ("scheduled",),
+        "to": "picked_up",
+        "error": "Pickup not scheduled",
+    },
+}
+
+
+def _get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+class OrderStateMachine:
+    def __init__(self, db):
+        self.db = db
+
+    # --------------------------------------------------
+    # QUERY BUILDING (shared with bulk callers)
+    # --------------------------------------------------
+
+    @staticmethod
+    def transition(name: str) -> dict:
+        try:
+            return ORDER_TRANSITIONS[name]
+        except KeyError:
+            raise ValueError(f"Unknown order transition: {name}")
+
+    def build_filter(
+        self,
+        name: str,
+        order_id,
+        *,
+        scope: dict | None = None,
+        extra_filter: dict | None = None,
+    ) -> dict:
+        spec = self.transition(name)
+        from_states = list(spec["from"])
+
+        query = {"_id": order_id}
+        if scope:
+            query.update(scope)
+
+        query[spec["field"]] = from_states[0] if len(from_states) == 1 else {"$in": from_states}
+
+        clauses = [query] + [c for c in (spec.get("guard"), extra_filter) if c]
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def build_update(
+        self,
+        name: str,
+        *,
+        set_fields: dict | None = None,
+        unset_fields: list[str] | None = None,
+        push: dict | None = None,
+        now: datetime | None = None,
+    ) -> dict:
+        spec = self.transition(name)
+        now = now or datetime.utcnow()
+
+        update = {
+            "$set": {
+                spec["field"]: spec["to"],
+                "updated_at": now,
+                **(set_fields or {}),
+            }
+        }
+        if unset_fields:
+            update["$unset"] = {field: "" for field in unset_fields}
+        if push:
+            update["$push"] = push
+
+        return update
+
+    def build_bulk_op(self, name: str, order_id, **kwargs) -> UpdateOne:
+        filter_kwargs = {k: kwargs.pop(k) for k in ("scope", "extra_filter") if k in kwargs}
+        return UpdateOne(
+            self.build_filter(name, order_id, **filter_kwargs),
+            self.build_update(name, **kwargs),
+        )
+
+    # --------------------------------------------------
+    # EXECUTION
+    # --------------------------------------------------
+
+    async def apply(
+        self,
+        name: str,
+        order_id,
+        *,
+        scope: dict | None = None,
+        extra_filter: dict | None = None,
+        set_fields: dict | None = None,
+        unset_fields: list[str] | None = None,
+        push: dict | None = None,
+        projection: dict | None = None,
+        now: datetime | None = None,
+    ) -> dict | None:
+        """
+        Execute a transition in one round trip.
+        Returns the post-image, or None if the order is missing, outside the
+        caller's scope, or not in a legal from-state.
+        """
+        return await self.db.orders.find_one_and_update(
+            self.build_filter(name, order_id, scope=scope, extra_filter=extra_filter),
+            self.build_update(
+                name,
+                set_fields=set_fields,
+                unset_fields=unset_fields,
+                push=push,
+                now=now,
+            ),
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def apply_or_raise(self, name: str, order_id, *, scope: dict | None = None, **kwargs) -> dict:
+        """
+        apply() that maps a rejected transition to 404 / 400.
+        The extra read only happens on the failure path.
+        """
+        order = await self.apply(name, order_id, scope=scope, **kwargs)
+        if order:
+            return order
+
+        exists = await self.db.orders.find_one({"_id": order_id, **(scope or {})}, {"_id": 1})
+        if not exists:
+            raise HTTPException(404, "Order not found")
+
+        raise HTTPException(400, self.transition(name)["error"])
+
+    async def apply_bulk(
+        self,
+        name: str,
+        updates: dict,
+        *,
+        scope: dict | None = None,
+        now: datetime | None = None,
+    ) -> dict:
+        """
+        Run one transition for many orders.
+
+        updates: {order_id: {"set_fields": ..., "unset_fields": ..., "push": ...}}
+        Returns {order_id: "applied" | "not_found" | "invalid_state" | "duplicate_key"}.
+
+        Ownership and current state are checked in one query, transitions are
+        applied in one unordered bulk_write (still filtered on the from-state),
+        and only a partial result costs one extra read to see which orders moved.
+        """
+        spec = self.transition(name)
+        now = now or datetime.utcnow()
+        order_ids = list(updates)
+        results = {oid: "not_found" for oid in order_ids}
+        if not order_ids:
+            return results
+
+        # 1. Ownership + current state
+        current = await self.db.orders.find(
+            {"_id": {"$in": order_ids}, **(scope or {})},
+            {spec["field"]: 1},
+        ).to_list(len(order_ids))
+
+        candidates = []
+        for order in current:
+            if _get_path(order, spec["field"]) in spec["from"]:
+                candidates.append(order["_id"])
+            else:
+                results[order["_id"]] = "invalid_state"
+
+        if not candidates:
+            return results
+
+        # 2. Conditional transitions
+        ops = [
+            self.build_bulk_op(name, oid, scope=scope, now=now, **updates[oid])
+            for oid in candidates
+        ]
+        failed = {}
+        try:
+            write = await self.db.orders.bulk_write(ops, ordered=False)
+            modified = write.modified_count
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                oid = candidates[err["index"]]
+                failed[oid] = "duplicate_key" if err.get("code") == 11000 else "invalid_state"
+            modified = e.details.get("nModified", 0)
+
+        if modified == len(candidates):
+            applied = set(candidates)
+        else:
+            # A guard or a concurrent writer rejected some; see which ones moved
+            moved = await self.db.orders.find(
+                {"_id": {"$in": candidates}, spec["field"]: spec["to"], "updated_at": now},
+                {"_id": 1},
+            ).to_list(len(candidates))
+            applied = {o["_id"] for o in moved}
+
+        for oid in candidates:
+            results[oid] = "applied" if oid in applied else failed.get(oid, "invalid_state")
+
+        return results
@@ -1,5 +1,24 @@
+import asyncio
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from utils.cursors import decode_keyset_cursor, encode_keyset_cursor
+
+TIMELINE_PAGE_DEFAULT = 50
+TIMELINE_PAGE_MAX = 200
+TIMELINE_BATCH_CONCURRENCY = 8
+
+# Fields returned to buyers/sellers. order_id is implied by the request and
+# actor_id is internal, so neither leaves the collection.
+TIMELINE_PROJECTION = {
+    "_id": 1,
+    "event": 1,
+    "actor_role": 1,
+    "metadata": 1,
+    "created_at": 1,
+}
+
 
 async def record_order_event(
     db,
@@ -9,18 +28,139 @@ async def record_order_event(
     actor_role: str,
     actor_id=None,
     metadata: dict | None = None,
+    dedupe_key: str | None = None,
 ):
     """
     Single source of truth for order timeline events.
+    With dedupe_key the event is written at most once (retries / replays).
     """
 
+    doc = build_order_event(
+        order_id=order_id,
+        event=event,
+        actor_role=actor_role,
+        actor_id=actor_id,
+        metadata=metadata,
+        dedupe_key=dedupe_key,
+    )
+
+    try:
+        await db.order_timeline.insert_one(doc)
+    except DuplicateKeyError:
+        if not dedupe_key:
+            raise
+
+
+def build_order_event(
+    *,
+    order_id,
+    event: str,
+    actor_role: str,
+    actor_id=None,
+    metadata: dict | None = None,
+    created_at: datetime | None = None,
+    dedupe_key: str | None = None,
+) -> dict:
     doc = {
         "order_id": ObjectId(order_id),
         "event": event,
         "actor_role": actor_role,
         "actor_id": ObjectId(actor_id) if actor_id else None,
         "metadata": metadata or {},
-        "created_at": datetime.utcnow(),
+        "created_at": created_at or datetime.utcnow(),
     }
+    # Unique (partial) index order_timeline_dedupe_key_unique
+    if dedupe_key:
+        doc["dedupe_key"] = dedupe_key
+    return doc
+
+
+async def record_order_events(db, docs: list[dict]):
+    """
+    Bulk variant of record_order_event for docs built with build_order_event.
+    """
+    if not docs:
+        return
+    try:
+        await db.order_timeline.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Events already written under the same dedupe_key are skipped
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+# ======================================================
+# READ PATH (served by order_timeline_order_created_at_idx)
+# ======================================================
+
+def _serialize_event(event: dict) -> dict:
+    event = dict(event)
+    event.pop("_id", None)
+    return event
+
+
+def timeline_query(order_id, cursor: str | None = None) -> dict:
+    query = {"order_id": order_id}
+    if cursor:
+        created_at, last_id = decode_keyset_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "_id": {"$gt": last_id}},
+        ]
+    return query
+
+
+async def fetch_order_timeline(
+    db,
+    order_id,
+    *,
+    limit: int = TIMELINE_PAGE_DEFAULT,
+    cursor: str | None = None,
+) -> dict:
+    """
+    One page of an order timeline, oldest first.
+    Keyset paginated on (created_at, _id) so every page is an index range scan.
+    """
+    limit = min(max(limit, 1), TIMELINE_PAGE_MAX)
+
+    events = await (
+        db.order_timeline
+        .find(timeline_query(order_id, cursor), TIMELINE_PROJECTION)
+        .sort([("created_at", 1), ("_id", 1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    return {
+        "events": [_serialize_event(e) for e in events],
+        "next_cursor": encode_keyset_cursor(events[-1]["created_at"], events[-1]["_id"]) if has_more else None,
+    }
+
+
+async def fetch_order_timelines(
+    db,
+    order_ids: list,
+    *,
+    per_order_limit: int = TIMELINE_PAGE_DEFAULT,
+) -> dict:
+    """
+    First page of several order timelines.
+    Returns {order_id: {"events": [...], "next_cursor": ...}}; orders with more
+    events than per_order_limit carry a cursor for fetch_order_timeline.
+
+    Each order is its own limited index range scan (at most
+    per_order_limit + 1 events read), up to TIMELINE_BATCH_CONCURRENCY at a
+    time, so a long timeline never costs more than a page.
+    """
+    semaphore = asyncio.Semaphore(TIMELINE_BATCH_CONCURRENCY)
+
+    async def first_page(order_id) -> dict:
+        async with semaphore:
+            return await fetch_order_timeline(db, order_id, limit=per_order_limit)
 
-    await db.order_timeline.insert_one(doc)
+    order_ids = list(dict.fromkeys(order_ids))
+    pages = await asyncio.gather(*(first_page(oid) for oid in order_ids))
+    return dict(zip(order_ids, pages))
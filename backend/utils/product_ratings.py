@@ -0,0 +1,174 @@
+import logging
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Product rating counters
+# ==============================
+# Each product keeps its rating as counters maintained with $inc when a
+# visible review is added, hidden or shown again:
+#
+#   rating: { sum, count, avg, histogram: {"1": n, ..., "5": n} }
+#
+# avg is derived from sum / count after every increment. The $set of avg is
+# guarded on the counters it was computed from, so when two writers race
+# only the one holding the latest counters writes it.
+#
+# Products without counters yet (no reviews, or the old {avg, count} shape)
+# are built by a full count on first write. rebuild_product_rating /
+# rebuild_all_product_ratings recompute from reviews (repair path only), so
+# a failed counter write is logged rather than failing the review.
+
+RATING_STARS = (1, 2, 3, 4, 5)
+RATING_REBUILD_CHUNK_SIZE = 1000
+
+
+def rating_from_histogram(histogram: dict) -> dict:
+    histogram = {str(star): histogram.get(str(star), 0) for star in RATING_STARS}
+    count = sum(histogram.values())
+    total = sum(star * histogram[str(star)] for star in RATING_STARS)
+    return {
+        "sum": total,
+        "count": count,
+        "avg": round(total / count, 1) if count else 0,
+        "histogram": histogram,
+    }
+
+
+async def apply_rating_change(db, product_id, stars: int, delta: int):
+    """
+    Add (delta=1) or remove (delta=-1) one visible review of `stars`.
+    """
+    try:
+        product = await db.products.find_one_and_update(
+            {"_id": product_id, "rating.sum": {"$exists": True}},
+            {"$inc": {
+                "rating.sum": stars * delta,
+                "rating.count": delta,
+                f"rating.histogram.{stars}": delta,
+            }},
+            projection={"rating.sum": 1, "rating.count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not product:
+            # No counters yet; the full count already includes this change
+            await rebuild_product_rating(db, product_id)
+            return
+
+        total, count = product["rating"]["sum"], product["rating"]["count"]
+        await db.products.update_one(
+            {"_id": product_id, "rating.sum": total, "rating.count": count},
+            {"$set": {"rating.avg": round(total / count, 1) if count > 0 else 0}},
+        )
+    except Exception:
+        logger.exception("PRODUCT_RATING_WRITE_ERROR product=%s", product_id)
+
+
+async def get_product_rating(db, product_id) -> dict:
+    """
+    Stored rating counters (sum, count, avg, histogram) for the product.
+    """
+    product = await db.products.find_one({"_id": product_id}, {"rating": 1})
+    if not product:
+        return rating_from_histogram({})
+    rating = product.get("rating") or {}
+    if "sum" not in rating:
+        return await rebuild_product_rating(db, product_id)
+    histogram = rating.get("histogram") or {}
+    return {
+        "sum": rating["sum"],
+        "count": rating.get("count", 0),
+        "avg": rating.get("avg", 0),
+        "histogram": {str(star): histogram.get(str(star), 0) for star in RATING_STARS},
+    }
+
+
+# ==============================
+# Repair (recount from reviews)
+# ==============================
+
+async def rebuild_product_rating(db, product_id) -> dict:
+    histogram = {
+        str(row["_id"]): row["count"]
+        async for row in db.reviews.aggregate([
+            {"$match": {"product_id": product_id, "is_visible": True}},
+            {"$group": {"_id": "$rating", "count": {"$sum": 1}}},
+        ])
+    }
+    rating = rating_from_histogram(histogram)
+    await db.products.update_one({"_id": product_id}, {"$set": {"rating": rating}})
+    return rating
+
+
+def _histograms_pipeline() -> list[dict]:
+    return [
+        {"$match": {"is_visible": True, "product_id": {"$type": "objectId"}}},
+        {"$group": {
+            "_id": {"product_id": "$product_id", "stars": "$rating"},
+            "count": {"$sum": 1},
+        }},
+        {"$group": {
+            "_id": "$_id.product_id",
+            "stars": {"$push": {"k": {"$toString": "$_id.stars"}, "v": "$count"}},
+        }},
+        {"$project": {"histogram": {"$arrayToObject": "$stars"}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+async def _iterate(cursor):
+    async for doc in cursor:
+        yield doc
+
+
+async def rebuild_all_product_ratings(db) -> dict:
+    """
+    One $group over visible reviews merge-joined with products by _id.
+    Only products whose stored rating differs are written.
+    """
+    summary = {"products_processed": 0, "repaired": 0}
+    ops = []
+
+    async def flush():
+        if ops:
+            await db.products.bulk_write(ops, ordered=False)
+            ops.clear()
+
+    groups = _iterate(db.reviews.aggregate(_histograms_pipeline(), allowDiskUse=True))
+    pending = await anext(groups, None)
+
+    products = (
+        db.products
+        .find({}, {"rating": 1})
+        .sort("_id", 1)
+        .batch_size(RATING_REBUILD_CHUNK_SIZE)
+    )
+    async for product in products:
+        # Reviews of deleted products are skipped
+        while pending and pending["_id"] < product["_id"]:
+            pending = await anext(groups, None)
+
+        histogram = {}
+        if pending and pending["_id"] == product["_id"]:
+            histogram = pending["histogram"]
+            pending = await anext(groups, None)
+
+        rating = rating_from_histogram(histogram)
+        if product.get("rating") != rating:
+            ops.append(UpdateOne({"_id": product["_id"]}, {"$set": {"rating": rating}}))
+            summary["repaired"] += 1
+
+        summary["products_processed"] += 1
+        if len(ops) >= RATING_REBUILD_CHUNK_SIZE:
+            await flush()
+
+    await flush()
+
+    summary["finished_at"] = datetime.utcnow()
+    logger.info(
+        "PRODUCT_RATING_REBUILD processed=%s repaired=%s",
+        summary["products_processed"], summary["repaired"],
+    )
+    return summary
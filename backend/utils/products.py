@@ -1,5 +1,14 @@
 from bson import ObjectId
 
+def card_image_variants(product: dict) -> dict | None:
+    """
+    Resized variants ({thumb|card|pdp: {webp, jpeg}}) of the product's first
+    image; None for images uploaded before variants existed.
+    """
+    variants = product.get("image_variants") or []
+    return variants[0] if variants else None
+
+
 def build_product_card(product: dict, seller: dict):
     product_images = product.get("images") or product.get("image_urls") or []
 
@@ -9,6 +18,7 @@ def build_product_card(product: dict, seller: dict):
         "selling_price": product.get("selling_price"),
         "mrp": product.get("mrp"),
         "images": product_images,
+        "image_variants": card_image_variants(product),
         "category": product.get("category"),
         "sub_category": product.get("sub_category"),
         "seller": {
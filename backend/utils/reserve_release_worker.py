@@ -2,55 +2,84 @@ import asyncio
 import logging
 from datetime import datetime, timedelta
 from database import get_db
-from utils.wallet_service import release_reserve
+from utils.wallet_service import build_reserve_release_entry, post_ledger_batch
 
 CHECK_INTERVAL_SECONDS = 60 * 60  # every 1 hour
 RESERVE_HOLD_DAYS = 7
+RESERVE_RELEASE_BATCH_SIZE = 500
 logger = logging.getLogger(__name__)
 
 
+async def _release_batch(db, orders: list[dict], now: datetime) -> int:
+    entries = [
+        build_reserve_release_entry(
+            order["seller_id"],
+            order["_id"],
+            order["pricing"]["reserve_amount"],
+        )
+        for order in orders
+    ]
+    # One journal per batch; orders released by an earlier, interrupted run
+    # come back as duplicates and are just flagged below
+    await post_ledger_batch(db, entries)
+
+    await db.orders.update_many(
+        {"_id": {"$in": [o["_id"] for o in orders]}},
+        {
+            "$set": {
+                "reserve_released": True,
+                "reserve_released_at": now,
+            }
+        },
+    )
+    return len(orders)
+
+
+async def release_due_reserves(db, order_ids: list | None = None):
+    """
+    Release reserves held past RESERVE_HOLD_DAYS on orders without an
+    approved return. order_ids limits the pass to orders popped from
+    scheduled_actions.
+    """
+    now = datetime.utcnow()
+    cutoff_time = now - timedelta(days=RESERVE_HOLD_DAYS)
+
+    query = {
+        "status": "delivered",
+        "delivered_at": {"$lte": cutoff_time},
+        "reserve_released": {"$ne": True},
+        "return.status": {"$ne": "approved"},
+        "pricing.reserve_amount": {"$gt": 0},
+    }
+    if order_ids is not None:
+        query["_id"] = {"$in": order_ids}
+
+    released = 0
+    batch = []
+    async for order in db.orders.find(query, {"seller_id": 1, "pricing.reserve_amount": 1}):
+        batch.append(order)
+        if len(batch) < RESERVE_RELEASE_BATCH_SIZE:
+            continue
+        try:
+            released += await _release_batch(db, batch, now)
+        except Exception:
+            # Never crash worker for one bad batch; the next run retries it
+            logger.exception("RESERVE_RELEASE_ERROR orders=%s", len(batch))
+        batch = []
+
+    if batch:
+        try:
+            released += await _release_batch(db, batch, now)
+        except Exception:
+            logger.exception("RESERVE_RELEASE_ERROR orders=%s", len(batch))
+
+    if released:
+        logger.info("RESERVE_RELEASE_RUN released=%s", released)
+
+
 async def reserve_release_worker():
     db = get_db()
 
     while True:
-        now = datetime.utcnow()
-        cutoff_time = now - timedelta(days=RESERVE_HOLD_DAYS)
-
-        cursor = db.orders.find({
-            "status": "delivered",
-            "delivered_at": {"$lte": cutoff_time},
-            "reserve_released": {"$ne": True},
-            "return.status": {"$ne": "approved"},
-        })
-
-        async for order in cursor:
-            try:
-                seller_id = order["seller_id"]
-                order_id = order["_id"]
-                reserve_amount = order.get("pricing", {}).get("reserve_amount", 0)
-
-                if reserve_amount <= 0:
-                    continue
-
-                await release_reserve(
-                    db=db,
-                    seller_id=seller_id,
-                    order_id=order_id,
-                    reserve_amount=reserve_amount,
-                )
-
-                await db.orders.update_one(
-                    {"_id": order_id},
-                    {
-                        "$set": {
-                            "reserve_released": True,
-                            "reserve_released_at": now,
-                        }
-                    }
-                )
-
-            except Exception:
-                # Never crash worker for one bad order
-                logger.exception("RESERVE_RELEASE_ERROR order=%s", order.get("_id"))
-
+        await release_due_reserves(db)
         await asyncio.sleep(CHECK_INTERVAL_SECONDS)
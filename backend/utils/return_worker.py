@@ -1,12 +1,16 @@
 import asyncio
 from datetime import datetime
 from database import get_db
-from utils.wallet_service import process_return_refund, release_reserve
+from utils.rollups import record_rollups, ROLLUP_REFUNDS_COMPLETED
+from utils.wallet_service import (
+    build_refund_entry,
+    build_reserve_release_entry,
+    post_ledger_batch,
+)
 
 CHECK_INTERVAL = 60 * 15  # every 15 minutes
 
-async def auto_process_returns():
-    db = get_db()
+async def auto_process_returns(db):
     now = datetime.utcnow()
 
     cursor = db.orders.find({
@@ -20,26 +24,16 @@ async def auto_process_returns():
         refund_amount = order["pricing"].get("seller_payout", order["pricing"]["subtotal"])
         reserve_amount = order["pricing"].get("reserve_amount", 0)
 
-        # 1️⃣ Refund buyer impact (ledger)
-        await process_return_refund(
-            db=db,
-            seller_id=seller_id,
-            order_id=order_id,
-            refund_amount=refund_amount,
-        )
-
-        # 2️⃣ Release reserve
+        # 1️⃣ Refund buyer impact + 2️⃣ release reserve, posted as one journal.
+        # A retry after a crash skips whatever already landed.
+        entries = [build_refund_entry(seller_id, order_id, refund_amount)]
         if reserve_amount > 0:
-            await release_reserve(
-                db=db,
-                seller_id=seller_id,
-                order_id=order_id,
-                reserve_amount=reserve_amount,
-            )
+            entries.append(build_reserve_release_entry(seller_id, order_id, reserve_amount))
+        await post_ledger_batch(db, entries)
 
         # 3️⃣ Mark refund processed
-        await db.orders.update_one(
-            {"_id": order_id},
+        result = await db.orders.update_one(
+            {"_id": order_id, "return.refund_status": {"$ne": "completed"}},
             {
                 "$set": {
                     "return.refund_processed": True,
@@ -49,8 +43,12 @@ async def auto_process_returns():
                 }
             }
         )
+        if result.modified_count:
+            await record_rollups(db, at=now, flows={ROLLUP_REFUNDS_COMPLETED: 1})
 
 async def return_worker():
+    db = get_db()
+
     while True:
-        await auto_process_returns()
+        await auto_process_returns(db)
         await asyncio.sleep(CHECK_INTERVAL)
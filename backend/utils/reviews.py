@@ -0,0 +1,65 @@
+from bson import ObjectId
+
+from utils.cursors import decode_keyset_cursor, encode_keyset_cursor
+
+# ==============================
+# Product review pages
+# ==============================
+# Keyset pages of a product's visible reviews. Each sort mode is
+# (field, direction) then _id desc, and has its own index with the
+# (product_id, is_visible) equality prefix, so every page is an index walk:
+#
+#   newest   created_at desc   reviews_product_visible_created_idx
+#   highest  rating desc       reviews_product_visible_rating_desc_idx
+#   lowest   rating asc        reviews_product_visible_rating_asc_idx
+#
+# Cursors are utils/cursors.py keyset cursors of the last review on the page.
+
+REVIEW_PAGE_DEFAULT = 10
+REVIEW_PAGE_MAX = 50
+
+REVIEW_SORTS = {
+    "newest": ("created_at", -1),
+    "highest": ("rating", -1),
+    "lowest": ("rating", 1),
+}
+
+REVIEW_PROJECTION = {
+    "rating": 1,
+    "comment": 1,
+    "created_at": 1,
+}
+
+async def get_review_page(
+    db,
+    product_id: ObjectId,
+    *,
+    sort: str = "newest",
+    cursor: str | None = None,
+    limit: int = REVIEW_PAGE_DEFAULT,
+) -> dict:
+    field, direction = REVIEW_SORTS[sort]
+    limit = min(max(limit, 1), REVIEW_PAGE_MAX)
+
+    query = {"product_id": product_id, "is_visible": True}
+    if cursor:
+        value, last_id = decode_keyset_cursor(cursor, as_datetime=field == "created_at")
+        query["$or"] = [
+            {field: {"$lt" if direction < 0 else "$gt": value}},
+            {field: value, "_id": {"$lt": last_id}},
+        ]
+
+    reviews = await (
+        db.reviews
+        .find(query, REVIEW_PROJECTION)
+        .sort([(field, direction), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+
+    has_more = len(reviews) > limit
+    reviews = reviews[:limit]
+    return {
+        "reviews": reviews,
+        "next_cursor": encode_keyset_cursor(reviews[-1][field], reviews[-1]["_id"]) if has_more else None,
+    }
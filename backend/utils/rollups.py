@@ -0,0 +1,257 @@
+import logging
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Dashboard rollups
+# ==============================
+# Admin dashboards read precomputed counters from the rollups collection
+# instead of aggregating orders / wallet_ledger on every page load:
+#
+#   _id "running"           cumulative flows + current gauges
+#   _id "daily:YYYY-MM-DD"  flows that happened that (UTC) day
+#
+# Flows only ever grow (orders created, delivered, ledger credit per type,
+# ...). Gauges go up and down (COD cash still pending, payouts not yet
+# settled) and only exist on the running row.
+#
+# Writers call record_rollups right after the state change they count. A
+# failed counter write never fails the business operation; the nightly
+# verifier (verify_rollups) recomputes from source and repairs drift.
+
+ROLLUP_RUNNING_ID = "running"
+ROLLUP_VERIFY_DAYS = 2
+
+# ---- Flows
+ROLLUP_ORDERS_CREATED = "orders_created"
+ROLLUP_ORDERS_DELIVERED = "orders_delivered"
+ROLLUP_ORDERS_RTO = "orders_rto"
+ROLLUP_ORDERS_SETTLED = "orders_settled"
+ROLLUP_REFUNDS_COMPLETED = "refunds_completed"
+
+# ---- Gauges
+ROLLUP_COD_PENDING_AMOUNT = "cod_pending_amount"
+ROLLUP_UNSETTLED_PAYOUT_AMOUNT = "unsettled_payout_amount"
+
+# Source of truth for each flow: (collection, timestamp field, extra filter)
+ROLLUP_FLOW_SOURCES = {
+    ROLLUP_ORDERS_CREATED: ("orders", "created_at", {}),
+    ROLLUP_ORDERS_DELIVERED: ("orders", "delivered_at", {"status": "delivered"}),
+    ROLLUP_ORDERS_RTO: ("orders", "rto.rto_at", {"status": "rto"}),
+    ROLLUP_ORDERS_SETTLED: ("orders", "settlement.settled_at", {"settlement.status": "settled"}),
+    ROLLUP_REFUNDS_COMPLETED: ("orders", "return.refunded_at", {"return.refund_status": "completed"}),
+}
+
+
+def rollup_day(at: datetime) -> datetime:
+    return datetime(at.year, at.month, at.day)
+
+
+def daily_rollup_id(day: datetime) -> str:
+    return f"daily:{day:%Y-%m-%d}"
+
+
+def ledger_rollup_key(entry_type: str, side: str) -> str:
+    return f"ledger.{entry_type}.{side}"
+
+
+def build_rollup_ops(at: datetime, flows: dict | None = None, gauges: dict | None = None) -> list[UpdateOne]:
+    flows = {k: v for k, v in (flows or {}).items() if v}
+    gauges = {k: v for k, v in (gauges or {}).items() if v}
+    now = datetime.utcnow()
+    ops = []
+
+    if flows or gauges:
+        ops.append(UpdateOne(
+            {"_id": ROLLUP_RUNNING_ID},
+            {"$inc": {**flows, **gauges}, "$set": {"updated_at": now}},
+            upsert=True,
+        ))
+    if flows:
+        day = rollup_day(at)
+        ops.append(UpdateOne(
+            {"_id": daily_rollup_id(day)},
+            {
+                "$inc": flows,
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"day": day},
+            },
+            upsert=True,
+        ))
+    return ops
+
+
+async def record_rollups(db, *, at: datetime | None = None, flows: dict | None = None, gauges: dict | None = None):
+    await _write_rollups(db, build_rollup_ops(at or datetime.utcnow(), flows, gauges))
+
+
+async def record_ledger_rollups(db, entries: list[dict]):
+    """
+    Per-type credit / debit flows for freshly posted ledger entries, bucketed
+    by the entries' own created_at day.
+    """
+    by_day = {}
+    for entry in entries:
+        flows = by_day.setdefault(rollup_day(entry["created_at"]), {})
+        for side in ("credit", "debit"):
+            key = ledger_rollup_key(entry["entry_type"], side)
+            flows[key] = flows.get(key, 0) + entry.get(side, 0)
+
+    ops = []
+    for day, flows in by_day.items():
+        ops.extend(build_rollup_ops(day, flows=flows))
+    await _write_rollups(db, ops)
+
+
+async def _write_rollups(db, ops: list[UpdateOne]):
+    if not ops:
+        return
+    try:
+        await db.rollups.bulk_write(ops, ordered=False)
+    except Exception:
+        # Counters must never break the write they count; the verifier repairs
+        logger.exception("ROLLUP_WRITE_ERROR")
+
+
+# ==============================
+# Read path
+# ==============================
+
+async def get_running_rollup(db) -> dict:
+    return await db.rollups.find_one({"_id": ROLLUP_RUNNING_ID}) or {}
+
+
+async def get_daily_rollups(db, since: datetime | None = None, until: datetime | None = None) -> list[dict]:
+    day_filter = {"$exists": True}
+    if since:
+        day_filter["$gte"] = rollup_day(since)
+    if until:
+        day_filter["$lt"] = until
+
+    rows = await db.rollups.find(
+        {"day": day_filter},
+        {"_id": 0, "updated_at": 0},
+    ).sort("day", 1).to_list(None)
+    return rows
+
+
+def rollup_value(row: dict, key: str):
+    for part in key.split("."):
+        if not isinstance(row, dict):
+            return 0
+        row = row.get(part)
+    return row or 0
+
+
+# ==============================
+# Verification (source recompute)
+# ==============================
+
+async def _compute_running(db) -> dict:
+    truth = {}
+    for key, (collection, _, query) in ROLLUP_FLOW_SOURCES.items():
+        truth[key] = await db[collection].count_documents(query)
+
+    cod_pending = await db.orders.aggregate([
+        {"$match": {"payment.method": "COD", "payment.status": "cod_pending"}},
+        {"$group": {"_id": None, "amount": {"$sum": "$pricing.subtotal"}}},
+    ]).to_list(1)
+    truth[ROLLUP_COD_PENDING_AMOUNT] = cod_pending[0]["amount"] if cod_pending else 0
+
+    unsettled = await db.orders.aggregate([
+        {"$match": {"status": "delivered", "settlement.status": {"$ne": "settled"}}},
+        {"$group": {"_id": None, "amount": {"$sum": "$pricing.seller_payout"}}},
+    ]).to_list(1)
+    truth[ROLLUP_UNSETTLED_PAYOUT_AMOUNT] = unsettled[0]["amount"] if unsettled else 0
+
+    async for row in db.wallet_ledger.aggregate([
+        {"$group": {"_id": "$entry_type", "credit": {"$sum": "$credit"}, "debit": {"$sum": "$debit"}}},
+    ]):
+        truth[ledger_rollup_key(row["_id"], "credit")] = row["credit"]
+        truth[ledger_rollup_key(row["_id"], "debit")] = row["debit"]
+
+    return truth
+
+
+async def _compute_day(db, day: datetime) -> dict:
+    window = {"$gte": day, "$lt": day + timedelta(days=1)}
+    truth = {}
+    for key, (collection, field, query) in ROLLUP_FLOW_SOURCES.items():
+        truth[key] = await db[collection].count_documents({**query, field: window})
+
+    async for row in db.wallet_ledger.aggregate([
+        {"$match": {"created_at": window}},
+        {"$group": {"_id": "$entry_type", "credit": {"$sum": "$credit"}, "debit": {"$sum": "$debit"}}},
+    ]):
+        truth[ledger_rollup_key(row["_id"], "credit")] = row["credit"]
+        truth[ledger_rollup_key(row["_id"], "debit")] = row["debit"]
+
+    return truth
+
+
+def _drift(row: dict, truth: dict) -> dict:
+    keys = set(truth)
+    for entry_type, sides in (row.get("ledger") or {}).items():
+        keys.update(ledger_rollup_key(entry_type, side) for side in sides)
+
+    drift = {}
+    for key in keys:
+        delta = truth.get(key, 0) - rollup_value(row, key)
+        if abs(delta) > 0.01:
+            drift[key] = delta
+    return drift
+
+
+async def verify_running_rollup(db) -> dict:
+    """
+    Recompute the running row from source and $inc it by the drift.
+    Counters that moved while the recompute ran are left for the next run,
+    so concurrent increments are never overwritten.
+    """
+    before = await get_running_rollup(db)
+    truth = await _compute_running(db)
+    after = await get_running_rollup(db)
+
+    drift = {
+        key: delta
+        for key, delta in _drift(before, truth).items()
+        if rollup_value(before, key) == rollup_value(after, key)
+    }
+    if drift:
+        await db.rollups.update_one(
+            {"_id": ROLLUP_RUNNING_ID},
+            {"$inc": drift, "$set": {"verified_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    return drift
+
+
+async def verify_daily_rollups(db, days: int = ROLLUP_VERIFY_DAYS, now: datetime | None = None) -> dict:
+    """
+    Rewrite the last `days` closed days from source (also backfills them if
+    missing). Today is still being written and is left alone.
+    """
+    today = rollup_day(now or datetime.utcnow())
+    repaired = {}
+
+    for offset in range(1, days + 1):
+        day = today - timedelta(days=offset)
+        row_id = daily_rollup_id(day)
+        row = await db.rollups.find_one({"_id": row_id}) or {}
+        truth = await _compute_day(db, day)
+
+        drift = _drift(row, truth)
+        if drift:
+            await db.rollups.update_one(
+                {"_id": row_id},
+                {
+                    "$inc": drift,
+                    "$set": {"day": day, "verified_at": datetime.utcnow()},
+                },
+                upsert=True,
+            )
+            repaired[row_id] = drift
+
+    return repaired
@@ -0,0 +1,184 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+# ==============================
+# Scheduled actions (due-time queue)
+# ==============================
+# Timed order transitions are queued here when their deadline is created,
+# instead of being found later by rescanning orders:
+#
+#   ACTION_ORDER_EXPIRY     unpaid Razorpay order, due created_at + timeout
+#   ACTION_RETURN_DEADLINE  return awaiting seller, due seller_action_deadline
+#   ACTION_RESERVE_RELEASE  settled reserve, due delivered_at + hold days
+#
+# workers/scheduled_action_dispatcher.py sleeps until the next due_at and pops
+# due items in batches. Handlers re-check order state, so an action whose
+# order has moved on (paid, seller responded, return approved) is a no-op.
+#
+# Status flow: pending -> claimed -> (deleted)
+#                            |-> pending (handler failed / claim went stale)
+#                            |-> dead    (failed SCHEDULED_ACTION_MAX_ATTEMPTS times)
+
+ACTION_ORDER_EXPIRY = "order_expiry"
+ACTION_RETURN_DEADLINE = "return_deadline"
+ACTION_RESERVE_RELEASE = "reserve_release"
+
+STATUS_PENDING = "pending"
+STATUS_CLAIMED = "claimed"
+STATUS_DEAD = "dead"
+
+CLAIM_BATCH_SIZE = 200
+CLAIM_STALE_SECONDS = 60 * 5
+RETRY_DELAY_SECONDS = 60
+RETRY_MAX_DELAY_SECONDS = 60 * 30
+SCHEDULED_ACTION_MAX_ATTEMPTS = 8
+
+# Wakes an idle dispatcher in this process when something due sooner than
+# its current sleep is queued. Other processes are covered by the idle cap.
+_scheduled_event = asyncio.Event()
+
+
+def build_scheduled_action(*, action: str, order_id, due_at: datetime) -> UpdateOne:
+    now = datetime.utcnow()
+    return UpdateOne(
+        {"action": action, "order_id": order_id},
+        {
+            "$setOnInsert": {
+                "action": action,
+                "order_id": order_id,
+                "due_at": due_at,
+                "status": STATUS_PENDING,
+                "attempts": 0,
+                "created_at": now,
+            }
+        },
+        upsert=True,
+    )
+
+
+async def schedule_action(db, *, action: str, order_id, due_at: datetime):
+    """
+    Queue one action. Idempotent per (action, order_id).
+    """
+    await schedule_actions(db, [build_scheduled_action(action=action, order_id=order_id, due_at=due_at)])
+
+
+async def schedule_actions(db, ops: list[UpdateOne]):
+    if not ops:
+        return
+    await db.scheduled_actions.bulk_write(ops, ordered=False)
+    _scheduled_event.set()
+
+
+# ==============================
+# Dispatcher side
+# ==============================
+
+async def next_due_at(db) -> datetime | None:
+    nxt = await db.scheduled_actions.find_one(
+        {"status": STATUS_PENDING},
+        {"due_at": 1},
+        sort=[("due_at", 1)],
+    )
+    return nxt["due_at"] if nxt else None
+
+
+async def claim_due_actions(db, limit: int = CLAIM_BATCH_SIZE) -> list[dict]:
+    """
+    Pop up to `limit` due actions. The conditional update_many tags the batch
+    with a claim token, so concurrent dispatchers never get the same item.
+    """
+    now = datetime.utcnow()
+
+    due_ids = [
+        a["_id"]
+        async for a in db.scheduled_actions.find(
+            {"status": STATUS_PENDING, "due_at": {"$lte": now}},
+            {"_id": 1},
+        ).sort("due_at", 1).limit(limit)
+    ]
+    if not due_ids:
+        return []
+
+    claim_token = uuid.uuid4().hex
+    await db.scheduled_actions.update_many(
+        {"_id": {"$in": due_ids}, "status": STATUS_PENDING},
+        {
+            "$set": {
+                "status": STATUS_CLAIMED,
+                "claim_token": claim_token,
+                "claimed_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+    )
+
+    return await db.scheduled_actions.find(
+        {"claim_token": claim_token},
+        {"action": 1, "order_id": 1, "attempts": 1, "claim_token": 1},
+    ).to_list(limit)
+
+
+async def complete_actions(db, action_ids: list):
+    if action_ids:
+        await db.scheduled_actions.delete_many({"_id": {"$in": action_ids}})
+
+
+async def retry_actions(db, actions: list[dict], error: str) -> int:
+    """
+    Put failed actions back with exponential backoff; ones that have used
+    up SCHEDULED_ACTION_MAX_ATTEMPTS are parked as dead for inspection.
+    Returns how many went dead.
+    """
+    now = datetime.utcnow()
+    ops = []
+    dead = 0
+
+    for action in actions:
+        attempts = action.get("attempts", 1)
+        if attempts >= SCHEDULED_ACTION_MAX_ATTEMPTS:
+            update = {"status": STATUS_DEAD, "dead_at": now}
+            dead += 1
+        else:
+            backoff = min(
+                RETRY_DELAY_SECONDS * (2 ** (attempts - 1)),
+                RETRY_MAX_DELAY_SECONDS,
+            )
+            update = {"status": STATUS_PENDING, "due_at": now + timedelta(seconds=backoff)}
+        update["last_error"] = error[:1000]
+
+        ops.append(UpdateOne(
+            {"_id": action["_id"], "claim_token": action.get("claim_token")},
+            {"$set": update, "$unset": {"claim_token": ""}},
+        ))
+
+    if ops:
+        await db.scheduled_actions.bulk_write(ops, ordered=False)
+    return dead
+
+
+async def requeue_stale_actions(db) -> int:
+    result = await db.scheduled_actions.update_many(
+        {
+            "status": STATUS_CLAIMED,
+            "claimed_at": {"$lte": datetime.utcnow() - timedelta(seconds=CLAIM_STALE_SECONDS)},
+        },
+        {
+            "$set": {"status": STATUS_PENDING},
+            "$unset": {"claim_token": ""},
+        },
+    )
+    return result.modified_count
+
+
+async def wait_for_schedule(timeout: float):
+    """
+    Sleep up to `timeout`, returning early if this process queued a new action.
+    """
+    _scheduled_event.clear()
+    try:
+        await asyncio.wait_for(_scheduled_event.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
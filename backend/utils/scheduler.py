@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# ============================================================
+# LEADER-ELECTED JOB SCHEDULER
+# ============================================================
+# Every API process runs a JobScheduler, but each job only runs where its
+# lease in scheduler_leases is held, so a periodic job runs once per interval
+# cluster-wide no matter how many uvicorn workers / pods are up.
+#
+# Lease document (one per job, _id = job name):
+#   owner         process currently running the job (None when idle)
+#   lease_until   owner must heartbeat before this or lose the lease
+#   next_run_at   earliest start of the next run, shared by all processes
+#
+# A process that dies mid-run stops heartbeating; once lease_until passes the
+# job is picked up elsewhere without waiting for next_run_at to move.
+# ============================================================
+
+LEASE_TTL_SECONDS = 60
+HEARTBEAT_SECONDS = 20
+MIN_POLL_SECONDS = 1
+MAX_POLL_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def scheduler_owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# ==============================
+# Lease primitives
+# ==============================
+
+async def acquire_job_lease(db, name: str, owner: str, now: datetime | None = None) -> dict | None:
+    """
+    Take the lease for a due job. Returns the lease doc, or None if the job
+    is not due yet or another process holds it.
+    """
+    now = now or datetime.utcnow()
+    try:
+        return await db.scheduler_leases.find_one_and_update(
+            {
+                "_id": name,
+                "next_run_at": {"$lte": now},
+                "lease_until": {"$lte": now},
+            },
+            {
+                "$set": {
+                    "owner": owner,
+                    "lease_until": now + timedelta(seconds=LEASE_TTL_SECONDS),
+                    "last_started_at": now,
+                },
+                "$setOnInsert": {"next_run_at": now},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Lease exists and is not ours to take; the upsert lost the race
+        return None
+
+
+async def renew_job_lease(db, name: str, owner: str) -> bool:
+    result = await db.scheduler_leases.update_one(
+        {"_id": name, "owner": owner},
+        {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=LEASE_TTL_SECONDS)}},
+    )
+    return result.matched_count == 1
+
+
+async def release_job_lease(
+    db,
+    name: str,
+    owner: str,
+    *,
+    next_run_at: datetime | None = None,
+    error: str | None = None,
+):
+    """
+    Give the lease back. next_run_at=None leaves the job due so another
+    process can take it immediately (used on shutdown).
+    """
+    now = datetime.utcnow()
+    update = {
+        "owner": None,
+        "lease_until": now,
+        "last_finished_at": now,
+        "last_error": error[:1000] if error else None,
+    }
+    if next_run_at:
+        update["next_run_at"] = next_run_at
+
+    await db.scheduler_leases.update_one(
+        {"_id": name, "owner": owner},
+        {"$set": update},
+    )
+
+
+def next_run_for(job: dict, started_at: datetime) -> datetime:
+    """
+    Anchored to the start of the run so a slow run does not push every later
+    run back; jitter spreads jobs that share an interval.
+    """
+    jitter = random.uniform(0, job.get("jitter_seconds", 0))
+    return started_at + timedelta(seconds=job["interval_seconds"] + jitter)
+
+
+# ==============================
+# Scheduler
+# ==============================
+
+class JobScheduler:
+    """
+    jobs: {name: {"run": async fn(db), "interval_seconds": int, "jitter_seconds": int}}
+
+    Long-running jobs (e.g. queue consumers) simply never return; the lease
+    is heartbeated for as long as they run.
+    """
+
+    def __init__(self, db, jobs: dict):
+        self.db = db
+        self.jobs = jobs
+        self.owner = scheduler_owner_id()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        for name, job in self.jobs.items():
+            self._tasks.append(asyncio.create_task(self._job_loop(name, job), name=f"job:{name}"))
+        logger.info("SCHEDULER_STARTED owner=%s jobs=%s", self.owner, len(self.jobs))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("SCHEDULER_STOPPED owner=%s", self.owner)
+
+    # --------------------------------------------------
+
+    async def _job_loop(self, name: str, job: dict):
+        # Spread the first lease attempt so N processes do not race in lockstep
+        await asyncio.sleep(random.uniform(0, MIN_POLL_SECONDS))
+
+        while True:
+            try:
+                lease = await acquire_job_lease(self.db, name, self.owner)
+                if lease:
+                    await self._run_leased(name, job, lease["last_started_at"])
+                    continue
+                await asyncio.sleep(await self._poll_delay(name))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("SCHEDULER_LOOP_ERROR job=%s", name)
+                await asyncio.sleep(MAX_POLL_SECONDS)
+
+    async def _poll_delay(self, name: str) -> float:
+        lease = await self.db.scheduler_leases.find_one(
+            {"_id": name},
+            {"next_run_at": 1, "lease_until": 1},
+        )
+        if not lease:
+            return MIN_POLL_SECONDS
+
+        wake_at = max(lease["next_run_at"], lease["lease_until"])
+        delay = (wake_at - datetime.utcnow()).total_seconds()
+        return min(max(delay, MIN_POLL_SECONDS), MAX_POLL_SECONDS)
+
+    async def _run_leased(self, name: str, job: dict, started_at: datetime):
+        lease_lost = asyncio.Event()
+        run_task = asyncio.create_task(job["run"](self.db))
+        heartbeat = asyncio.create_task(self._heartbeat(name, run_task, lease_lost))
+        error = None
+
+        try:
+            await run_task
+        except asyncio.CancelledError:
+            if not lease_lost.is_set():
+                # Shutdown: leave the job due so another process takes it straight away
+                run_task.cancel()
+                await asyncio.shield(release_job_lease(self.db, name, self.owner))
+                raise
+            logger.warning("SCHEDULER_LEASE_LOST job=%s owner=%s", name, self.owner)
+            return
+        except Exception as e:
+            logger.exception("SCHEDULER_JOB_ERROR job=%s", name)
+            error = str(e)
+        finally:
+            heartbeat.cancel()
+
+        await release_job_lease(
+            self.db,
+            name,
+            self.owner,
+            next_run_at=next_run_for(job, started_at),
+            error=error,
+        )
+
+    async def _heartbeat(self, name: str, run_task: asyncio.Task, lease_lost: asyncio.Event):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                still_owner = await renew_job_lease(self.db, name, self.owner)
+            except Exception:
+                logger.exception("SCHEDULER_HEARTBEAT_ERROR job=%s", name)
+                continue
+            if not still_owner:
+                # Another process took over after our lease expired; stop
+                # running so the job never executes twice concurrently
+                lease_lost.set()
+                run_task.cancel()
+                return
@@ -0,0 +1,107 @@
+import time
+
+from config.constants import LOW_TRUST_THRESHOLD
+
+# ==============================
+# Seller risk overview
+# ==============================
+# One $facet aggregation over sellers returns every count and the risky
+# seller list for the admin risk dashboard and the daily risk digest.
+# $match on role uses users_role_seller_status_idx; the $project keeps only
+# the fields the facets read.
+#
+# The admin dashboard result is cached in-process for
+# SELLER_RISK_CACHE_TTL_SECONDS. Seller status changes (verify, freeze,
+# unfreeze, probation end, inactivity freeze) call
+# invalidate_seller_risk_cache(); other workers see it after the TTL.
+
+SELLER_RISK_CACHE_TTL_SECONDS = 30
+RISKY_SELLERS_LIMIT = 50
+
+_RISKY_MATCH = {
+    "$or": [
+        {"seller_status": "frozen"},
+        {"seller_profile.trust.score": {"$lt": LOW_TRUST_THRESHOLD}},
+        {"seller_probation.active": True},
+    ]
+}
+
+# generation guards against a compute that started before an invalidation
+# repopulating the cache with pre-change data
+_cache = {"value": None, "expires_at": 0.0, "generation": 0}
+
+
+def invalidate_seller_risk_cache():
+    _cache["value"] = None
+    _cache["expires_at"] = 0.0
+    _cache["generation"] += 1
+
+
+def _overview_pipeline() -> list[dict]:
+    return [
+        {"$match": {"role": "seller"}},
+        {"$project": {
+            "email": 1,
+            "seller_status": 1,
+            "seller_tier": 1,
+            "seller_profile.trust": 1,
+            "seller_probation": 1,
+            "created_at": 1,
+        }},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "frozen": [{"$match": {"seller_status": "frozen"}}, {"$count": "n"}],
+            "probation": [{"$match": {"seller_probation.active": True}}, {"$count": "n"}],
+            "low_trust": [
+                {"$match": {"seller_profile.trust.score": {"$lt": LOW_TRUST_THRESHOLD}}},
+                {"$count": "n"},
+            ],
+            "risky": [
+                {"$match": _RISKY_MATCH},
+                {"$sort": {"seller_profile.trust.score": 1}},
+                {"$limit": RISKY_SELLERS_LIMIT},
+            ],
+        }},
+    ]
+
+
+def _count(facet: list[dict]) -> int:
+    return facet[0]["n"] if facet else 0
+
+
+async def compute_seller_risk_overview(db) -> dict:
+    rows = await db.users.aggregate(_overview_pipeline()).to_list(1)
+    facets = rows[0] if rows else {}
+
+    return {
+        "summary": {
+            "total_sellers": _count(facets.get("total", [])),
+            "frozen_sellers": _count(facets.get("frozen", [])),
+            "probation_sellers": _count(facets.get("probation", [])),
+            "low_trust_sellers": _count(facets.get("low_trust", [])),
+        },
+        "risky_sellers": [
+            {
+                "seller_id": str(s["_id"]),
+                "email": s.get("email"),
+                "status": s.get("seller_status"),
+                "tier": s.get("seller_tier"),
+                "trust_score": s.get("seller_profile", {}).get("trust", {}).get("score"),
+                "probation": s.get("seller_probation", {}).get("active", False),
+                "created_at": s.get("created_at"),
+            }
+            for s in facets.get("risky", [])
+        ],
+    }
+
+
+async def get_seller_risk_overview(db) -> dict:
+    if _cache["value"] is not None and time.monotonic() < _cache["expires_at"]:
+        return _cache["value"]
+
+    generation = _cache["generation"]
+    overview = await compute_seller_risk_overview(db)
+    if generation == _cache["generation"]:
+        _cache["value"] = overview
+        _cache["expires_at"] = time.monotonic() + SELLER_RISK_CACHE_TTL_SECONDS
+    return overview
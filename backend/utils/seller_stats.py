@@ -0,0 +1,117 @@
+import logging
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# ==============================
+# Seller order stats
+# ==============================
+# One seller_stats document per seller (_id = seller_id) with order counters
+# bumped by $inc on the transitions that move them:
+#
+#   total_orders      order created
+#   delivered_orders  created -> ... -> delivered
+#   cancelled_orders  created -> cancelled (payment timeout)
+#
+# utils/trust.py derives score, badges and tier from these counters instead
+# of counting the seller's order history on every trust event.
+# rebuild_seller_stats (full count) is the repair path only, so a failed
+# counter write is logged rather than failing the order transition.
+
+STAT_TOTAL_ORDERS = "total_orders"
+STAT_DELIVERED_ORDERS = "delivered_orders"
+STAT_CANCELLED_ORDERS = "cancelled_orders"
+
+SELLER_STAT_FIELDS = (STAT_TOTAL_ORDERS, STAT_DELIVERED_ORDERS, STAT_CANCELLED_ORDERS)
+
+# Order status counted by each stat (None = every order)
+SELLER_STAT_STATUSES = {
+    STAT_TOTAL_ORDERS: None,
+    STAT_DELIVERED_ORDERS: "delivered",
+    STAT_CANCELLED_ORDERS: "cancelled",
+}
+
+# apply_key history kept per seller for replay-safe increments
+SELLER_STATS_APPLIED_KEYS_MAX = 50
+
+logger = logging.getLogger(__name__)
+
+
+def build_seller_stats_op(seller_id, deltas: dict, apply_key: str | None = None) -> UpdateOne:
+    # No upsert: a seller without a stats document gets one built by a full
+    # count on first read, which already includes this transition
+    query = {"_id": seller_id}
+    update = {
+        "$inc": deltas,
+        "$set": {"updated_at": datetime.utcnow()},
+    }
+    if apply_key:
+        # Applied at most once per key, so a retried batch does not recount
+        query["applied_keys"] = {"$ne": apply_key}
+        update["$push"] = {
+            "applied_keys": {"$each": [apply_key], "$slice": -SELLER_STATS_APPLIED_KEYS_MAX},
+        }
+    return UpdateOne(query, update)
+
+
+async def inc_seller_stats(db, seller_id, deltas: dict):
+    await inc_seller_stats_bulk(db, {seller_id: deltas})
+
+
+async def inc_seller_stats_bulk(db, per_seller: dict, apply_key: str | None = None):
+    """
+    per_seller: {seller_id: {stat: delta}}; one round trip for all sellers.
+    """
+    ops = [
+        build_seller_stats_op(sid, deltas, apply_key)
+        for sid, deltas in per_seller.items()
+        if deltas
+    ]
+    if not ops:
+        return
+    try:
+        await db.seller_stats.bulk_write(ops, ordered=False)
+    except Exception:
+        logger.exception("SELLER_STATS_WRITE_ERROR sellers=%s", len(ops))
+
+
+def stats_from_status_counts(counts: dict) -> dict:
+    """
+    {order status: count} -> seller stat counters.
+    """
+    return {
+        stat: sum(counts.values()) if status is None else counts.get(status, 0)
+        for stat, status in SELLER_STAT_STATUSES.items()
+    }
+
+
+async def get_seller_stats(db, seller_id) -> dict:
+    stats = await db.seller_stats.find_one({"_id": seller_id})
+    if stats:
+        return stats
+    return await rebuild_seller_stats(db, seller_id)
+
+
+async def rebuild_seller_stats(db, seller_id) -> dict:
+    """
+    Count the seller's orders by status and overwrite the counters.
+    Repair / first-use path only.
+    """
+    counts = {
+        row["_id"]: row["count"]
+        async for row in db.orders.aggregate([
+            {"$match": {"seller_id": seller_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ])
+    }
+    stats = {
+        **stats_from_status_counts(counts),
+        "rebuilt_at": datetime.utcnow(),
+    }
+    try:
+        # $set rather than replace: applied_keys must survive the rebuild
+        await db.seller_stats.update_one({"_id": seller_id}, {"$set": stats}, upsert=True)
+    except DuplicateKeyError:
+        # Concurrent first-use upsert; the other writer's copy is as good
+        return await db.seller_stats.find_one({"_id": seller_id})
+    return {"_id": seller_id, **stats}
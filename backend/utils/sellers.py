@@ -1,3 +1,5 @@
+from bson import ObjectId
+from fastapi import HTTPException
 from database import get_db
 
 async def get_verified_seller(db, seller_id):
@@ -7,3 +9,77 @@ async def get_verified_seller(db, seller_id):
         "seller_status": "verified",
         "is_frozen": False
     })
+
+
+# ---------------------------
+# Seller leaderboard
+# ---------------------------
+# Public, verified, unfrozen sellers by trust score. Every query uses the
+# equality prefix + sort of users_seller_leaderboard_idx, so pages and top-k
+# lists are index walks with no in-memory sort.
+
+LEADERBOARD_PAGE_MAX = 100
+TOP_BRANDS_MAX = 50
+
+LEADERBOARD_QUERY = {
+    "role": "seller",
+    "seller_status": "verified",
+    "is_frozen": False,
+}
+LEADERBOARD_SORT = [("seller_profile.trust.score", -1), ("_id", -1)]
+
+
+def _trust_score(seller: dict):
+    return seller.get("seller_profile", {}).get("trust", {}).get("score", 0)
+
+
+def encode_leaderboard_cursor(seller: dict) -> str:
+    return f"{_trust_score(seller)}_{seller['_id']}"
+
+
+def decode_leaderboard_cursor(cursor: str):
+    try:
+        score, oid = cursor.rsplit("_", 1)
+        score = float(score)
+        return (int(score) if score.is_integer() else score), ObjectId(oid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def get_leaderboard_page(db, projection: dict, *, cursor: str | None = None, limit: int = 50) -> dict:
+    """
+    One keyset page of the leaderboard (score desc, _id desc).
+    projection must include seller_profile.trust (the cursor key).
+    """
+    query = dict(LEADERBOARD_QUERY)
+    if cursor:
+        score, oid = decode_leaderboard_cursor(cursor)
+        query["$or"] = [
+            {"seller_profile.trust.score": {"$lt": score}},
+            {"seller_profile.trust.score": score, "_id": {"$lt": oid}},
+        ]
+
+    sellers = await (
+        db.users
+        .find(query, projection)
+        .sort(LEADERBOARD_SORT)
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+
+    has_more = len(sellers) > limit
+    sellers = sellers[:limit]
+    return {
+        "sellers": sellers,
+        "next_cursor": encode_leaderboard_cursor(sellers[-1]) if has_more else None,
+    }
+
+
+async def get_top_sellers(db, projection: dict, limit: int) -> list[dict]:
+    return await (
+        db.users
+        .find(LEADERBOARD_QUERY, projection)
+        .sort(LEADERBOARD_SORT)
+        .limit(limit)
+        .to_list(limit)
+    )
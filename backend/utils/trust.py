@@ -1,7 +1,25 @@
+import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
+from pymongo import ReturnDocument
 
 from utils.audit import log_audit
+from utils.seller_risk import invalidate_seller_risk_cache
+from utils.seller_stats import (
+    get_seller_stats,
+    rebuild_seller_stats,
+    STAT_TOTAL_ORDERS,
+    STAT_DELIVERED_ORDERS,
+    STAT_CANCELLED_ORDERS,
+)
+from utils.trust_events import (
+    enqueue_trust_event,
+    claim_trust_batches,
+    complete_trust_batch,
+    requeue_trust_batch,
+)
+
+logger = logging.getLogger(__name__)
 
 # ============================================================
 # TRUST ENGINE — Brandcart (Authoritative Policy Layer)
@@ -108,28 +126,13 @@ def determine_seller_tier(trust: Dict[str, Any]) -> str:
 
 
 # ============================================================
-# STEP 15D — FULL TRUST RECOMPUTATION (SAFE REPAIR ENGINE)
+# STEP 15D — TRUST FROM SELLER STATS (PURE FUNCTION)
 # ============================================================
 
-async def compute_seller_trust(db, seller: dict) -> Dict[str, Any]:
-    seller_id = seller["_id"]
-
-    # -------------------------
-    # ORDER STATS
-    # -------------------------
-    total_orders = await db.orders.count_documents({
-        "seller_id": seller_id
-    })
-
-    delivered_orders = await db.orders.count_documents({
-        "seller_id": seller_id,
-        "status": "delivered"
-    })
-
-    cancelled_orders = await db.orders.count_documents({
-        "seller_id": seller_id,
-        "status": "cancelled"
-    })
+def trust_from_stats(seller: dict, stats: dict) -> Dict[str, Any]:
+    total_orders = stats.get(STAT_TOTAL_ORDERS, 0)
+    delivered_orders = stats.get(STAT_DELIVERED_ORDERS, 0)
+    cancelled_orders = stats.get(STAT_CANCELLED_ORDERS, 0)
 
     cancellation_rate = (
         cancelled_orders / total_orders
@@ -167,32 +170,59 @@ async def compute_seller_trust(db, seller: dict) -> Dict[str, Any]:
         "cancelled_orders": cancelled_orders,
         "cancellation_rate": round(cancellation_rate, 3),
     }
+    trust_snapshot["tier"] = determine_seller_tier(trust_snapshot)
+    return trust_snapshot
 
-    new_tier = determine_seller_tier(trust_snapshot)
 
-    await db.users.update_one(
-        {"_id": seller_id},
-        {
-            "$set": {
-                "seller_profile.trust": {
-                    "score": score,
-                    "badges": badges,
-                    "last_computed_at": datetime.utcnow(),
-                },
-                "seller_tier": new_tier,
-                "settlement_hours": SELLER_TIER_CONFIG[new_tier]["settlement_hours"],
-                "commission_percent": SELLER_TIER_CONFIG[new_tier]["commission_percent"],
-                "updated_at": datetime.utcnow(),
-            }
+def build_trust_update(trust_snapshot: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    tier = trust_snapshot["tier"]
+    return {
+        "$set": {
+            "seller_profile.trust": {
+                "score": trust_snapshot["score"],
+                "badges": trust_snapshot["badges"],
+                "last_computed_at": now,
+            },
+            "seller_tier": tier,
+            "settlement_hours": SELLER_TIER_CONFIG[tier]["settlement_hours"],
+            "commission_percent": SELLER_TIER_CONFIG[tier]["commission_percent"],
+            "updated_at": now,
         }
+    }
+
+
+# ============================================================
+# STEP 15D.1 — TRUST RECOMPUTATION (COUNTER READ)
+# ============================================================
+
+async def compute_seller_trust(db, seller: dict, stats: Optional[dict] = None) -> Dict[str, Any]:
+    """
+    Score / badges / tier from the seller_stats counters: one read, one write.
+    """
+    if stats is None:
+        stats = await get_seller_stats(db, seller["_id"])
+
+    trust_snapshot = trust_from_stats(seller, stats)
+
+    await db.users.update_one(
+        {"_id": seller["_id"]},
+        build_trust_update(trust_snapshot, datetime.utcnow()),
     )
 
-    trust_snapshot["tier"] = new_tier
     return trust_snapshot
 
 
+async def recompute_seller_trust(db, seller: dict) -> Dict[str, Any]:
+    """
+    Repair path: recount the seller's orders into seller_stats, then derive
+    trust from the fresh counters.
+    """
+    stats = await rebuild_seller_stats(db, seller["_id"])
+    return await compute_seller_trust(db, seller, stats)
+
+
 # ============================================================
-# STEP 15E — APPLY TRUST EVENT (REAL-TIME)
+# STEP 15E — APPLY TRUST EVENT (COALESCED)
 # ============================================================
 
 async def apply_trust_event(
@@ -202,26 +232,44 @@ async def apply_trust_event(
     event: str,
     extra_updates: Optional[Dict[str, Any]] = None
 ):
-    delta = trust_delta_for_event(event)
+    """
+    Queue a trust event. Events for a seller are coalesced and applied by
+    the trust event flusher within TRUST_EVENT_WINDOW_SECONDS.
+    """
+    await enqueue_trust_event(
+        db,
+        seller_id=seller_id,
+        event=event,
+        delta=trust_delta_for_event(event),
+        extra_updates=extra_updates,
+    )
 
-    update = {
-        "$inc": {
-            "seller_profile.trust.score": delta
-        },
-        "$set": {
-            "seller_profile.trust.last_updated": datetime.utcnow()
-        }
-    }
 
-    if extra_updates:
-        update["$set"].update(extra_updates)
+async def apply_trust_batch(db, batch: dict) -> Optional[Dict[str, Any]]:
+    """
+    Apply one coalesced batch: queued updates in one write, one recompute,
+    one audit record. The summed delta is audit-only; the recompute derives
+    the score from seller_stats and overwrites seller_profile.trust.
+    """
+    seller_id = batch["seller_id"]
+    delta = batch.get("delta", 0)
+
+    extra = {}
+    for extra_updates in batch.get("updates", []):
+        extra.update(extra_updates)
 
-    await db.users.update_one(
-        {"_id": seller_id},
-        update
-    )
+    if extra:
+        seller = await db.users.find_one_and_update(
+            {"_id": seller_id},
+            {"$set": extra},
+            projection={"seller_status": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+    else:
+        seller = await db.users.find_one({"_id": seller_id}, {"seller_status": 1})
+    if not seller:
+        return None
 
-    seller = await db.users.find_one({"_id": seller_id})
     trust_data = await compute_seller_trust(db, seller)
 
     await log_audit(
@@ -231,11 +279,40 @@ async def apply_trust_event(
         action="TRUST_EVENT_APPLIED",
         metadata={
             "seller_id": str(seller_id),
-            "event": event,
+            "events": [e["event"] for e in batch.get("events", [])],
+            "event_count": batch.get("event_count", 0),
             "delta": delta,
             "new_tier": trust_data["tier"],
         }
     )
+    return trust_data
+
+
+async def apply_trust_batches(db, batches: list[dict]) -> int:
+    applied = 0
+    for batch in batches:
+        try:
+            await apply_trust_batch(db, batch)
+        except Exception:
+            logger.exception("TRUST_BATCH_ERROR seller=%s", batch["seller_id"])
+            await requeue_trust_batch(db, batch)
+            continue
+        await complete_trust_batch(db, batch)
+        applied += 1
+    return applied
+
+
+async def flush_trust_events(db, seller_id=None) -> int:
+    """
+    Apply every pending batch now, due or not (one seller, or all).
+    For tests and admin tooling; production flushing is the flusher job.
+    """
+    applied = 0
+    while True:
+        batches = await claim_trust_batches(db, seller_id=seller_id)
+        if not batches:
+            return applied
+        applied += await apply_trust_batches(db, batches)
 
 
 # ============================================================
@@ -278,6 +355,7 @@ async def enforce_trust_freeze(db, seller_id):
                 }
             }
         )
+        invalidate_seller_risk_cache()
 
         await log_audit(
             db=db,
@@ -0,0 +1,167 @@
+import uuid
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+# ==============================
+# Trust event queue (per-seller coalescing)
+# ==============================
+# apply_trust_event only enqueues. Events for a seller accumulate in a single
+# pending batch document until TRUST_EVENT_WINDOW_SECONDS after the first
+# one, then workers/trust_event_flusher.py applies the summed delta and runs
+# the trust recompute once for the whole batch:
+#
+#   { seller_id, status, delta, event_count, events[], updates[], due_at }
+#
+# A partial unique index keeps at most one pending batch per seller. Once a
+# batch is claimed, new events open the next pending batch, so nothing is
+# added to a batch while it is being applied.
+#
+# Status flow: pending -> claimed -> (deleted)
+#                            |-> folded into the next pending batch (failure)
+
+STATUS_PENDING = "pending"
+STATUS_CLAIMED = "claimed"
+
+TRUST_EVENT_WINDOW_SECONDS = 30
+TRUST_EVENT_LOG_MAX = 100  # events kept per batch for the audit record
+CLAIM_BATCH_SIZE = 200
+CLAIM_STALE_SECONDS = 60 * 5
+RETRY_DELAY_SECONDS = 60
+
+
+def _queue_update(
+    *,
+    seller_id,
+    delta: int,
+    event_count: int,
+    events: list[dict],
+    updates: list[dict],
+    due_at: datetime,
+    now: datetime,
+) -> dict:
+    update = {
+        "$inc": {"delta": delta, "event_count": event_count},
+        "$push": {"events": {"$each": events, "$slice": -TRUST_EVENT_LOG_MAX}},
+        "$setOnInsert": {
+            "seller_id": seller_id,
+            "status": STATUS_PENDING,
+            "due_at": due_at,
+            "created_at": now,
+        },
+    }
+    if updates:
+        update["$push"]["updates"] = {"$each": updates}
+    return update
+
+
+async def _upsert_pending(db, seller_id, update: dict):
+    for attempt in range(2):
+        try:
+            await db.trust_event_queue.update_one(
+                {"seller_id": seller_id, "status": STATUS_PENDING},
+                update,
+                upsert=True,
+            )
+            return
+        except DuplicateKeyError:
+            # Lost the race to open the pending batch; retry lands in it
+            if attempt:
+                raise
+
+
+async def enqueue_trust_event(db, *, seller_id, event: str, delta: int, extra_updates: dict | None = None):
+    now = datetime.utcnow()
+    await _upsert_pending(db, seller_id, _queue_update(
+        seller_id=seller_id,
+        delta=delta,
+        event_count=1,
+        events=[{"event": event, "delta": delta, "at": now}],
+        updates=[extra_updates] if extra_updates else [],
+        due_at=now + timedelta(seconds=TRUST_EVENT_WINDOW_SECONDS),
+        now=now,
+    ))
+
+
+# ==============================
+# Flusher side
+# ==============================
+
+async def next_trust_batch_due_at(db) -> datetime | None:
+    nxt = await db.trust_event_queue.find_one(
+        {"status": STATUS_PENDING},
+        {"due_at": 1},
+        sort=[("due_at", 1)],
+    )
+    return nxt["due_at"] if nxt else None
+
+
+async def claim_trust_batches(
+    db,
+    *,
+    due_before: datetime | None = None,
+    seller_id=None,
+    limit: int = CLAIM_BATCH_SIZE,
+) -> list[dict]:
+    """
+    Claim pending batches (due ones, or all with due_before=None) and return
+    them oldest first, so each seller's batches apply in the order opened.
+    """
+    query = {"status": STATUS_PENDING}
+    if due_before:
+        query["due_at"] = {"$lte": due_before}
+    if seller_id:
+        query["seller_id"] = seller_id
+
+    ids = [
+        b["_id"]
+        async for b in db.trust_event_queue.find(query, {"_id": 1}).sort("due_at", 1).limit(limit)
+    ]
+    if not ids:
+        return []
+
+    claim_token = uuid.uuid4().hex
+    await db.trust_event_queue.update_many(
+        {"_id": {"$in": ids}, "status": STATUS_PENDING},
+        {"$set": {"status": STATUS_CLAIMED, "claim_token": claim_token, "claimed_at": datetime.utcnow()}},
+    )
+
+    return await (
+        db.trust_event_queue
+        .find({"claim_token": claim_token})
+        .sort("created_at", 1)
+        .to_list(limit)
+    )
+
+
+async def complete_trust_batch(db, batch: dict):
+    await db.trust_event_queue.delete_one({"_id": batch["_id"], "claim_token": batch["claim_token"]})
+
+
+async def requeue_trust_batch(db, batch: dict):
+    """
+    Fold a claimed batch back into the seller's pending batch (creating it
+    if needed). A pending batch may already exist, so the claimed document
+    cannot simply flip back to pending.
+    """
+    now = datetime.utcnow()
+    await _upsert_pending(db, batch["seller_id"], _queue_update(
+        seller_id=batch["seller_id"],
+        delta=batch.get("delta", 0),
+        event_count=batch.get("event_count", 0),
+        events=batch.get("events", []),
+        updates=batch.get("updates", []),
+        due_at=now + timedelta(seconds=RETRY_DELAY_SECONDS),
+        now=now,
+    ))
+    await complete_trust_batch(db, batch)
+
+
+async def requeue_stale_trust_batches(db) -> int:
+    stale = await db.trust_event_queue.find({
+        "status": STATUS_CLAIMED,
+        "claimed_at": {"$lte": datetime.utcnow() - timedelta(seconds=CLAIM_STALE_SECONDS)},
+    }).sort("created_at", 1).to_list(CLAIM_BATCH_SIZE)
+
+    for batch in stale:
+        await requeue_trust_batch(db, batch)
+    return len(stale)
@@ -0,0 +1,293 @@
+import logging
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from utils.trust import SELLER_TIER_CONFIG, trust_from_stats, build_trust_update
+from utils.seller_stats import SELLER_STAT_FIELDS, SELLER_STAT_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Fleet-wide trust recompute
+# ==============================
+# For policy changes (SELLER_TIER_CONFIG, scoring rules) and the nightly
+# repair. Cost is one $group over orders plus one pass over sellers, both
+# sorted by seller id and merge-joined, instead of per-seller counts:
+#
+#   orders  --$group(seller_id)-->  stats  \
+#                                           merge -> trust_from_stats -> bulk_write
+#   users (role=seller, by _id)    ------- /
+#
+# Writes go out in RECOMPUTE_CHUNK_SIZE bulk_writes and only for sellers
+# whose trust or stats actually changed. dry_run computes the same diff and
+# writes nothing. Progress is kept on the trust_recompute_runs document.
+#
+# seller_stats is merge-joined too and corrected by $inc of the difference,
+# not $set, so an inc_seller_stats landing after the stored row was read is
+# kept. One landing between the $group reading that seller's orders and the
+# stored row being read is still undone; the next run corrects it.
+#
+# Only one live (non dry-run) run, admin or nightly, may be active: live runs
+# carry live_lock, unique while set and unset when the run finishes. Runs
+# heartbeat updated_at on every chunk; one silent for
+# RECOMPUTE_RUN_STALE_SECONDS (crashed process) is marked failed, releasing
+# the lock, and stops at its next chunk if it was only slow.
+
+RECOMPUTE_CHUNK_SIZE = 1000
+RECOMPUTE_SAMPLE_DIFFS = 200
+RECOMPUTE_RUN_STALE_SECONDS = 60 * 30
+
+ACTIVE_RUN_STATUSES = ["queued", "running"]
+FINISHED_RUN_STATUSES = ("done", "failed")
+
+RECOMPUTE_SELLER_PROJECTION = {
+    "seller_status": 1,
+    "seller_tier": 1,
+    "commission_percent": 1,
+    "settlement_hours": 1,
+    "seller_profile.trust.score": 1,
+    "seller_profile.trust.badges": 1,
+}
+
+
+def _stats_pipeline() -> list[dict]:
+    group = {"_id": "$seller_id"}
+    for stat, status in SELLER_STAT_STATUSES.items():
+        group[stat] = {"$sum": 1} if status is None else {
+            "$sum": {"$cond": [{"$eq": ["$status", status]}, 1, 0]}
+        }
+    return [
+        {"$match": {"seller_id": {"$type": "objectId"}}},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def trust_diff(seller: dict, trust_snapshot: dict) -> dict:
+    """
+    {field: {"from": old, "to": new}} for every stored trust field that
+    the recompute would change.
+    """
+    trust = seller.get("seller_profile", {}).get("trust", {})
+    tier = trust_snapshot["tier"]
+    current = {
+        "score": trust.get("score"),
+        "badges": trust.get("badges"),
+        "tier": seller.get("seller_tier"),
+        "commission_percent": seller.get("commission_percent"),
+        "settlement_hours": seller.get("settlement_hours"),
+    }
+    target = {
+        "score": trust_snapshot["score"],
+        "badges": trust_snapshot["badges"],
+        "tier": tier,
+        "commission_percent": SELLER_TIER_CONFIG[tier]["commission_percent"],
+        "settlement_hours": SELLER_TIER_CONFIG[tier]["settlement_hours"],
+    }
+    return {
+        field: {"from": current[field], "to": target[field]}
+        for field in target
+        if current[field] != target[field]
+    }
+
+
+async def _iterate(cursor):
+    async for doc in cursor:
+        yield doc
+
+
+async def _update_run(db, run_id, fields: dict) -> bool:
+    """
+    Every write doubles as the heartbeat checked by create_trust_recompute_run.
+    Only applies while the run is still active; False once it has finished
+    or been marked stale. Finishing releases the live lock.
+    """
+    if run_id is None:
+        return True
+    update = {"$set": {**fields, "updated_at": datetime.utcnow()}}
+    if fields.get("status") in FINISHED_RUN_STATUSES:
+        update["$unset"] = {"live_lock": ""}
+    result = await db.trust_recompute_runs.update_one(
+        {"_id": run_id, "status": {"$in": ACTIVE_RUN_STATUSES}},
+        update,
+    )
+    return result.matched_count == 1
+
+
+def _stats_delta(stored: dict | None, stats: dict) -> dict:
+    """
+    $inc that moves the stored counters to stats; every field when the
+    seller has no seller_stats row yet, so the upsert creates all of them.
+    """
+    if stored is None:
+        return dict(stats)
+    return {
+        field: stats[field] - stored.get(field, 0)
+        for field in SELLER_STAT_FIELDS
+        if stats[field] != stored.get(field, 0)
+    }
+
+
+async def recompute_all_seller_trust(db, *, dry_run: bool = False, run_id=None) -> dict:
+    """
+    Recompute seller_stats and trust for every seller. Returns a summary;
+    with run_id, progress and the final summary are also written to that
+    trust_recompute_runs document after every chunk.
+    """
+    now = datetime.utcnow()
+    summary = {
+        "dry_run": dry_run,
+        "sellers_total": await db.users.count_documents({"role": "seller"}),
+        "sellers_processed": 0,
+        "changed": 0,
+        "tier_changes": {},
+        "sample_diffs": [],
+    }
+    await _update_run(db, run_id, {"status": "running", "started_at": now, **summary})
+
+    user_ops, stats_ops = [], []
+
+    async def flush():
+        alive = await _update_run(db, run_id, {
+            "sellers_processed": summary["sellers_processed"],
+            "changed": summary["changed"],
+            "tier_changes": summary["tier_changes"],
+        })
+        if not alive:
+            # Marked stale while slow: another live run may own the lock now
+            raise RuntimeError("Trust recompute run is no longer active")
+        if not dry_run:
+            if user_ops:
+                await db.users.bulk_write(user_ops, ordered=False)
+            if stats_ops:
+                await db.seller_stats.bulk_write(stats_ops, ordered=False)
+        user_ops.clear()
+        stats_ops.clear()
+        logger.info(
+            "TRUST_RECOMPUTE_PROGRESS processed=%s/%s changed=%s dry_run=%s",
+            summary["sellers_processed"], summary["sellers_total"], summary["changed"], dry_run,
+        )
+
+    groups = _iterate(db.orders.aggregate(_stats_pipeline(), allowDiskUse=True))
+    pending = await anext(groups, None)
+
+    stored_rows = _iterate(
+        db.seller_stats
+        .find({}, {field: 1 for field in SELLER_STAT_FIELDS})
+        .sort("_id", 1)
+        .batch_size(RECOMPUTE_CHUNK_SIZE)
+    )
+    stored = await anext(stored_rows, None)
+
+    sellers = (
+        db.users
+        .find({"role": "seller"}, RECOMPUTE_SELLER_PROJECTION)
+        .sort("_id", 1)
+        .batch_size(RECOMPUTE_CHUNK_SIZE)
+    )
+    async for seller in sellers:
+        # Orders of non-seller ids (deleted / converted users) are skipped
+        while pending and pending["_id"] < seller["_id"]:
+            pending = await anext(groups, None)
+
+        stats = {field: 0 for field in SELLER_STAT_FIELDS}
+        if pending and pending["_id"] == seller["_id"]:
+            stats.update({field: pending[field] for field in SELLER_STAT_FIELDS})
+            pending = await anext(groups, None)
+
+        while stored and stored["_id"] < seller["_id"]:
+            stored = await anext(stored_rows, None)
+        current = None
+        if stored and stored["_id"] == seller["_id"]:
+            current = stored
+            stored = await anext(stored_rows, None)
+
+        trust_snapshot = trust_from_stats(seller, stats)
+        diff = trust_diff(seller, trust_snapshot)
+
+        delta = _stats_delta(current, stats)
+        if delta:
+            stats_ops.append(UpdateOne(
+                {"_id": seller["_id"]},
+                {"$inc": delta, "$set": {"rebuilt_at": now}},
+                upsert=True,
+            ))
+        if diff:
+            summary["changed"] += 1
+            user_ops.append(UpdateOne({"_id": seller["_id"]}, build_trust_update(trust_snapshot, now)))
+            if "tier" in diff:
+                key = f"{diff['tier']['from']}->{diff['tier']['to']}"
+                summary["tier_changes"][key] = summary["tier_changes"].get(key, 0) + 1
+            if len(summary["sample_diffs"]) < RECOMPUTE_SAMPLE_DIFFS:
+                summary["sample_diffs"].append({"seller_id": str(seller["_id"]), "diff": diff})
+
+        summary["sellers_processed"] += 1
+        if summary["sellers_processed"] % RECOMPUTE_CHUNK_SIZE == 0:
+            await flush()
+
+    await flush()
+
+    summary["finished_at"] = datetime.utcnow()
+    await _update_run(db, run_id, {
+        "status": "done",
+        "finished_at": summary["finished_at"],
+        "sample_diffs": summary["sample_diffs"],
+    })
+    return summary
+
+
+async def create_trust_recompute_run(db, *, dry_run: bool, requested_by: str):
+    """
+    Register a run; progress is written to it by run_trust_recompute.
+    Only one non-dry run may be active at a time; returns None if one is.
+    """
+    now = datetime.utcnow()
+    run = {
+        "status": "queued",
+        "dry_run": dry_run,
+        "requested_by": requested_by,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if not dry_run:
+        stale = await db.trust_recompute_runs.update_many(
+            {
+                "status": {"$in": ACTIVE_RUN_STATUSES},
+                "$or": [
+                    {"updated_at": {"$lt": now - timedelta(seconds=RECOMPUTE_RUN_STALE_SECONDS)}},
+                    {"updated_at": {"$exists": False}},
+                ],
+            },
+            {
+                "$set": {"status": "failed", "error": "stale: no heartbeat", "finished_at": now},
+                "$unset": {"live_lock": ""},
+            },
+        )
+        if stale.modified_count:
+            logger.warning("TRUST_RECOMPUTE_STALE_RUNS failed=%s", stale.modified_count)
+
+        # Unique (trust_recompute_runs_live_lock_unique) while the run is active
+        run["live_lock"] = True
+
+    try:
+        result = await db.trust_recompute_runs.insert_one(run)
+    except DuplicateKeyError:
+        return None
+    return result.inserted_id
+
+
+async def run_trust_recompute(db, run_id, *, dry_run: bool) -> dict | None:
+    """
+    Returns the summary, or None if the run failed (recorded on the run).
+    """
+    try:
+        return await recompute_all_seller_trust(db, dry_run=dry_run, run_id=run_id)
+    except Exception as e:
+        logger.exception("TRUST_RECOMPUTE_ERROR run=%s", run_id)
+        await _update_run(db, run_id, {
+            "status": "failed",
+            "error": str(e)[:1000],
+            "finished_at": datetime.utcnow(),
+        })
+        return None
@@ -0,0 +1,328 @@
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+# ==============================
+# Wallet balance snapshots
+# ==============================
+# One wallet_balances document per seller (_id = seller_id), kept in step
+# with wallet_ledger by $inc on every ledger write:
+#
+#   balance / credit / debit   running totals
+#   totals.<ENTRY_TYPE>        running credit - debit per entry type
+#   entry_count                ledger rows applied
+#   last_entry_at / _id        ledger high-water mark
+#   checkpoint                 ledger-derived totals up to checkpoint.at,
+#                              advanced by verify_wallet_balance
+#   recent                     newest WALLET_RECENT_ENTRIES ledger rows, so
+#                              the wallet dashboard is one read
+#
+# The ledger stays the source of truth. The verifier only sums entries newer
+# than the checkpoint, so verification cost tracks recent activity, not
+# seller age.
+#
+# Snapshots are only ever created by an upsert from zero and then $inc'ed,
+# never by summing the ledger, so a ledger write racing the creation cannot
+# be counted twice. Entries posted through post_ledger_batch carry
+# in_snapshot=True and always reach the snapshot by $inc. Older ledger
+# history (in_snapshot unset) is folded in once by backfill_wallet_balance,
+# guarded on backfilled=False.
+
+WALLET_VERIFY_LAG_SECONDS = 60 * 5  # writes older than this are assumed landed
+BALANCE_TOLERANCE = 0.01
+WALLET_RECENT_ENTRIES = 50
+RECENT_SORT = {"created_at": -1, "_id": -1}
+
+_EMPTY_CHECKPOINT = {
+    "at": datetime.min,
+    "balance": 0,
+    "credit": 0,
+    "debit": 0,
+    "entry_count": 0,
+    "totals": {},
+}
+
+
+def _group_entries(entries: list[dict]) -> dict:
+    grouped = {}
+    for entry in entries:
+        delta = grouped.setdefault(entry["seller_id"], {
+            "credit": 0,
+            "debit": 0,
+            "entry_count": 0,
+            "totals": {},
+            "entries": [],
+            "last_entry_at": entry["created_at"],
+            "last_entry_id": entry.get("_id"),
+        })
+        credit = entry.get("credit", 0)
+        debit = entry.get("debit", 0)
+        delta["credit"] += credit
+        delta["debit"] += debit
+        delta["entry_count"] += 1
+        delta["entries"].append(entry)
+        delta["totals"][entry["entry_type"]] = delta["totals"].get(entry["entry_type"], 0) + credit - debit
+        if entry["created_at"] >= delta["last_entry_at"]:
+            delta["last_entry_at"] = entry["created_at"]
+            delta["last_entry_id"] = entry.get("_id")
+    return grouped
+
+
+# ==============================
+# Write path
+# ==============================
+
+def _snapshot_update(delta: dict, now: datetime) -> dict:
+    inc = {
+        "balance": delta["credit"] - delta["debit"],
+        "credit": delta["credit"],
+        "debit": delta["debit"],
+        "entry_count": delta["entry_count"],
+    }
+    for entry_type, amount in delta["totals"].items():
+        inc[f"totals.{entry_type}"] = amount
+
+    update = {
+        "$inc": inc,
+        "$set": {"updated_at": now},
+        "$setOnInsert": {"backfilled": False, "created_at": now},
+    }
+    if delta["entry_count"]:
+        update["$max"] = {
+            "last_entry_at": delta["last_entry_at"],
+            "last_entry_id": delta["last_entry_id"],
+        }
+        update["$push"] = {
+            "recent": {
+                "$each": delta["entries"],
+                "$sort": RECENT_SORT,
+                "$slice": WALLET_RECENT_ENTRIES,
+            }
+        }
+    return update
+
+
+async def _upsert_snapshot(db, seller_id, update: dict, session=None):
+    for attempt in range(2):
+        try:
+            return await db.wallet_balances.update_one(
+                {"_id": seller_id}, update, upsert=True, session=session,
+            )
+        except DuplicateKeyError:
+            # Lost the race to create it; the retry $incs the winner's doc
+            if attempt:
+                raise
+
+
+async def apply_wallet_balances(db, entries: list[dict], session=None):
+    """
+    Fold freshly inserted ledger entries into their sellers' snapshots
+    (one upsert per seller). A newly created snapshot then gets the
+    seller's older ledger history backfilled.
+    """
+    now = datetime.utcnow()
+
+    for seller_id, delta in _group_entries(entries).items():
+        result = await _upsert_snapshot(db, seller_id, _snapshot_update(delta, now), session=session)
+        if result.upserted_id is not None:
+            await backfill_wallet_balance(db, seller_id, session=session)
+
+
+# ==============================
+# Read path
+# ==============================
+
+_NO_ENTRIES = {"credit": 0, "debit": 0, "entry_count": 0, "totals": {}, "entries": []}
+
+
+async def get_wallet_snapshot(db, seller_id) -> dict:
+    snapshot = await db.wallet_balances.find_one({"_id": seller_id})
+    if snapshot and snapshot.get("backfilled", True):
+        return snapshot
+
+    if not snapshot:
+        await _upsert_snapshot(db, seller_id, _snapshot_update(_NO_ENTRIES, datetime.utcnow()))
+    await backfill_wallet_balance(db, seller_id)
+    return await db.wallet_balances.find_one({"_id": seller_id})
+
+
+# ==============================
+# Rebuild / verify
+# ==============================
+
+async def _sum_ledger(
+    db,
+    seller_id,
+    *,
+    after: datetime | None = None,
+    split_at: datetime | None = None,
+    untracked_only: bool = False,
+    session=None,
+) -> dict:
+    """
+    Ledger totals for a seller, optionally only entries after `after`.
+    With split_at, entries newer than split_at are summed separately under
+    "recent" so callers can ignore writes that may still be in flight.
+    """
+    match = {"seller_id": seller_id}
+    if after:
+        match["created_at"] = {"$gt": after}
+    if untracked_only:
+        match["in_snapshot"] = {"$ne": True}
+
+    rows = await db.wallet_ledger.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "entry_type": "$entry_type",
+                "recent": {"$gt": ["$created_at", split_at]} if split_at else False,
+            },
+            "credit": {"$sum": "$credit"},
+            "debit": {"$sum": "$debit"},
+            "count": {"$sum": 1},
+            "last_entry_at": {"$max": "$created_at"},
+            "last_entry_id": {"$max": "$_id"},
+        }},
+    ], session=session).to_list(None)
+
+    sums = {
+        "settled": {"credit": 0, "debit": 0, "entry_count": 0, "totals": {}, "last_entry_at": None, "last_entry_id": None},
+        "recent": {"credit": 0, "debit": 0, "entry_count": 0, "totals": {}, "last_entry_at": None, "last_entry_id": None},
+    }
+    for row in rows:
+        bucket = sums["recent" if row["_id"]["recent"] else "settled"]
+        entry_type = row["_id"]["entry_type"]
+        bucket["credit"] += row["credit"]
+        bucket["debit"] += row["debit"]
+        bucket["entry_count"] += row["count"]
+        bucket["totals"][entry_type] = bucket["totals"].get(entry_type, 0) + row["credit"] - row["debit"]
+        if bucket["last_entry_at"] is None or row["last_entry_at"] > bucket["last_entry_at"]:
+            bucket["last_entry_at"] = row["last_entry_at"]
+            bucket["last_entry_id"] = row["last_entry_id"]
+    return sums
+
+
+async def backfill_wallet_balance(db, seller_id, session=None) -> bool:
+    """
+    Fold ledger history that predates in_snapshot tracking into a snapshot
+    created from zero. Applied at most once (filtered on backfilled=False);
+    tracked entries are never summed here, so nothing is counted twice.
+    """
+    untracked = {"seller_id": seller_id, "in_snapshot": {"$ne": True}}
+    sums = (await _sum_ledger(db, seller_id, untracked_only=True, session=session))["settled"]
+    history = await (
+        db.wallet_ledger
+        .find(untracked, session=session)
+        .sort(list(RECENT_SORT.items()))
+        .limit(WALLET_RECENT_ENTRIES)
+        .to_list(WALLET_RECENT_ENTRIES)
+    )
+
+    update = _snapshot_update({**sums, "entries": history}, datetime.utcnow())
+    del update["$setOnInsert"]
+    update["$set"]["backfilled"] = True
+
+    result = await db.wallet_balances.update_one(
+        {"_id": seller_id, "backfilled": False},
+        update,
+        session=session,
+    )
+    return result.modified_count == 1
+
+
+def _checkpoint(at: datetime, credit, debit, entry_count: int, totals: dict) -> dict:
+    return {
+        "at": at,
+        "balance": credit - debit,
+        "credit": credit,
+        "debit": debit,
+        "entry_count": entry_count,
+        "totals": totals,
+    }
+
+
+def _differs(a: dict, b: dict) -> bool:
+    if a.get("entry_count", 0) != b.get("entry_count", 0):
+        return True
+    for field in ("credit", "debit"):
+        if abs((a.get(field) or 0) - (b.get(field) or 0)) > BALANCE_TOLERANCE:
+            return True
+    totals_a, totals_b = a.get("totals") or {}, b.get("totals") or {}
+    return any(
+        abs(totals_a.get(t, 0) - totals_b.get(t, 0)) > BALANCE_TOLERANCE
+        for t in set(totals_a) | set(totals_b)
+    )
+
+
+async def verify_wallet_balance(db, snapshot: dict, now: datetime | None = None) -> str:
+    """
+    Advance the checkpoint by the ledger tail and, if the seller is quiet,
+    check the snapshot against it.
+    Returns "ok", "repaired", "active" (writes inside the lag window, not
+    compared this run) or "busy" (a write raced the repair).
+
+    Repairs are conditional on entry_count so a concurrent $inc is never
+    overwritten.
+    """
+    now = now or datetime.utcnow()
+    upper = now - timedelta(seconds=WALLET_VERIFY_LAG_SECONDS)
+    checkpoint = snapshot.get("checkpoint") or _EMPTY_CHECKPOINT
+
+    sums = await _sum_ledger(
+        db,
+        snapshot["_id"],
+        after=checkpoint["at"] if checkpoint["at"] > datetime.min else None,
+        split_at=upper,
+    )
+    tail = sums["settled"]
+
+    totals = dict(checkpoint.get("totals") or {})
+    for entry_type, amount in tail["totals"].items():
+        totals[entry_type] = totals.get(entry_type, 0) + amount
+
+    new_checkpoint = _checkpoint(
+        max(checkpoint["at"], upper),
+        checkpoint["credit"] + tail["credit"],
+        checkpoint["debit"] + tail["debit"],
+        checkpoint["entry_count"] + tail["entry_count"],
+        totals,
+    )
+
+    quiet = sums["recent"]["entry_count"] == 0 and (
+        not snapshot.get("last_entry_at") or snapshot["last_entry_at"] <= upper
+    )
+
+    if quiet and _differs(snapshot, new_checkpoint):
+        # Rare path: confirm against the full ledger before touching the
+        # snapshot, in case an entry older than the checkpoint landed late
+        full = await _sum_ledger(db, snapshot["_id"], split_at=upper)
+        if full["recent"]["entry_count"]:
+            quiet = False
+        else:
+            settled = full["settled"]
+            new_checkpoint = _checkpoint(
+                upper, settled["credit"], settled["debit"], settled["entry_count"], settled["totals"],
+            )
+
+    if quiet and _differs(snapshot, new_checkpoint):
+        result = await db.wallet_balances.update_one(
+            {"_id": snapshot["_id"], "entry_count": snapshot.get("entry_count", 0)},
+            {"$set": {
+                "balance": new_checkpoint["balance"],
+                "credit": new_checkpoint["credit"],
+                "debit": new_checkpoint["debit"],
+                "entry_count": new_checkpoint["entry_count"],
+                "totals": new_checkpoint["totals"],
+                "checkpoint": new_checkpoint,
+                # Full ledger totals; a pending backfill would double count
+                "backfilled": True,
+                "verified_at": now,
+                "repaired_at": now,
+            }},
+        )
+        return "repaired" if result.matched_count else "busy"
+
+    await db.wallet_balances.update_one(
+        {"_id": snapshot["_id"]},
+        {"$set": {"checkpoint": new_checkpoint, "verified_at": now}},
+    )
+    return "ok" if quiet else "active"
@@ -1,7 +1,18 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
 from database import get_db
 from config.constants import SELLER_RESERVE_CONFIG
+from config.env import LEDGER_TRANSACTIONS
+from utils.cursors import decode_keyset_cursor, encode_keyset_cursor
+from utils.rollups import record_ledger_rollups
+from utils.wallet_balances import (
+    apply_wallet_balances,
+    get_wallet_snapshot,
+    WALLET_RECENT_ENTRIES,
+)
+
+LEDGER_PAGE_MAX = 200
 
 # ==============================
 # Ledger entry types (ENUM-LIKE)
@@ -13,109 +24,243 @@ ENTRY_PLATFORM_FEE_DEBIT = "PLATFORM_FEE_DEBIT"
 ENTRY_RESERVE_HOLD = "RESERVE_HOLD"
 ENTRY_RESERVE_RELEASE = "RESERVE_RELEASE"
 ENTRY_REFUND_DEBIT = "REFUND_DEBIT"
+ENTRY_EMERGENCY_PAYOUT_HOLD = "EMERGENCY_PAYOUT_HOLD"
+ENTRY_EMERGENCY_PAYOUT_RELEASE = "EMERGENCY_PAYOUT_RELEASE"
 
 
 # ==============================
 # Core: Append-only ledger write
 # ==============================
 
-async def add_ledger_entry(
-    db,
+def build_ledger_entry(
     seller_id: ObjectId,
     entry_type: str,
     credit: int = 0,
     debit: int = 0,
     order_id: ObjectId | None = None,
     reason_code: str | None = None,
-):
+    created_at: datetime | None = None,
+    reference_id: ObjectId | None = None,
+) -> dict:
     if credit < 0 or debit < 0:
         raise ValueError("Credit/Debit cannot be negative")
 
     entry = {
+        "_id": ObjectId(),
         "seller_id": seller_id,
         "order_id": order_id,
         "entry_type": entry_type,
         "credit": credit,
         "debit": debit,
         "reason_code": reason_code,
-        "created_at": datetime.utcnow(),
+        "created_at": created_at or datetime.utcnow(),
+    }
+    if reference_id is not None:
+        entry["reference_id"] = reference_id
+    return entry
+
+
+async def _post_in_transaction(db, entries: list[dict]) -> list[dict]:
+    # A duplicate key inside a transaction aborts it, so drop already-posted
+    # (order_id, entry_type) pairs up front under the same snapshot
+    keyed = [e for e in entries if e.get("order_id") is not None]
+    existing = set()
+    async with await db.client.start_session() as session:
+        async with session.start_transaction():
+            if keyed:
+                async for row in db.wallet_ledger.find(
+                    {
+                        "order_id": {"$in": list({e["order_id"] for e in keyed})},
+                        "entry_type": {"$in": list({e["entry_type"] for e in keyed})},
+                    },
+                    {"order_id": 1, "entry_type": 1},
+                    session=session,
+                ):
+                    existing.add((row["order_id"], row["entry_type"]))
+
+            posted = [
+                e for e in entries
+                if e.get("order_id") is None or (e["order_id"], e["entry_type"]) not in existing
+            ]
+            if posted:
+                await db.wallet_ledger.insert_many(posted, ordered=True, session=session)
+                await apply_wallet_balances(db, posted, session=session)
+    return posted
+
+
+async def post_ledger_batch(db, entries: list[dict], *, use_transaction: bool | None = None) -> dict:
+    """
+    Post a set of ledger entries as one journal: one insert_many, tagged with
+    a shared journal_id, then one wallet_balances update per seller.
+
+    Idempotent per (order_id, entry_type) through wallet_ledger_order_entry_unique:
+    entries already posted are skipped and reported as duplicates, so a
+    retried settlement / refund / release never double-posts.
+
+    With use_transaction (default LEDGER_TRANSACTIONS) the ledger rows and the
+    snapshot update commit together; otherwise the balance verifier covers a
+    crash between the two.
+    """
+    if not entries:
+        return {"journal_id": None, "posted": 0, "duplicates": 0}
+
+    journal_id = ObjectId()
+    for entry in entries:
+        entry["journal_id"] = journal_id
+        # Reaches wallet_balances by $inc below, never by a backfill
+        entry["in_snapshot"] = True
+
+    if LEDGER_TRANSACTIONS if use_transaction is None else use_transaction:
+        posted = await _post_in_transaction(db, entries)
+    else:
+        try:
+            await db.wallet_ledger.insert_many(entries, ordered=False)
+            posted = entries
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != 11000 for err in errors):
+                raise
+            skipped = {err["index"] for err in errors}
+            posted = [entry for i, entry in enumerate(entries) if i not in skipped]
+        await apply_wallet_balances(db, posted)
+
+    await record_ledger_rollups(db, posted)
+
+    return {
+        "journal_id": journal_id,
+        "posted": len(posted),
+        "duplicates": len(entries) - len(posted),
     }
 
-    await db.wallet_ledger.insert_one(entry)
+
+async def add_ledger_entry(
+    db,
+    seller_id: ObjectId,
+    entry_type: str,
+    credit: int = 0,
+    debit: int = 0,
+    order_id: ObjectId | None = None,
+    reason_code: str | None = None,
+    reference_id: ObjectId | None = None,
+):
+    entry = build_ledger_entry(
+        seller_id,
+        entry_type,
+        credit=credit,
+        debit=debit,
+        order_id=order_id,
+        reason_code=reason_code,
+        reference_id=reference_id,
+    )
+
+    await post_ledger_batch(db, [entry])
 
 
 # ==============================
-# Wallet balance (derived only)
+# Wallet balance (wallet_balances snapshot)
 # ==============================
 
 async def get_wallet_balance(db, seller_id: ObjectId) -> int:
-    pipeline = [
-        {"$match": {"seller_id": seller_id}},
-        {"$group": {
-            "_id": None,
-            "credit": {"$sum": "$credit"},
-            "debit": {"$sum": "$debit"},
-        }},
-    ]
-
-    result = await db.wallet_ledger.aggregate(pipeline).to_list(1)
-    if not result:
-        return 0
-
-    return result[0]["credit"] - result[0]["debit"]
+    snapshot = await get_wallet_snapshot(db, seller_id)
+    return round(snapshot.get("balance", 0), 2)
 
 
 # ==============================
 # Reserve balance (critical)
 # ==============================
 
-async def get_reserve_balance(db, seller_id: ObjectId) -> int:
-    pipeline = [
-        {"$match": {"seller_id": seller_id}},
-        {"$group": {
-            "_id": "$entry_type",
-            "amount": {"$sum": {"$subtract": ["$credit", "$debit"]}},
-        }},
-    ]
+def reserve_from_totals(totals: dict) -> int:
+    reserve = totals.get(ENTRY_RESERVE_HOLD, 0) - totals.get(ENTRY_RESERVE_RELEASE, 0)
+    return max(round(reserve, 2), 0)
 
-    rows = await db.wallet_ledger.aggregate(pipeline).to_list(None)
-    summary = {r["_id"]: r["amount"] for r in rows}
 
-    reserve = summary.get(ENTRY_RESERVE_HOLD, 0) - summary.get(ENTRY_RESERVE_RELEASE, 0)
-    return max(reserve, 0)
+async def get_reserve_balance(db, seller_id: ObjectId) -> int:
+    snapshot = await get_wallet_snapshot(db, seller_id)
+    return reserve_from_totals(snapshot.get("totals") or {})
 
 
 async def get_wallet_summary(db, seller_id: ObjectId) -> dict:
-    pipeline = [
-        {"$match": {"seller_id": seller_id}},
-        {"$group": {"_id": "$entry_type", "amount": {"$sum": {"$subtract": ["$credit", "$debit"]}}}},
-    ]
+    snapshot = await get_wallet_snapshot(db, seller_id)
+    return {
+        entry_type: round(amount, 2)
+        for entry_type, amount in (snapshot.get("totals") or {}).items()
+    }
+
+
+# ==============================
+# Wallet dashboard (one snapshot read)
+# ==============================
 
-    rows = await db.wallet_ledger.aggregate(pipeline).to_list(None)
-    return {row["_id"]: row["amount"] for row in rows}
+async def get_wallet_dashboard(db, seller_id: ObjectId, limit: int = WALLET_RECENT_ENTRIES) -> dict:
+    """
+    Balance, reserve, per-type totals and the newest ledger rows from the
+    wallet_balances snapshot. Older rows via get_ledger_page(next_cursor).
+    """
+    limit = min(max(limit, 1), WALLET_RECENT_ENTRIES)
+    snapshot = await get_wallet_snapshot(db, seller_id)
+    totals = snapshot.get("totals") or {}
+    recent = (snapshot.get("recent") or [])[:limit]
+
+    has_more = snapshot.get("entry_count", 0) > len(recent)
+    return {
+        "available": round(snapshot.get("balance", 0), 2),
+        "reserved": reserve_from_totals(totals),
+        "summary": {entry_type: round(amount, 2) for entry_type, amount in totals.items()},
+        "ledger": recent,
+        "next_cursor": encode_keyset_cursor(recent[-1]["created_at"], recent[-1]["_id"]) if recent and has_more else None,
+    }
+
+
+async def get_ledger_page(db, seller_id: ObjectId, *, cursor: str | None = None, limit: int = WALLET_RECENT_ENTRIES) -> dict:
+    """
+    Ledger rows older than `cursor`, newest first. Keyset on
+    (created_at, _id) over wallet_ledger_seller_created_at_id_idx.
+    """
+    limit = min(max(limit, 1), LEDGER_PAGE_MAX)
+    query = {"seller_id": seller_id}
+    if cursor:
+        created_at, last_id = decode_keyset_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+
+    entries = await (
+        db.wallet_ledger
+        .find(query)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return {
+        "ledger": entries,
+        "next_cursor": encode_keyset_cursor(entries[-1]["created_at"], entries[-1]["_id"]) if has_more else None,
+    }
 
 
 # ==============================
 # Settlement (COD / prepaid)
 # ==============================
 
-async def process_order_settlement(
-    db,
-    seller_id: ObjectId,
+def build_settlement_entries(
+    seller: dict,
     order_id: ObjectId,
     order_amount: float,
     commission_percent: float,
     platform_fee: float = 0,
-):
-    seller = await db.users.find_one({"_id": seller_id})
-    if not seller:
-        raise Exception("Seller not found")
-    
-    if seller.get("is_frozen"):
-        raise Exception("Settlement blocked: seller is frozen")
-
+    created_at: datetime | None = None,
+) -> list[dict]:
+    """
+    Ledger entries for one settled order, for a seller document that is
+    already loaded. Callers insert them with a single insert_many.
+    """
+    seller_id = seller["_id"]
     tier = seller.get("seller_tier", "standard")
     reserve_percent = SELLER_RESERVE_CONFIG.get(tier, 10)
+    created_at = created_at or datetime.utcnow()
 
     commission = round(order_amount * commission_percent / 100, 2)
     reserve = round(order_amount * reserve_percent / 100, 2)
@@ -123,72 +268,107 @@ async def process_order_settlement(
     seller_credit = round(order_amount - commission - reserve - platform_fee, 2)
 
     # Commission debit
-    await add_ledger_entry(
-        db,
-        seller_id,
-        ENTRY_COMMISSION_DEBIT,
-        debit=commission,
-        order_id=order_id,
-        reason_code="COMMISSION_DEDUCTED",
-    )
+    entries = [
+        build_ledger_entry(
+            seller_id,
+            ENTRY_COMMISSION_DEBIT,
+            debit=commission,
+            order_id=order_id,
+            reason_code="COMMISSION_DEDUCTED",
+            created_at=created_at,
+        )
+    ]
 
     # Fixed platform fee debit
     if platform_fee > 0:
-        await add_ledger_entry(
-            db,
+        entries.append(build_ledger_entry(
             seller_id,
             ENTRY_PLATFORM_FEE_DEBIT,
             debit=platform_fee,
             order_id=order_id,
             reason_code="PLATFORM_FEE_DEDUCTED",
-        )
+            created_at=created_at,
+        ))
 
     # Seller sale credit
-    await add_ledger_entry(
-        db,
+    entries.append(build_ledger_entry(
         seller_id,
         ENTRY_SALE_CREDIT,
         credit=seller_credit,
         order_id=order_id,
         reason_code="ORDER_SETTLED",
-    )
+        created_at=created_at,
+    ))
 
     # Reserve hold
     if reserve > 0:
-        await add_ledger_entry(
-            db,
+        entries.append(build_ledger_entry(
             seller_id,
             ENTRY_RESERVE_HOLD,
             credit=reserve,
             order_id=order_id,
             reason_code="RESERVE_HELD",
-        )
+            created_at=created_at,
+        ))
+
+    return entries
+
+
+async def process_order_settlement(
+    db,
+    seller_id: ObjectId,
+    order_id: ObjectId,
+    order_amount: float,
+    commission_percent: float,
+    platform_fee: float = 0,
+):
+    seller = await db.users.find_one({"_id": seller_id}, {"seller_tier": 1, "is_frozen": 1})
+    if not seller:
+        raise Exception("Seller not found")
+    
+    if seller.get("is_frozen"):
+        raise Exception("Settlement blocked: seller is frozen")
+
+    entries = build_settlement_entries(
+        seller,
+        order_id,
+        order_amount,
+        commission_percent,
+        platform_fee=platform_fee,
+    )
+    await post_ledger_batch(db, entries)
 
 
 # ==============================
 # Refund (reserve only, no clawback)
 # ==============================
 
-async def process_return_refund(db, seller_id, order_id, refund_amount):
-    await add_ledger_entry(
-        db=db,
-        seller_id=seller_id,
-        entry_type=ENTRY_REFUND_DEBIT,
+def build_refund_entry(seller_id, order_id, refund_amount) -> dict:
+    return build_ledger_entry(
+        seller_id,
+        ENTRY_REFUND_DEBIT,
         debit=refund_amount,
         order_id=order_id,
         reason_code="RETURN_APPROVED_REFUND",
     )
 
+
+async def process_return_refund(db, seller_id, order_id, refund_amount) -> dict:
+    return await post_ledger_batch(db, [build_refund_entry(seller_id, order_id, refund_amount)])
+
 # ==============================
 # Reserve release (no return case)
 # ==============================
 
-async def release_reserve(db, seller_id, order_id, reserve_amount):
-    await add_ledger_entry(
-        db=db,
-        seller_id=seller_id,
-        entry_type="RESERVE_RELEASE",
+def build_reserve_release_entry(seller_id, order_id, reserve_amount) -> dict:
+    return build_ledger_entry(
+        seller_id,
+        ENTRY_RESERVE_RELEASE,
         credit=reserve_amount,
         order_id=order_id,
         reason_code="RETURN_RESERVE_RELEASED",
     )
+
+
+async def release_reserve(db, seller_id, order_id, reserve_amount) -> dict:
+    return await post_ledger_batch(db, [build_reserve_release_entry(seller_id, order_id, reserve_amount)])
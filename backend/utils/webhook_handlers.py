@@ -0,0 +1,192 @@
+from datetime import datetime
+from bson import ObjectId
+
+from utils.order_state_machine import OrderStateMachine
+from utils.order_timeline import record_order_event
+
+# ==============================
+# Webhook inbox handlers
+# ==============================
+# Each handler receives the raw provider payload stored in webhook_inbox and
+# must be safe to run more than once (retries, replays, out-of-order
+# delivery): state changes are filtered on the legal from-states, and
+# timeline rows carry a dedupe_key derived from the inbox event_key.
+
+# payout_requests.status a provider status may move the request to, and the
+# states it may move from. Anything else (replays, late "processing" after
+# "processed") only leaves the request where it is.
+PAYOUT_STATUS_TRANSITIONS = {
+    "processed": ("approved", ("processing",)),
+    "rejected": ("failed", ("processing",)),
+    "failed": ("failed", ("processing",)),
+    "cancelled": ("failed", ("processing",)),
+    # A processed payout can still bounce back from the bank
+    "reversed": ("failed", ("processing", "approved")),
+    "queued": ("processing", ("processing",)),
+    "pending": ("processing", ("processing",)),
+    "processing": ("processing", ("processing",)),
+}
+
+
+async def handle_delivery_event(db, payload: dict) -> dict:
+    waybill = payload.get("waybill")
+    status = payload.get("status")
+    delivered_at = payload.get("delivered_at")
+
+    order = await db.orders.find_one(
+        {"waybill": waybill},
+        {"_id": 1},
+    )
+
+    if not order:
+        return {"order": "not_found"}
+
+    await record_order_event(
+        db=db,
+        order_id=order["_id"],
+        event="COURIER_STATUS_UPDATE",
+        actor_role="system",
+        actor_id=None,
+        metadata={
+            "waybill": waybill,
+            "courier_status": status,
+            "delivered_at": delivered_at,
+        },
+        # Same key as the inbox event (waybill:status)
+        dedupe_key=f"COURIER_STATUS_UPDATE:{waybill}:{status}",
+    )
+
+    if status == "DELIVERED":
+        # No-op for orders already delivered / rto or reported before
+        reported = await OrderStateMachine(db).apply(
+            "report_delivery",
+            order["_id"],
+            set_fields={"delivery_reported_at": datetime.utcnow()},
+            projection={"_id": 1},
+        )
+        return {"order_id": str(order["_id"]), "reported": bool(reported)}
+
+    return {"order_id": str(order["_id"])}
+
+
+async def handle_razorpay_event(db, payload: dict) -> dict:
+    event = payload.get("event")
+    payment_entity = (
+        payload.get("payload", {})
+        .get("payment", {})
+        .get("entity", {})
+    )
+
+    razorpay_payment_id = payment_entity.get("id")
+    razorpay_order_id = payment_entity.get("order_id")
+    payment_status = payment_entity.get("status")
+
+    if event != "payment.captured" or payment_status != "captured":
+        return {"ignored": True, "event": event}
+
+    order = await db.orders.find_one(
+        {
+            "payment.method": "RAZORPAY",
+            "payment.gateway_order_id": razorpay_order_id,
+        },
+        {"_id": 1, "payment.status": 1},
+    )
+
+    if not order:
+        return {"order": "not_found"}
+
+    if order.get("payment", {}).get("status") == "paid":
+        return {"order": "already_paid"}
+
+    now = datetime.utcnow()
+    update_res = await db.orders.update_one(
+        {"_id": order["_id"], "payment.status": "pending"},
+        {
+            "$set": {
+                "payment.status": "paid",
+                "payment.gateway_payment_id": razorpay_payment_id,
+                "payment.paid_at": now,
+                "updated_at": now,
+            }
+        },
+    )
+
+    if update_res.modified_count == 1:
+        await record_order_event(
+            db=db,
+            order_id=order["_id"],
+            event="PAYMENT_CAPTURED_WEBHOOK",
+            actor_role="system",
+            actor_id=None,
+            metadata={
+                "gateway": "razorpay",
+                "razorpay_order_id": razorpay_order_id,
+                "razorpay_payment_id": razorpay_payment_id,
+            },
+        )
+
+    return {"updated": update_res.modified_count == 1}
+
+
+async def handle_razorpayx_payout_event(db, payload: dict) -> dict:
+    event = payload.get("event")
+    payout_entity = (
+        payload.get("payload", {})
+        .get("payout", {})
+        .get("entity", {})
+    )
+
+    provider_payout_id = payout_entity.get("id")
+    provider_status = payout_entity.get("status")
+    reference_id = payout_entity.get("reference_id")
+    failure_reason = payout_entity.get("status_details", {}).get("description") or payout_entity.get("narration")
+
+    payout_request = await db.payout_requests.find_one({
+        "$or": [
+            {"provider_payout_id": provider_payout_id},
+            {"_id": ObjectId(reference_id)} if ObjectId.is_valid(reference_id or "") else {"_id": None},
+        ]
+    })
+
+    if not payout_request:
+        return {"request": "not_found"}
+
+    now = datetime.utcnow()
+    update_fields = {
+        "provider": "razorpayx",
+        "provider_payout_id": provider_payout_id,
+        "provider_payout_status": provider_status,
+        "provider_event": event,
+        "provider_webhook_at": now,
+    }
+
+    normalized_status = (provider_status or "").lower()
+    transition = PAYOUT_STATUS_TRANSITIONS.get(normalized_status)
+    if not transition:
+        return {"request_id": str(payout_request["_id"]), "ignored": True, "provider_status": provider_status}
+
+    to_status, from_states = transition
+    update_fields["status"] = to_status
+    if to_status == "approved":
+        update_fields["transfer_processed_at"] = now
+    elif to_status == "failed":
+        update_fields["failure_reason"] = failure_reason or "Provider marked payout failed"
+        update_fields["failed_at"] = now
+
+    result = await db.payout_requests.update_one(
+        {"_id": payout_request["_id"], "status": {"$in": list(from_states)}},
+        {"$set": update_fields},
+    )
+
+    return {
+        "request_id": str(payout_request["_id"]),
+        "provider_status": provider_status,
+        "applied": result.matched_count == 1,
+    }
+
+
+WEBHOOK_HANDLERS = {
+    "delivery": handle_delivery_event,
+    "razorpay": handle_razorpay_event,
+    "razorpayx_payout": handle_razorpayx_payout_event,
+}
@@ -0,0 +1,276 @@
+import zlib
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+
+# ==============================
+# Webhook inbox (accept-then-process)
+# ==============================
+# Webhook routes only verify the signature and append the raw event here.
+# workers/webhook_inbox_worker.py drains the inbox.
+#
+# Status flow: pending -> processing -> done
+#                              |-> retry -> processing ...
+#                              |-> dead (after WEBHOOK_MAX_ATTEMPTS)
+
+WEBHOOK_INBOX_SHARDS = 4
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE_SECONDS = 15
+WEBHOOK_RETRY_MAX_SECONDS = 60 * 30
+WEBHOOK_PROCESSING_STALE_SECONDS = 60 * 5
+WEBHOOK_CLAIM_SCAN_LIMIT = 50
+WEBHOOK_CLAIM_MAX_BLOCKED = 500  # bounds the $nin of partitions skipped per claim
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_RETRY = "retry"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+# An older event in one of these holds back later events of its partition
+UNFINISHED_STATUSES = [STATUS_PENDING, STATUS_PROCESSING, STATUS_RETRY]
+
+
+def shard_for(partition_key: str) -> int:
+    return zlib.crc32(partition_key.encode("utf-8")) % WEBHOOK_INBOX_SHARDS
+
+
+def build_inbox_event(
+    *,
+    source: str,
+    event_key: str,
+    partition_key: str,
+    payload: dict,
+    received_at: datetime | None = None,
+) -> dict:
+    now = received_at or datetime.utcnow()
+    return {
+        "source": source,
+        "event_key": event_key,
+        "partition_key": partition_key,
+        "shard": shard_for(partition_key),
+        "payload": payload,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "last_error": None,
+        "received_at": now,
+        "updated_at": now,
+    }
+
+
+async def append_webhook_event(
+    db,
+    *,
+    source: str,
+    event_key: str,
+    partition_key: str,
+    payload: dict,
+) -> bool:
+    """
+    Durably append one event. Returns False if (source, event_key) was
+    already received, which makes provider retries a single index probe.
+    """
+    doc = build_inbox_event(
+        source=source,
+        event_key=event_key,
+        partition_key=partition_key,
+        payload=payload,
+    )
+    try:
+        await db.webhook_inbox.insert_one(doc)
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def append_webhook_events(db, docs: list[dict]) -> int:
+    """
+    Bulk append for docs built with build_inbox_event.
+    Returns how many were new; duplicates are dropped silently.
+    """
+    if not docs:
+        return 0
+    try:
+        result = await db.webhook_inbox.insert_many(docs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+# ==============================
+# Consumer side
+# ==============================
+
+async def _has_older_unfinished(db, candidate: dict) -> bool:
+    older = await db.webhook_inbox.find_one(
+        {
+            "partition_key": candidate["partition_key"],
+            "status": {"$in": UNFINISHED_STATUSES},
+            "received_at": {"$lt": candidate["received_at"]},
+        },
+        {"_id": 1},
+    )
+    return older is not None
+
+
+async def claim_next_event(db, shard: int) -> dict | None:
+    """
+    Claim the oldest runnable event in a shard.
+
+    Only events whose backoff has expired are scanned, so a run of events
+    waiting on retries (a provider outage) never hides runnable ones behind
+    it. Per-partition ordering is kept by a probe on the candidate's own
+    partition: it is skipped while an older event for the same order /
+    payout is unfinished, and that partition is excluded from the next page.
+    """
+    now = datetime.utcnow()
+    blocked = []
+
+    while len(blocked) < WEBHOOK_CLAIM_MAX_BLOCKED:
+        query = {
+            "shard": shard,
+            "status": {"$in": [STATUS_PENDING, STATUS_RETRY]},
+            "next_attempt_at": {"$lte": now},
+        }
+        if blocked:
+            query["partition_key"] = {"$nin": blocked}
+
+        candidates = await (
+            db.webhook_inbox
+            .find(query, {"_id": 1, "partition_key": 1, "received_at": 1})
+            .sort("received_at", 1)
+            .limit(WEBHOOK_CLAIM_SCAN_LIMIT)
+            .to_list(WEBHOOK_CLAIM_SCAN_LIMIT)
+        )
+        if not candidates:
+            return None
+
+        for candidate in candidates:
+            partition = candidate["partition_key"]
+            if partition in blocked:
+                continue
+
+            if await _has_older_unfinished(db, candidate):
+                blocked.append(partition)
+                continue
+
+            claimed = await db.webhook_inbox.find_one_and_update(
+                {"_id": candidate["_id"], "status": {"$in": [STATUS_PENDING, STATUS_RETRY]}},
+                {
+                    "$set": {
+                        "status": STATUS_PROCESSING,
+                        "claimed_at": now,
+                        "updated_at": now,
+                    },
+                    "$inc": {"attempts": 1},
+                },
+                return_document=ReturnDocument.AFTER,
+            )
+            if claimed:
+                return claimed
+
+            # Lost the race for this one; keep ordering by not jumping ahead.
+            blocked.append(partition)
+
+    return None
+
+
+async def mark_event_done(db, event: dict, result: dict | None = None):
+    now = datetime.utcnow()
+    await db.webhook_inbox.update_one(
+        {"_id": event["_id"]},
+        {
+            "$set": {
+                "status": STATUS_DONE,
+                "result": result,
+                "last_error": None,
+                "processed_at": now,
+                "updated_at": now,
+            }
+        },
+    )
+
+
+async def mark_event_failed(db, event: dict, error: str):
+    now = datetime.utcnow()
+    attempts = event.get("attempts", 1)
+
+    if attempts >= WEBHOOK_MAX_ATTEMPTS:
+        update = {
+            "status": STATUS_DEAD,
+            "dead_at": now,
+        }
+    else:
+        backoff = min(
+            WEBHOOK_RETRY_BASE_SECONDS * (2 ** (attempts - 1)),
+            WEBHOOK_RETRY_MAX_SECONDS,
+        )
+        update = {
+            "status": STATUS_RETRY,
+            "next_attempt_at": now + timedelta(seconds=backoff),
+        }
+
+    update["last_error"] = error[:1000]
+    update["updated_at"] = now
+
+    await db.webhook_inbox.update_one({"_id": event["_id"]}, {"$set": update})
+
+
+async def requeue_stale_events(db) -> int:
+    """
+    Return events stuck in processing (consumer crashed mid-event) to retry.
+    """
+    now = datetime.utcnow()
+    result = await db.webhook_inbox.update_many(
+        {
+            "status": STATUS_PROCESSING,
+            "claimed_at": {"$lte": now - timedelta(seconds=WEBHOOK_PROCESSING_STALE_SECONDS)},
+        },
+        {
+            "$set": {
+                "status": STATUS_RETRY,
+                "next_attempt_at": now,
+                "updated_at": now,
+            }
+        },
+    )
+    return result.modified_count
+
+
+async def replay_webhook_events(
+    db,
+    *,
+    since: datetime,
+    until: datetime,
+    source: str | None = None,
+    statuses: list[str] | None = None,
+) -> int:
+    """
+    Re-queue events received in [since, until) for reprocessing.
+    Defaults to finished and dead-lettered events.
+    """
+    now = datetime.utcnow()
+    query = {
+        "received_at": {"$gte": since, "$lt": until},
+        "status": {"$in": statuses or [STATUS_DONE, STATUS_DEAD]},
+    }
+    if source:
+        query["source"] = source
+
+    result = await db.webhook_inbox.update_many(
+        query,
+        {
+            "$set": {
+                "status": STATUS_PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "replayed_at": now,
+                "updated_at": now,
+            }
+        },
+    )
+    return result.modified_count
@@ -0,0 +1,23 @@
+import logging
+
+from utils.ledger_reconciliation import reconcile_ledger
+
+logger = logging.getLogger(__name__)
+
+
+async def run_ledger_reconciliation(db):
+    """
+    Nightly orders <-> wallet_ledger reconciliation. The report (counts plus
+    a sample of issues) is kept in ledger_reconciliation_runs for finance.
+    """
+    report = await reconcile_ledger(db)
+    await db.ledger_reconciliation_runs.insert_one(report)
+
+    counts = report["counts"]
+    log = logger.warning if any(counts.values()) else logger.info
+    log(
+        "LEDGER_RECONCILIATION_RUN orders=%s entries=%s %s",
+        report["orders_checked"],
+        report["entries_checked"],
+        " ".join(f"{k}={v}" for k, v in sorted(counts.items())),
+    )
@@ -1,62 +1,240 @@
 import asyncio
 import logging
+import uuid
 from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from database import get_db
-from utils.order_timeline import record_order_event
+from utils.order_timeline import build_order_event, record_order_events
+from utils.seller_stats import inc_seller_stats_bulk, STAT_CANCELLED_ORDERS
 
 CHECK_INTERVAL_SECONDS = 60 * 5  # every 5 minutes
 RAZORPAY_PAYMENT_TIMEOUT_MINUTES = 15
+EXPIRY_BATCH_SIZE = 1000
+# A release claimed this long ago without finishing is assumed dead
+EXPIRY_RELEASE_STALE_SECONDS = 60 * 10
 logger = logging.getLogger(__name__)
 
+# Orders are cancelled in batches. One conditional update_many cancels the
+# batch and, in the same write, claims its stock release:
+#
+#   expiry.batch_id, expiry.stock_released=False,
+#   expiry.release_token, expiry.release_claimed_at
+#
+# Only the holder of release_token releases the batch. A run that dies
+# before flipping stock_released leaves the claim to go stale; after
+# EXPIRY_RELEASE_STALE_SECONDS another run re-claims it with a new token.
+#
+# Every side effect is keyed on batch_id so a re-claimed batch never applies
+# twice. Stock is released at most once per (batch_id, product_id): a row
+# in stock_releases (unique key) is inserted before the product is touched,
+# so a re-claim skips products an earlier claim already started. A claim
+# dying between the two leaves the row with applied=False and the units in
+# reserved_stock (logged on re-claim) rather than releasing them twice.
+# Seller counters use an apply_key and timeline events a per-order
+# dedupe_key.
+#
+# The release is clamped to the product's reserved_stock, so drift between
+# reserved_stock and orders never drops the whole SKU's release.
+
+
+def _release_claim(token: str, now: datetime) -> dict:
+    return {
+        "expiry.release_token": token,
+        "expiry.release_claimed_at": now,
+    }
+
+
+def _stock_release_op(product_id, qty: int) -> UpdateOne:
+    # Moves min(qty, reserved_stock) back to stock in one pipeline update
+    reserved = {"$max": [{"$ifNull": ["$reserved_stock", 0]}, 0]}
+    return UpdateOne(
+        {"_id": product_id},
+        [{"$set": {
+            "stock": {"$add": [{"$ifNull": ["$stock", 0]}, {"$min": [qty, reserved]}]},
+            "reserved_stock": {"$max": [{"$subtract": [reserved, qty]}, 0]},
+        }}],
+    )
+
+
+async def _claim_stock_releases(db, batch_id: str, per_product: dict, now: datetime) -> list:
+    """
+    Insert one stock_releases row per product; returns the product ids this
+    call inserted (and so must release). Rows already present belong to an
+    earlier claim of the same batch.
+    """
+    rows = [
+        {
+            "batch_id": batch_id,
+            "product_id": product_id,
+            "quantity": qty,
+            "applied": False,
+            "created_at": now,
+        }
+        for product_id, qty in per_product.items()
+    ]
+    if not rows:
+        return []
+
+    skipped = set()
+    try:
+        await db.stock_releases.insert_many(rows, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        skipped = {err["index"] for err in errors}
+
+    if skipped:
+        unconfirmed = await db.stock_releases.count_documents(
+            {"batch_id": batch_id, "applied": False, "product_id": {"$in": [rows[i]["product_id"] for i in skipped]}}
+        )
+        if unconfirmed:
+            logger.error(
+                "STOCK_RELEASE_UNCONFIRMED batch=%s products=%s (claim died mid-release; check reserved_stock)",
+                batch_id, unconfirmed,
+            )
+
+    return [row["product_id"] for i, row in enumerate(rows) if i not in skipped]
+
+
+async def _release_expired_batch(db, batch_id: str, token: str, now: datetime) -> int:
+    orders = await db.orders.find(
+        {"expiry.batch_id": batch_id, "expiry.release_token": token, "expiry.stock_released": False},
+        {"product_id": 1, "quantity": 1, "seller_id": 1},
+    ).to_list(None)
+
+    if not orders:
+        return 0
+
+    # Release reserved stock: one update per product, at most once per batch
+    per_product = {}
+    for order in orders:
+        qty = order.get("quantity", 0)
+        per_product[order["product_id"]] = per_product.get(order["product_id"], 0) + qty
+    per_product = {pid: qty for pid, qty in per_product.items() if qty > 0}
+
+    claimed = await _claim_stock_releases(db, batch_id, per_product, now)
+    if claimed:
+        await db.products.bulk_write(
+            [_stock_release_op(pid, per_product[pid]) for pid in claimed],
+            ordered=False,
+        )
+        await db.stock_releases.update_many(
+            {"batch_id": batch_id, "product_id": {"$in": claimed}},
+            {"$set": {"applied": True, "applied_at": now}},
+        )
+
+    # Seller cancellation counters (trust inputs)
+    per_seller = {}
+    for order in orders:
+        stats = per_seller.setdefault(order["seller_id"], {STAT_CANCELLED_ORDERS: 0})
+        stats[STAT_CANCELLED_ORDERS] += 1
+    await inc_seller_stats_bulk(db, per_seller, apply_key=f"expiry:{batch_id}")
+
+    # Timeline events
+    try:
+        await record_order_events(db, [
+            build_order_event(
+                order_id=order["_id"],
+                event="ORDER_PAYMENT_TIMEOUT",
+                actor_role="system",
+                created_at=now,
+                dedupe_key=f"ORDER_PAYMENT_TIMEOUT:{order['_id']}",
+            )
+            for order in orders
+        ])
+    except Exception:
+        logger.exception("TIMELINE_ERROR expiry_batch=%s", batch_id)
+
+    await db.orders.update_many(
+        {"expiry.batch_id": batch_id, "expiry.release_token": token},
+        {"$set": {"expiry.stock_released": True}},
+    )
+
+    return len(orders)
+
+
+async def _recover_stale_releases(db, now: datetime) -> int:
+    """
+    Re-claim batches whose release was claimed by a run that never finished.
+    """
+    stale_before = now - timedelta(seconds=EXPIRY_RELEASE_STALE_SECONDS)
+    stale = {"expiry.stock_released": False, "expiry.release_claimed_at": {"$lte": stale_before}}
+    released = 0
+
+    for batch_id in await db.orders.distinct("expiry.batch_id", stale):
+        token = uuid.uuid4().hex
+        result = await db.orders.update_many(
+            {**stale, "expiry.batch_id": batch_id},
+            {"$set": _release_claim(token, now)},
+        )
+        if result.modified_count:
+            logger.warning("ORDER_EXPIRY_RECLAIMED batch=%s orders=%s", batch_id, result.modified_count)
+            released += await _release_expired_batch(db, batch_id, token, now)
+
+    return released
+
+
+async def expire_unpaid_orders(db, order_ids: list | None = None) -> int:
+    """
+    Cancel unpaid Razorpay orders past the payment timeout.
+    order_ids limits the pass to orders popped from scheduled_actions;
+    without it this is the full sweep.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(minutes=RAZORPAY_PAYMENT_TIMEOUT_MINUTES)
+    expired = await _recover_stale_releases(db, now)
+
+    query = {
+        "payment.method": "RAZORPAY",
+        "payment.status": "pending",
+        "created_at": {"$lte": cutoff},
+        "status": "created",
+    }
+    if order_ids is not None:
+        query["_id"] = {"$in": order_ids}
+
+    while True:
+        ids = [
+            o["_id"]
+            async for o in db.orders.find(query, {"_id": 1}).limit(EXPIRY_BATCH_SIZE)
+        ]
+        if not ids:
+            break
+
+        # Cancel + claim the release: still-unpaid orders only, so a payment
+        # landing now (or another run cancelling them first) wins
+        batch_id = uuid.uuid4().hex
+        token = uuid.uuid4().hex
+        await db.orders.update_many(
+            {"$and": [query, {"_id": {"$in": ids}}]},
+            {
+                "$set": {
+                    "status": "cancelled",
+                    "updated_at": now,
+                    "cancel_reason": "RAZORPAY_PAYMENT_TIMEOUT",
+                    "expiry.batch_id": batch_id,
+                    "expiry.stock_released": False,
+                    **_release_claim(token, now),
+                }
+            },
+        )
+
+        expired += await _release_expired_batch(db, batch_id, token, now)
+
+    if expired:
+        logger.info("ORDER_EXPIRY_RUN expired=%s", expired)
+
+    return expired
+
 
 async def order_expiry_worker():
     db = get_db()
 
     while True:
-        now = datetime.utcnow()
-        cutoff = now - timedelta(minutes=RAZORPAY_PAYMENT_TIMEOUT_MINUTES)
-
-        cursor = db.orders.find({
-            "payment.method": "RAZORPAY",
-            "payment.status": "pending",
-            "created_at": {"$lte": cutoff},
-            "status": "created",
-        })
-
-        async for order in cursor:
-            try:
-                # Cancel order
-                await db.orders.update_one(
-                    {"_id": order["_id"]},
-                    {
-                        "$set": {
-                            "status": "cancelled",
-                            "updated_at": now,
-                            "cancel_reason": "RAZORPAY_PAYMENT_TIMEOUT",
-                        }
-                    }
-                )
-
-                # Release reserved stock if order expired before payment
-                await db.products.update_one(
-                    {
-                        "_id": order["product_id"],
-                        "reserved_stock": {"$gte": order.get("quantity", 0)},
-                    },
-                    {"$inc": {"stock": order.get("quantity", 0), "reserved_stock": -order.get("quantity", 0)}},
-                )
-
-                # Timeline event
-                await record_order_event(
-                    db=db,
-                    order_id=order["_id"],
-                    event="ORDER_PAYMENT_TIMEOUT",
-                    actor_role="system",
-                    actor_id=None,
-                    metadata=None,
-                )
-
-            except Exception:
-                logger.exception("ORDER_EXPIRY_ERROR")
-
+        try:
+            await expire_unpaid_orders(db)
+        except Exception:
+            logger.exception("ORDER_EXPIRY_ERROR")
         await asyncio.sleep(CHECK_INTERVAL_SECONDS)
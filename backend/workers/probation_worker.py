@@ -1,29 +1,38 @@
 import asyncio
 from datetime import datetime
 from database import get_db
+from utils.seller_risk import invalidate_seller_risk_cache
 
 CHECK_INTERVAL = 60 * 60  # every hour
 
+async def end_due_probations(db):
+    now = datetime.utcnow()
+
+    cursor = db.users.find({
+        "seller_probation.active": True,
+        "seller_probation.ends_at": {"$lte": now},
+    })
+
+    ended = 0
+    async for seller in cursor:
+        await db.users.update_one(
+            {"_id": seller["_id"]},
+            {
+                "$set": {
+                    "seller_probation.active": False,
+                    "updated_at": now,
+                }
+            }
+        )
+        ended += 1
+
+    if ended:
+        invalidate_seller_risk_cache()
+
+
 async def probation_worker():
     db = get_db()
 
     while True:
-        now = datetime.utcnow()
-
-        cursor = db.users.find({
-            "seller_probation.active": True,
-            "seller_probation.ends_at": {"$lte": now},
-        })
-
-        async for seller in cursor:
-            await db.users.update_one(
-                {"_id": seller["_id"]},
-                {
-                    "$set": {
-                        "seller_probation.active": False,
-                        "updated_at": now,
-                    }
-                }
-            )
-
+        await end_due_probations(db)
         await asyncio.sleep(CHECK_INTERVAL)
@@ -2,47 +2,64 @@ import asyncio
 import logging
 from datetime import datetime
 from database import get_db
+from utils.order_state_machine import OrderStateMachine
 from utils.order_timeline import record_order_event
 
 CHECK_INTERVAL_SECONDS = 60 * 10  # every 10 min
 logger = logging.getLogger(__name__)
 
 
+async def auto_reject_overdue_returns(db, order_ids: list | None = None):
+    """
+    Auto-reject return requests the seller did not act on in time.
+    order_ids limits the pass to orders popped from scheduled_actions.
+    """
+    now = datetime.utcnow()
+
+    query = {
+        "return.status": "requested",
+        "return.seller_action_deadline": {"$lte": now},
+    }
+    if order_ids is not None:
+        query["_id"] = {"$in": order_ids}
+
+    cursor = db.orders.find(query, {"_id": 1})
+    state_machine = OrderStateMachine(db)
+
+    async for order in cursor:
+        try:
+            # Filtered on the from-state: a seller who responded after the
+            # read above wins, and the order is left alone
+            rejected = await state_machine.apply(
+                "reject_return",
+                order["_id"],
+                extra_filter={"return.seller_action_deadline": {"$lte": now}},
+                set_fields={
+                    "return.seller_action": "auto_rejected",
+                    "return.seller_action_at": now,
+                },
+                projection={"_id": 1},
+                now=now,
+            )
+            if not rejected:
+                continue
+
+            await record_order_event(
+                db=db,
+                order_id=order["_id"],
+                event="RETURN_AUTO_REJECTED",
+                actor_role="system",
+                actor_id=None,
+                metadata=None,
+            )
+
+        except Exception:
+            logger.exception("RETURN_DEADLINE_ERROR")
+
+
 async def return_deadline_worker():
     db = get_db()
 
     while True:
-        now = datetime.utcnow()
-
-        cursor = db.orders.find({
-            "return.status": "requested",
-            "return.seller_action_deadline": {"$lte": now},
-        })
-
-        async for order in cursor:
-            try:
-                await db.orders.update_one(
-                    {"_id": order["_id"]},
-                    {
-                        "$set": {
-                            "return.status": "rejected",
-                            "return.seller_action": "auto_rejected",
-                            "return.seller_action_at": now,
-                            "updated_at": now,
-                        }
-                    }
-                )
-
-                await record_order_event(
-                    db=db,
-                    order_id=order["_id"],
-                    event="RETURN_AUTO_REJECTED",
-                    actor_role="system",
-                    actor_id=None,
-                    metadata=None,
-                )
-
-            except Exception:
-                logger.exception("RETURN_DEADLINE_ERROR")
-
+        await auto_reject_overdue_returns(db)
         await asyncio.sleep(CHECK_INTERVAL_SECONDS)
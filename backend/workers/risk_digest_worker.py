@@ -1,15 +1,14 @@
 ﻿import logging
 from datetime import datetime, timedelta
 
-from database import get_db
-from config.constants import LOW_TRUST_THRESHOLD
+from utils.seller_risk import compute_seller_risk_overview
 
 HIGH_RTO_THRESHOLD = 3
 LOOKBACK_DAYS = 30
 logger = logging.getLogger(__name__)
 
 
-async def daily_risk_digest():
+async def daily_risk_digest(db):
     """
     DAILY RISK DIGEST (READ-ONLY)
     -----------------------------
@@ -19,21 +18,10 @@ async def daily_risk_digest():
     - COD heavy sellers
     """
 
-    db = get_db()
     since = datetime.utcnow() - timedelta(days=LOOKBACK_DAYS)
 
-    low_trust = await db.users.find(
-        {
-            "role": "seller",
-            "seller_profile.trust.score": {"$lt": LOW_TRUST_THRESHOLD},
-        },
-        {"_id": 1, "seller_profile.trust.score": 1},
-    ).to_list(None)
-
-    frozen_count = await db.users.count_documents({
-        "role": "seller",
-        "seller_status": "frozen",
-    })
+    # Same $facet as the admin dashboard, uncached
+    seller_summary = (await compute_seller_risk_overview(db))["summary"]
 
     high_rto = await db.orders.aggregate([
         {
@@ -77,8 +65,8 @@ async def daily_risk_digest():
 
     logger.info(
         "DAILY_RISK_DIGEST low_trust=%s frozen=%s high_rto=%s cod_heavy=%s",
-        len(low_trust),
-        frozen_count,
+        seller_summary["low_trust_sellers"],
+        seller_summary["frozen_sellers"],
         len(high_rto),
         len(cod_heavy),
     )
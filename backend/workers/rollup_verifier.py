@@ -0,0 +1,18 @@
+import logging
+
+from utils.rollups import verify_running_rollup, verify_daily_rollups
+
+logger = logging.getLogger(__name__)
+
+
+async def verify_rollups(db):
+    """
+    Nightly: recompute dashboard rollups from orders / wallet_ledger and
+    repair any drift left by failed or missed counter writes.
+    """
+    drift = await verify_running_rollup(db)
+    if drift:
+        logger.warning("ROLLUP_REPAIRED row=running drift=%s", drift)
+
+    for row_id, day_drift in (await verify_daily_rollups(db)).items():
+        logger.warning("ROLLUP_REPAIRED row=%s drift=%s", row_id, day_drift)
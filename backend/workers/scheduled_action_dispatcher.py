@@ -0,0 +1,84 @@
+import logging
+from datetime import datetime
+
+from utils.scheduled_actions import (
+    ACTION_ORDER_EXPIRY,
+    ACTION_RETURN_DEADLINE,
+    ACTION_RESERVE_RELEASE,
+    claim_due_actions,
+    complete_actions,
+    next_due_at,
+    requeue_stale_actions,
+    retry_actions,
+    wait_for_schedule,
+)
+from utils.reserve_release_worker import release_due_reserves
+from workers.order_expiry_worker import expire_unpaid_orders
+from workers.return_deadline_worker import auto_reject_overdue_returns
+
+MAX_IDLE_SECONDS = 30
+STALE_CHECK_INTERVAL_SECONDS = 60
+logger = logging.getLogger(__name__)
+
+# Handlers take the popped order ids and re-check order state themselves
+ACTION_HANDLERS = {
+    ACTION_ORDER_EXPIRY: expire_unpaid_orders,
+    ACTION_RETURN_DEADLINE: auto_reject_overdue_returns,
+    ACTION_RESERVE_RELEASE: release_due_reserves,
+}
+
+
+async def dispatch_actions(db, actions: list[dict]):
+    by_action = {}
+    for action in actions:
+        by_action.setdefault(action["action"], []).append(action)
+
+    for name, batch in by_action.items():
+        handler = ACTION_HANDLERS.get(name)
+        if not handler:
+            logger.error("SCHEDULED_ACTION_UNKNOWN action=%s count=%s", name, len(batch))
+            await _retry(db, name, batch, f"No handler for action {name}")
+            continue
+
+        try:
+            await handler(db, [a["order_id"] for a in batch])
+        except Exception as e:
+            logger.exception("SCHEDULED_ACTION_ERROR action=%s", name)
+            await _retry(db, name, batch, str(e))
+            continue
+
+        await complete_actions(db, [a["_id"] for a in batch])
+
+
+async def _retry(db, name: str, batch: list[dict], error: str):
+    dead = await retry_actions(db, batch, error)
+    if dead:
+        logger.error("SCHEDULED_ACTION_DEAD action=%s count=%s", name, dead)
+
+
+async def scheduled_action_dispatcher(db):
+    """
+    Long-running (leased) consumer of scheduled_actions: drains everything
+    due, then sleeps until the next due_at instead of polling orders.
+    """
+    last_stale_check = datetime.min
+
+    while True:
+        now = datetime.utcnow()
+        if (now - last_stale_check).total_seconds() >= STALE_CHECK_INTERVAL_SECONDS:
+            requeued = await requeue_stale_actions(db)
+            if requeued:
+                logger.warning("SCHEDULED_ACTIONS_REQUEUED stale=%s", requeued)
+            last_stale_check = now
+
+        actions = await claim_due_actions(db)
+        if actions:
+            await dispatch_actions(db, actions)
+            continue
+
+        due_at = await next_due_at(db)
+        delay = MAX_IDLE_SECONDS
+        if due_at:
+            delay = min(max((due_at - datetime.utcnow()).total_seconds(), 0), MAX_IDLE_SECONDS)
+
+        await wait_for_schedule(delay)
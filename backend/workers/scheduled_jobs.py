@@ -0,0 +1,134 @@
+from functools import partial
+
+from utils.cod_settlement_worker import settle_due_orders
+from utils.reserve_release_worker import release_due_reserves
+from utils.return_worker import auto_process_returns
+from utils.seller_activity_worker import enforce_seller_inactivity
+from utils.webhook_inbox import WEBHOOK_INBOX_SHARDS
+from workers.order_expiry_worker import expire_unpaid_orders
+from workers.return_deadline_worker import auto_reject_overdue_returns
+from workers.audit_cleanup_worker import cleanup_audit_logs
+from workers.probation_worker import end_due_probations
+from workers.risk_digest_worker import daily_risk_digest
+from workers.webhook_inbox_worker import webhook_inbox_consumer, requeue_stale_inbox_events
+from workers.scheduled_action_dispatcher import scheduled_action_dispatcher
+from workers.wallet_balance_verifier import verify_wallet_balances
+from workers.ledger_reconciliation_worker import run_ledger_reconciliation
+from workers.rollup_verifier import verify_rollups
+from workers.seller_trust_repair import repair_seller_trust
+from workers.trust_event_flusher import trust_event_flusher
+
+# ============================================================
+# SCHEDULED JOBS (run by utils.scheduler.JobScheduler)
+# ============================================================
+# interval_seconds  cluster-wide period, measured from the start of a run
+# jitter_seconds    random extra delay so jobs with equal periods drift apart
+#
+# Each job is a single pass taking db; the scheduler owns looping, leases
+# and error logging.
+# ============================================================
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+
+SCHEDULED_JOBS = {
+    # ---------------- MONEY ----------------
+    "cod_settlement": {
+        "run": settle_due_orders,
+        "interval_seconds": 30 * MINUTE,
+        "jitter_seconds": 60,
+    },
+    "reserve_release_sweep": {
+        "run": release_due_reserves,
+        "interval_seconds": 24 * HOUR,
+        "jitter_seconds": 30 * MINUTE,
+    },
+    "return_refunds": {
+        "run": auto_process_returns,
+        "interval_seconds": 15 * MINUTE,
+        "jitter_seconds": 30,
+    },
+    "wallet_balance_verifier": {
+        "run": verify_wallet_balances,
+        "interval_seconds": HOUR,
+        "jitter_seconds": 5 * MINUTE,
+    },
+    "ledger_reconciliation": {
+        "run": run_ledger_reconciliation,
+        "interval_seconds": 24 * HOUR,
+        "jitter_seconds": 30 * MINUTE,
+    },
+    "rollup_verifier": {
+        "run": verify_rollups,
+        "interval_seconds": 24 * HOUR,
+        "jitter_seconds": 30 * MINUTE,
+    },
+
+    # ---------------- ORDERS ----------------
+    # Expiry / return deadline / reserve release fire from scheduled_actions.
+    # The sweeps only catch orders whose action was never queued (created
+    # before the queue existed, or a failed schedule_action write).
+    "scheduled_action_dispatcher": {
+        "run": scheduled_action_dispatcher,
+        "interval_seconds": 5,
+        "jitter_seconds": 0,
+    },
+    "order_expiry_sweep": {
+        "run": expire_unpaid_orders,
+        "interval_seconds": 6 * HOUR,
+        "jitter_seconds": 10 * MINUTE,
+    },
+    "return_deadline_sweep": {
+        "run": auto_reject_overdue_returns,
+        "interval_seconds": 6 * HOUR,
+        "jitter_seconds": 10 * MINUTE,
+    },
+
+    # ---------------- SELLERS ----------------
+    "seller_probation": {
+        "run": end_due_probations,
+        "interval_seconds": HOUR,
+        "jitter_seconds": 2 * MINUTE,
+    },
+    "seller_inactivity": {
+        "run": enforce_seller_inactivity,
+        "interval_seconds": HOUR,
+        "jitter_seconds": 2 * MINUTE,
+    },
+    "trust_event_flusher": {
+        "run": trust_event_flusher,
+        "interval_seconds": 5,
+        "jitter_seconds": 0,
+    },
+    "seller_trust_repair": {
+        "run": repair_seller_trust,
+        "interval_seconds": 24 * HOUR,
+        "jitter_seconds": 30 * MINUTE,
+    },
+    "daily_risk_digest": {
+        "run": daily_risk_digest,
+        "interval_seconds": 24 * HOUR,
+        "jitter_seconds": 10 * MINUTE,
+    },
+
+    # ---------------- HOUSEKEEPING ----------------
+    "audit_cleanup": {
+        "run": cleanup_audit_logs,
+        "interval_seconds": HOUR,
+        "jitter_seconds": 2 * MINUTE,
+    },
+    "webhook_inbox_janitor": {
+        "run": requeue_stale_inbox_events,
+        "interval_seconds": MINUTE,
+        "jitter_seconds": 5,
+    },
+}
+
+# Inbox consumers never return; one lease per shard keeps exactly one
+# consumer per shard alive cluster-wide (and so per-partition ordering).
+for _shard in range(WEBHOOK_INBOX_SHARDS):
+    SCHEDULED_JOBS[f"webhook_inbox_shard_{_shard}"] = {
+        "run": partial(webhook_inbox_consumer, shard=_shard),
+        "interval_seconds": 5,
+        "jitter_seconds": 0,
+    }
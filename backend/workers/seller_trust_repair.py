@@ -0,0 +1,26 @@
+import logging
+
+from utils.trust_recompute import create_trust_recompute_run, run_trust_recompute
+
+logger = logging.getLogger(__name__)
+
+
+async def repair_seller_trust(db):
+    """
+    Nightly repair: rebuild every seller's stats counters from one $group
+    over orders and re-derive trust, correcting drift from missed $inc writes.
+    Registered as a trust_recompute_runs run, so it never overlaps an
+    admin-triggered live recompute.
+    """
+    run_id = await create_trust_recompute_run(db, dry_run=False, requested_by="nightly_repair")
+    if not run_id:
+        logger.info("SELLER_TRUST_REPAIR_SKIPPED reason=recompute_active")
+        return
+
+    summary = await run_trust_recompute(db, run_id, dry_run=False)
+    if not summary:
+        return
+    logger.info(
+        "SELLER_TRUST_REPAIR_RUN sellers=%s changed=%s tier_changes=%s",
+        summary["sellers_processed"], summary["changed"], summary["tier_changes"],
+    )
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from utils.trust import apply_trust_batches
+from utils.trust_events import (
+    claim_trust_batches,
+    next_trust_batch_due_at,
+    requeue_stale_trust_batches,
+)
+
+MAX_IDLE_SECONDS = 10
+STALE_CHECK_INTERVAL_SECONDS = 60
+logger = logging.getLogger(__name__)
+
+
+async def trust_event_flusher(db):
+    """
+    Long-running (leased) consumer of trust_event_queue. A single leased
+    consumer applies batches oldest first, which keeps per-seller order.
+    """
+    last_stale_check = datetime.min
+
+    while True:
+        now = datetime.utcnow()
+        if (now - last_stale_check).total_seconds() >= STALE_CHECK_INTERVAL_SECONDS:
+            requeued = await requeue_stale_trust_batches(db)
+            if requeued:
+                logger.warning("TRUST_BATCHES_REQUEUED stale=%s", requeued)
+            last_stale_check = now
+
+        batches = await claim_trust_batches(db, due_before=now)
+        if batches:
+            await apply_trust_batches(db, batches)
+            continue
+
+        due_at = await next_trust_batch_due_at(db)
+        delay = MAX_IDLE_SECONDS
+        if due_at:
+            delay = min(max((due_at - datetime.utcnow()).total_seconds(), 0), MAX_IDLE_SECONDS)
+
+        await asyncio.sleep(delay)
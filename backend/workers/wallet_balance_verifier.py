@@ -0,0 +1,27 @@
+import logging
+
+from utils.wallet_balances import verify_wallet_balance
+
+logger = logging.getLogger(__name__)
+
+
+async def verify_wallet_balances(db):
+    """
+    Check every wallet_balances snapshot against the ledger tail since its
+    last checkpoint (wallet_ledger_seller_created_at_id_idx keeps each check a
+    short range scan).
+    """
+    counts = {}
+
+    async for snapshot in db.wallet_balances.find({}):
+        try:
+            status = await verify_wallet_balance(db, snapshot)
+        except Exception:
+            logger.exception("WALLET_VERIFY_ERROR seller=%s", snapshot["_id"])
+            status = "error"
+
+        if status == "repaired":
+            logger.warning("WALLET_BALANCE_REPAIRED seller=%s", snapshot["_id"])
+        counts[status] = counts.get(status, 0) + 1
+
+    logger.info("WALLET_VERIFY_RUN %s", " ".join(f"{k}={v}" for k, v in sorted(counts.items())))
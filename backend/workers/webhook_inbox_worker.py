@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from utils.webhook_inbox import (
+    claim_next_event,
+    mark_event_done,
+    mark_event_failed,
+    requeue_stale_events,
+)
+from utils.webhook_handlers import WEBHOOK_HANDLERS
+
+IDLE_SLEEP_SECONDS = 1
+logger = logging.getLogger(__name__)
+
+
+async def process_inbox_event(db, event: dict):
+    handler = WEBHOOK_HANDLERS.get(event.get("source"))
+    if not handler:
+        await mark_event_failed(db, event, f"No handler for source {event.get('source')}")
+        return
+
+    try:
+        result = await handler(db, event.get("payload") or {})
+    except Exception as e:
+        logger.exception("WEBHOOK_INBOX_ERROR event=%s", event.get("_id"))
+        await mark_event_failed(db, event, str(e))
+        return
+
+    await mark_event_done(db, event, result)
+
+
+async def webhook_inbox_consumer(db, shard: int):
+    """
+    Drains one inbox shard sequentially, which keeps events for the same
+    order / payout in arrival order. Runs under a scheduler lease so only one
+    consumer per shard exists cluster-wide.
+    """
+    while True:
+        try:
+            event = await claim_next_event(db, shard)
+        except Exception:
+            logger.exception("WEBHOOK_INBOX_CLAIM_ERROR shard=%s", shard)
+            event = None
+
+        if not event:
+            await asyncio.sleep(IDLE_SLEEP_SECONDS)
+            continue
+
+        await process_inbox_event(db, event)
+
+
+async def requeue_stale_inbox_events(db):
+    requeued = await requeue_stale_events(db)
+    if requeued:
+        logger.warning("WEBHOOK_INBOX_REQUEUED stale=%s", requeued)